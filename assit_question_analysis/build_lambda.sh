@@ -14,6 +14,8 @@ docker run --rm -v "$PWD":/var/task public.ecr.aws/sam/build-python3.11 \
 
 echo "📦 Copiando archivos fuente y recursos..."
 cp analyze_question.py lambda_build/
+cp -L openai_client.py lambda_build/
+cp -L lambda_log.py lambda_build/
 # (No longer needed to copy prompts)
 
 echo "🗜️ Generando ZIP..."
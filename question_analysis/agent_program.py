@@ -0,0 +1,64 @@
+# Programa DSPy de question_analysis: firma, módulo y (de)serialización.
+#
+# Lo usan compile_program.py (offline: compila con BootstrapFewShot y guarda el
+# artefacto) y analyze_question.py (Lambda: solo carga el artefacto, sin
+# llamadas al modelo). Importa dspy al cargarse: la Lambda lo importa recién
+# en la primera invocación (ver get_program en analyze_question.py).
+
+import hashlib
+import json
+import os
+
+import dspy
+
+ARTIFACT_PATH = os.getenv("AGENT_ARTIFACT", os.path.join("artifacts", "agent_program.json"))
+TRAINSET_PATH = os.path.join("prompts", "schemas", "trainset.json")
+
+
+class AgentSignature(dspy.Signature):
+    question = dspy.InputField(desc="Question in natural language about the project.")
+    json_output = dspy.OutputField(desc="A valid JSON object with the analysis structure.")
+
+
+class AgentDSPy(dspy.Module):
+    def __init__(self):
+        super().__init__()
+        self.predictor = dspy.Predict(AgentSignature)
+
+    def forward(self, question):
+        return self.predictor(question=question)
+
+
+def meta_path(artifact_path: str = ARTIFACT_PATH) -> str:
+    return os.path.splitext(artifact_path)[0] + ".meta.json"
+
+
+def trainset_digest(path: str = TRAINSET_PATH) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_trainset(path: str = TRAINSET_PATH):
+    # Convert trainset to DSPy v3.0+ format
+    with open(path, "r", encoding="utf-8") as f:
+        trainset_data = json.load(f)
+    return [
+        dspy.Example(
+            question=item["question"],
+            json_output=json.dumps(item["json_object"], ensure_ascii=False)
+        ).with_inputs("question")
+        for item in trainset_data
+    ]
+
+
+def compile_program(trainset=None):
+    """BootstrapFewShot sobre el trainset (hace llamadas al modelo configurado en dspy)."""
+    teleprompter = dspy.teleprompt.BootstrapFewShot(metric=None)
+    return teleprompter.compile(AgentDSPy(), trainset=trainset if trainset is not None else load_trainset())
+
+
+def load_program(artifact_path: str = ARTIFACT_PATH) -> AgentDSPy:
+    """Programa ya compilado: demos e instrucciones salen del artefacto, sin llamadas al modelo."""
+    program = AgentDSPy()
+    program.load(artifact_path)
+    return program
@@ -7,12 +7,12 @@ os.environ.setdefault("DSPY_LOGGING", "False")
 
 import json
 import sys
-# (importa el resto recién ahora)
-import dspy
+import threading
+import time
 from dotenv import load_dotenv  # si lo usas localmente
-import openai
-# Debug de versión en runtime
-print("openai version:", openai.__version__, "python:", sys.version)
+from lambda_log import get_logger
+
+log = get_logger("question_analysis")
 
 # Cargar variables desde .env
 load_dotenv()
@@ -20,37 +20,66 @@ load_dotenv()
 MODEL_DEFAULT = os.getenv("MODEL_TO_USE", "gpt-4o-mini")
 LANG_DEFAULT = os.getenv("PROMPT_LANG", "es")
 API_KEY = os.getenv("OPENAI_API_KEY")
-with open(os.path.join("prompts", "schemas", "trainset.json"), "r", encoding="utf-8") as f:
-    trainset_data = json.load(f)
-
-# Configure DSPy with the new API (v3.0+)
-lm = dspy.LM(f"openai/{MODEL_DEFAULT}", api_key=API_KEY)
-dspy.settings.configure(lm=lm)
-
-# Convert trainset to DSPy v3.0+ format
-TRAINSET = []
-for item in trainset_data:
-    example = dspy.Example(
-        question=item["question"],
-        json_output=json.dumps(item["json_object"], ensure_ascii=False)
-    ).with_inputs("question")
-    TRAINSET.append(example)
-
-class AgentSignature(dspy.Signature):
-    question = dspy.InputField(desc="Question in natural language about the project.")
-    json_output = dspy.OutputField(desc="A valid JSON object with the analysis structure.")
-
-class AgentDSPy(dspy.Module):
-    def __init__(self):
-        super().__init__()
-        self.predictor = dspy.Predict(AgentSignature)
-
-    def forward(self, question):
-        return self.predictor(question=question)
-# 3. Compilar el programa optimizado
-agent_program = AgentDSPy()
-teleprompter = dspy.teleprompt.BootstrapFewShot(metric=None)
-agent_optimized = teleprompter.compile(agent_program, trainset=TRAINSET)
+
+# dspy/litellm tardan segundos en importarse: se cargan en la primera invocación
+# (get_program), no al importar el módulo. El programa compilado sale de
+# artifacts/agent_program.json (compile_program.py); sin artefacto se compila
+# aquí como antes (con llamadas al modelo) y se avisa en el log.
+_program = None
+_program_lock = threading.Lock()
+
+
+def get_program():
+    global _program
+    if _program is None:
+        with _program_lock:
+            if _program is None:
+                _program = _load_program()
+    return _program
+
+
+def _load_program():
+    start = time.perf_counter()
+    import dspy
+    import litellm
+    import openai
+    from agent_program import ARTIFACT_PATH, compile_program, load_program, meta_path, trainset_digest
+    from openai_client import http_client
+
+    # Debug de versión en runtime
+    log.info("openai version: %s dspy: %s python: %s", openai.__version__, getattr(dspy, "__version__", "?"), sys.version)
+    # litellm (debajo de dspy.LM) usa este httpx.Client: mismo pool keep-alive que el resto de Lambdas
+    litellm.client_session = http_client()
+    lm = dspy.LM(f"openai/{MODEL_DEFAULT}", api_key=API_KEY)
+    dspy.settings.configure(lm=lm)
+    imported = time.perf_counter()
+
+    if os.path.exists(ARTIFACT_PATH):
+        program = load_program(ARTIFACT_PATH)
+        _check_artifact(meta_path(ARTIFACT_PATH), trainset_digest())
+        source = "artifact"
+    else:
+        log.warning("Sin artefacto %s: compilando en el arranque (correr compile_program.py antes del build)", ARTIFACT_PATH)
+        program = compile_program()
+        source = "compiled"
+    log.info("Programa DSPy listo", source=source, import_s=round(imported - start, 3), load_s=round(time.perf_counter() - imported, 3))
+    return program
+
+
+def _check_artifact(path: str, digest: str) -> None:
+    # Solo aviso: un artefacto viejo sigue funcionando, pero sus demos no reflejan el trainset actual
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return
+    if meta.get("trainset_sha256") != digest:
+        log.warning("El artefacto se compiló con otro trainset.json: volver a correr compile_program.py", compiled_at=meta.get("compiled_at"))
+
+
+# Con provisioned concurrency conviene pagar la carga en el init del contenedor
+if os.getenv("PRELOAD_PROGRAM") == "1":
+    get_program()
 
 
 def lambda_handler(event, context):
@@ -68,7 +97,7 @@ def lambda_handler(event, context):
         }
 
     try:
-        response = agent_optimized(question=question)
+        response = get_program()(question=question)
         text = response.json_output
        
         # Si quieres que type==2 siempre responda {answer: ...}, mantenemos esto:
@@ -86,7 +115,7 @@ def lambda_handler(event, context):
             }
 
     except Exception as e:
-        print("Exception:", repr(e))
+        log.error("Exception: %r", e, exc_info=True)
         return {
             "statusCode": 500,
             "headers": {"Content-Type": "application/json; charset=utf-8"},
@@ -0,0 +1,69 @@
+"""
+Cold start de question_analysis: import del módulo + carga del programa DSPy,
+cada corrida en un intérprete nuevo (como un contenedor Lambda nuevo).
+
+  before  flujo anterior: importar dspy/litellm, leer trainset.json y compilar
+          con BootstrapFewShot en el import (hace llamadas al modelo)
+  after   import analyze_question (sin dspy) + get_program() que solo carga
+          artifacts/agent_program.json
+
+Uso (desde question_analysis/, con el artefacto ya generado por compile_program.py):
+    python bench/bench_cold_start.py --runs 5
+    python bench/bench_cold_start.py --skip-before      # sin llamadas al modelo
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+BEFORE = """
+import os, time, json
+os.environ.setdefault("LITELLM_LOG", "ERROR"); os.environ.setdefault("LITELLM_CACHE", "False"); os.environ.setdefault("DSPY_LOGGING", "False")
+t0 = time.perf_counter()
+import dspy, litellm, openai
+from agent_program import compile_program, load_trainset
+dspy.settings.configure(lm=dspy.LM("openai/" + os.getenv("MODEL_TO_USE", "gpt-4o-mini"), api_key=os.getenv("OPENAI_API_KEY")))
+t1 = time.perf_counter()
+compile_program(load_trainset())
+t2 = time.perf_counter()
+print(json.dumps({"import_s": t1 - t0, "init_s": t2 - t1}))
+"""
+
+AFTER = """
+import time, json
+t0 = time.perf_counter()
+import analyze_question
+t1 = time.perf_counter()
+analyze_question.get_program()
+t2 = time.perf_counter()
+print(json.dumps({"import_s": t1 - t0, "init_s": t2 - t1}))
+"""
+
+
+def run(code: str, runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {
+        key: round(statistics.median(s[key] for s in samples), 3)
+        for key in ("import_s", "init_s")
+    } | {"total_s": round(statistics.median(s["import_s"] + s["init_s"] for s in samples), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start de question_analysis (antes / después)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--skip-before", action="store_true", help="no medir el flujo anterior (compila con llamadas al modelo)")
+    args = parser.parse_args()
+
+    results = {}
+    if not args.skip_before:
+        results["before"] = run(BEFORE, args.runs)
+    results["after"] = run(AFTER, args.runs)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -14,7 +14,16 @@ docker run --rm -v "$PWD":/var/task public.ecr.aws/sam/build-python3.11 \
 
 echo "📦 Copiando archivos fuente y recursos..."
 cp analyze_question.py lambda_build/
+cp -L openai_client.py lambda_build/
+cp -L lambda_log.py lambda_build/
+cp agent_program.py lambda_build/
 cp -r prompts lambda_build/
+# Programa DSPy ya compilado (python compile_program.py): sin él la Lambda compila en el arranque
+if [ -f artifacts/agent_program.json ]; then
+  cp -r artifacts lambda_build/
+else
+  echo "⚠️ Falta artifacts/agent_program.json: correr 'python compile_program.py' antes del build"
+fi
 
 echo "🗜️ Generando ZIP..."
 cd lambda_build
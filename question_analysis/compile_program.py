@@ -0,0 +1,58 @@
+# Paso offline: compila el programa DSPy (BootstrapFewShot sobre el trainset) y
+# guarda el resultado (demos + instrucciones) en artifacts/agent_program.json.
+# La Lambda solo carga ese archivo; volver a correr esto cuando cambie el
+# trainset, la firma o el modelo, antes de build_lambda.sh.
+#
+# Uso:
+#   python compile_program.py                      # modelo de MODEL_TO_USE (gpt-4o-mini)
+#   python compile_program.py --model gpt-4.1 --out artifacts/agent_program.json
+
+import os
+os.environ.setdefault("LITELLM_LOG", "ERROR")
+os.environ.setdefault("LITELLM_CACHE", "False")
+os.environ.setdefault("DSPY_LOGGING", "False")
+
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+
+import dspy
+from dotenv import load_dotenv
+
+from agent_program import ARTIFACT_PATH, TRAINSET_PATH, compile_program, load_trainset, meta_path, trainset_digest
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Compila y guarda el programa DSPy de question_analysis")
+    parser.add_argument("--model", default=os.getenv("MODEL_TO_USE", "gpt-4o-mini"))
+    parser.add_argument("--out", default=ARTIFACT_PATH)
+    args = parser.parse_args()
+
+    dspy.settings.configure(lm=dspy.LM(f"openai/{args.model}", api_key=os.getenv("OPENAI_API_KEY")))
+    trainset = load_trainset()
+
+    start = time.perf_counter()
+    program = compile_program(trainset)
+    elapsed = time.perf_counter() - start
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    program.save(args.out)
+    meta = {
+        "compiled_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "model": args.model,
+        "dspy_version": getattr(dspy, "__version__", None),
+        "trainset": TRAINSET_PATH,
+        "trainset_sha256": trainset_digest(),
+        "examples": len(trainset),
+        "demos": len(program.predictor.demos),
+        "compile_s": round(elapsed, 2),
+    }
+    with open(meta_path(args.out), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    print(f"Programa compilado en {elapsed:.1f}s ({meta['demos']} demos) -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
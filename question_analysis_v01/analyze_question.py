@@ -2,7 +2,10 @@ import json
 import os
 import time
 from dotenv import load_dotenv
-from openai import OpenAI
+from lambda_log import get_logger
+from openai_client import get_client
+
+log = get_logger("question_analysis_v01")
 
 # Cargar variables desde .env
 load_dotenv()
@@ -17,7 +20,7 @@ def lambda_handler(event, context):
         body = event
 
     question = body.get("question")
-    print(f"Pregunta procesada: {question}")
+    log.info("Pregunta procesada: %s", question)
     if not question:
         return {
             "statusCode": 400,
@@ -26,7 +29,7 @@ def lambda_handler(event, context):
     # Let's measure how long it takes to receive the response, first print time stamp before the request and then after the request
 
     try:
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        client = get_client()
         ASSISTANT_ID = os.getenv("ASSISTANT_ID")  # guardado en tu .env o Lambda env
 
         # 1. Create a new thread
@@ -3,7 +3,7 @@ import json
 import os
 import time
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai_client import get_client
 
 # Cargar variables desde .env
 load_dotenv()
@@ -33,7 +33,7 @@ def lambda_handler(event, context):
     # lest measure how long it takes to receive the response, first print time stamp befrore the request and then after the request
     
     try:
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        client = get_client()
 
         chat_completion = client.chat.completions.create(
             model=model_to_use,
@@ -3,11 +3,15 @@ import json
 import os
 import time
 from dotenv import load_dotenv
-from openai import OpenAI
+from lambda_log import get_logger
+from openai_client import get_client
+from question_cache import CACHE_ENABLED, QuestionCaches
 import openai, sys
 
+log = get_logger("question_analysis_v02")
+
 # Debug de versión en runtime
-print("openai version:", openai.__version__, "python:", sys.version)
+log.info("openai version: %s python: %s", openai.__version__, sys.version)
 
 # Cargar variables desde .env
 load_dotenv()
@@ -15,6 +19,13 @@ load_dotenv()
 MODEL_DEFAULT = os.getenv("MODEL_TO_USE", "gpt-4o-mini")
 LANG_DEFAULT = os.getenv("PROMPT_LANG", "es")
 
+# Caché de respuestas type "1" por (modelo, idioma) (ver question_cache.py): vive
+# mientras el contenedor esté caliente; el trainset siembra solo MODEL_DEFAULT en español
+QUESTION_CACHES = QuestionCaches(seed_model=MODEL_DEFAULT)
+if CACHE_ENABLED:
+    seeded = QUESTION_CACHES.get(MODEL_DEFAULT, "es")
+    log.info("Caché de preguntas sembrada", model=MODEL_DEFAULT, entries=len(seeded) if seeded else 0)
+
 def lambda_handler(event, context):
     # Compatibilidad API Gateway / llamada directa
     body = json.loads(event.get("body", "{}")) if "body" in event else event
@@ -23,6 +34,7 @@ def lambda_handler(event, context):
     prompt_type = str(body.get("type", "1"))  # "1" por defecto
     model_to_use = body.get("model", MODEL_DEFAULT)
     language = body.get("lang", LANG_DEFAULT)
+    cache = QUESTION_CACHES.get(model_to_use, language) if CACHE_ENABLED and prompt_type == "1" and body.get("cache", True) else None
 
     if not question:
         return {
@@ -31,19 +43,32 @@ def lambda_handler(event, context):
             "body": json.dumps("Missing 'question' in event")
         }
 
+    if cache is not None:
+        start = time.perf_counter()
+        answer, level, score = cache.get(question)
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 3)
+        log.info("Caché de preguntas: %s", level, score=score, ms=elapsed_ms, model=model_to_use, lang=language)
+        if answer is not None:
+            return {
+                "statusCode": 200,
+                "headers": {
+                    "Content-Type": "application/json; charset=utf-8",
+                    "X-Cache": f"hit-{level}",
+                    "X-Cache-Score": str(score),
+                },
+                "body": json.dumps(answer, ensure_ascii=False)
+            }
+
     # Prompt base + (opcional) instrucciones de salida con schema
     prompt_template = load_prompt(prompt_type, language=language)
     schema_instructions = load_json_schema(prompt_type)
     if schema_instructions:
         prompt_template = f"{prompt_template}\n\n{schema_instructions}"
 
-    print(f"Pregunta recibida: {question}")
-    print(f"Tipo de prompt: {prompt_type}")
-    print(f"Modelo a usar: {model_to_use}")
-    print(f"Tiene schema: {bool(schema_instructions)}")
+    log.info("Pregunta recibida: %s", question, type=prompt_type, model=model_to_use, schema=bool(schema_instructions))
 
     try:
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        client = get_client()
         resp = client.responses.create(
             model=model_to_use,
             instructions=prompt_template,
@@ -60,14 +85,22 @@ def lambda_handler(event, context):
                 "body": json.dumps({"answer": text}, ensure_ascii=False)
             }
         else:
+            headers = {"Content-Type": "application/json; charset=utf-8"}
+            if cache is not None:
+                headers["X-Cache"] = "miss"
+                try:
+                    stored = cache.put(question, json.loads(text))
+                except json.JSONDecodeError:
+                    stored = False
+                log.debug("Respuesta guardada en caché: %s", stored, model=model_to_use, lang=language, **cache.counters())
             return {
                 "statusCode": 200,
-                "headers": {"Content-Type": "application/json; charset=utf-8"},
+                "headers": headers,
                 "body": text
             }
 
     except Exception as e:
-        print("Exception:", repr(e))
+        log.error("Exception: %r", e, exc_info=True)
         return {
             "statusCode": 500,
             "headers": {"Content-Type": "application/json; charset=utf-8"},
@@ -100,9 +133,7 @@ def load_json_schema(prompt_type: str) -> str | None:
     lo serializa bonito y devuelve el bloque de 'Instrucciones de salida'
     listo para pegar al prompt. Si no hay schema para el tipo, devuelve None.
     """
-    print("**" * 60)
-    print("**" * 60)
-    print(f"Loading JSON schema for prompt type: {prompt_type}")
+    log.debug("Loading JSON schema for prompt type: %s", prompt_type)
 
     SCHEMAS_DIR = os.path.join("prompts", "schemas")
     mapping = {
@@ -111,15 +142,12 @@ def load_json_schema(prompt_type: str) -> str | None:
         # "3": "other_schema.json",
     }
     filename = mapping.get(prompt_type)
-    print(f"Schema filename: {filename}")
     if not filename:
         return None
 
     path = os.path.join(SCHEMAS_DIR, filename)
-    print(f"Schema path: {path}")
-    print(os.path.exists(path))
     if not os.path.exists(path):
-        print(f"Schema file not found: {path}")
+        log.warning("Schema file not found: %s", path)
         return None
 
     with open(path, "r", encoding="utf-8") as f:
@@ -14,7 +14,10 @@ docker run --rm -v "$PWD":/var/task public.ecr.aws/sam/build-python3.11 \
 
 echo "📦 Copiando archivos fuente y recursos..."
 cp analyze_question.py lambda_build/
-cp -r prompts lambda_build/
+cp question_cache.py lambda_build/
+cp -L openai_client.py lambda_build/
+cp -L lambda_log.py lambda_build/
+cp -rL prompts lambda_build/
 
 echo "🗜️ Generando ZIP..."
 cd lambda_build
@@ -0,0 +1 @@
+../shared/lambda_log.py
\ No newline at end of file
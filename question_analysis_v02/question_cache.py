@@ -0,0 +1,332 @@
+"""
+Caché de respuestas de question_analysis (type "1": pregunta -> JSON de entidades).
+
+Dos niveles, ambos en memoria del contenedor y sin llamadas de red:
+  1. Exacto: la pregunta normalizada (sin tildes, minúsculas, sin puntuación
+     ni espacios de más) como clave de un dict.
+  2. Semántico: vecino más cercano por TF-IDF de n-gramas de caracteres
+     (coseno). Un candidato solo se acepta si pasa QUESTION_CACHE_THRESHOLD
+     y además tiene las mismas palabras de contenido que la pregunta, salvo
+     plurales y errores de tipeo ("exterior" != "interior", "episodio 1" !=
+     "episodio 2", "Dan" != "Barbara"): dos preguntas muy parecidas en
+     caracteres pueden pedir entidades distintas.
+
+Se siembra con los pares validados de prompts/schemas/trainset.json (fijos,
+no se desalojan) y aprende las respuestas del modelo que pasan valid_answer.
+Las aprendidas se desalojan por LRU al superar QUESTION_CACHE_MAX.
+
+QuestionCaches separa una caché por (modelo, idioma): una respuesta aprendida
+con un modelo/idioma nunca contesta un request de otra configuración. El
+trainset (en español, validado a mano) solo siembra la partición del modelo
+por defecto con idioma SEED_LANG; las demás empiezan vacías.
+
+Configuración por entorno:
+  QUESTION_CACHE            1 (default) | 0 desactiva la caché
+  QUESTION_CACHE_THRESHOLD  similitud coseno mínima del nivel 2 (default 0.75)
+  QUESTION_CACHE_MAX        máximo de respuestas aprendidas (default 2000)
+  QUESTION_CACHE_SEED       trainset con el que se siembra
+  QUESTION_CACHE_PARTITIONS máximo de combinaciones (modelo, idioma) con caché (default 8)
+"""
+import heapq
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+CACHE_ENABLED = os.getenv("QUESTION_CACHE", "1") != "0"
+THRESHOLD_DEFAULT = float(os.getenv("QUESTION_CACHE_THRESHOLD", "0.75"))
+MAX_ENTRIES_DEFAULT = int(os.getenv("QUESTION_CACHE_MAX", "2000"))
+SEED_PATH = os.getenv("QUESTION_CACHE_SEED", os.path.join("prompts", "schemas", "trainset.json"))
+SEED_LANG = "es"  # idioma de las preguntas del trainset
+MAX_PARTITIONS_DEFAULT = int(os.getenv("QUESTION_CACHE_PARTITIONS", "8"))
+
+NGRAM = 3
+TOP_K = 5  # candidatos del nivel 2 que se revisan con el control de palabras
+
+_PUNCT_RE = re.compile(r"[^\w%]+")
+_WS_RE = re.compile(r"\s+")
+
+# Palabras que no cambian qué se pregunta ("no", "sin", números y nombres sí cuentan)
+_STOPWORDS = {
+    "a", "al", "de", "del", "el", "la", "las", "lo", "los", "en", "y", "e", "o", "u",
+    "un", "una", "unos", "unas", "por", "para", "con", "que", "hay", "es", "son",
+    "me", "mi", "nos", "hola", "favor", "porfa", "dame", "dime", "muestrame", "quiero",
+    "saber", "ver", "tiene", "tienen", "tengo", "tenemos", "cual", "cuales",
+    "proyecto", "todo", "todos", "todas", "da", "do", "das", "na",
+}
+# Formas de pedir lo mismo (conteo / lista / porcentaje) -> una sola palabra
+_SYNONYMS = {
+    "total": "#count", "totales": "#count", "cuantas": "#count", "cuantos": "#count",
+    "cantidad": "#count", "numero": "#count", "quantas": "#count", "quantos": "#count",
+    "lista": "#list", "listado": "#list", "listar": "#list",
+    "porcentaje": "#pct", "%": "#pct", "porcentagem": "#pct",
+}
+
+
+def normalize_question(question: str) -> str:
+    """Clave del nivel exacto: sin tildes, casefold, sin puntuación, espacios simples."""
+    text = unicodedata.normalize("NFKD", question or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).casefold()
+    return _WS_RE.sub(" ", _PUNCT_RE.sub(" ", text)).strip()
+
+
+def _stem(word: str) -> str:
+    # Plural simple: "escenas" -> "escena", "locaciones" -> "locacion"
+    if len(word) > 4 and word.endswith("es") and word[-3] not in "aeiou":
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def content_words(normalized: str) -> List[str]:
+    words = []
+    for w in normalized.split():
+        w = _SYNONYMS.get(w, w)
+        if w not in _STOPWORDS:
+            words.append(w if w.startswith("#") else _stem(w))
+    return words
+
+
+def _close(a: str, b: str) -> bool:
+    """Misma palabra salvo un error de tipeo (solo palabras largas, nunca números)."""
+    if a == b:
+        return True
+    if min(len(a), len(b)) < 5 or a.isdigit() or b.isdigit() or abs(len(a) - len(b)) > 1:
+        return False
+    # Distancia de edición <= 1
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:] or (len(a) == len(b) and a[i + 1:] == b[i + 1:])
+
+
+def same_content(a: List[str], b: List[str]) -> bool:
+    return all(any(_close(x, y) for y in b) for x in a) and all(any(_close(y, x) for x in a) for y in b)
+
+
+def _ngrams(words: List[str]) -> Dict[str, int]:
+    tf: Dict[str, int] = {}
+    for w in words:
+        padded = f" {w} "
+        for i in range(max(1, len(padded) - NGRAM + 1)):
+            g = padded[i:i + NGRAM]
+            tf[g] = tf.get(g, 0) + 1
+    return tf
+
+
+def valid_answer(obj: Any) -> bool:
+    """Solo se guardan instancias completas del schema de entidades, sin aclaraciones pendientes."""
+    if not isinstance(obj, dict) or set(obj) != {"entities", "clarifications"}:
+        return False
+    if obj["clarifications"] != [] or not isinstance(obj["entities"], list) or not obj["entities"]:
+        return False
+
+    def entity_ok(e: Any) -> bool:
+        return (
+            isinstance(e, dict)
+            and isinstance(e.get("type"), str)
+            and isinstance(e.get("metrics"), list)
+            and all(isinstance(m, dict) and isinstance(m.get("name"), str) and isinstance(m.get("filters"), list)
+                    for m in e["metrics"])
+            and isinstance(e.get("filters"), list)
+            and isinstance(e.get("children"), list)
+            and all(entity_ok(c) for c in e["children"])
+        )
+
+    return all(entity_ok(e) for e in obj["entities"])
+
+
+def _complete_seed(obj: Any) -> Any:
+    # El trainset omite "filters" en las métricas; el schema de v02 lo exige
+    for e in obj.get("entities", []) if isinstance(obj, dict) else []:
+        for m in e.get("metrics", []):
+            m.setdefault("filters", [])
+        _complete_seed({"entities": e.get("children", [])})
+    return obj
+
+
+class _Entry:
+    __slots__ = ("question", "answer", "words", "tf", "pinned")
+
+    def __init__(self, question: str, answer: Any, words: List[str], pinned: bool):
+        self.question = question
+        self.answer = answer
+        self.words = words
+        self.tf = _ngrams(words)
+        self.pinned = pinned
+
+
+class QuestionCache:
+    def __init__(self, threshold: float = THRESHOLD_DEFAULT, max_entries: int = MAX_ENTRIES_DEFAULT):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()  # orden = uso (LRU)
+        self._postings: Dict[str, set] = {}  # n-grama -> claves que lo tienen
+        self._norms: Optional[Dict[str, float]] = None  # se recalcula al cambiar el corpus
+        self._learned = 0
+        self._lock = threading.Lock()
+        self.stats = {"exact": 0, "semantic": 0, "miss": 0, "stored": 0, "evicted": 0, "rejected": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ---------- escritura ----------
+
+    def seed(self, path: str = SEED_PATH) -> int:
+        """Carga los pares validados del trainset como entradas fijas. Devuelve cuántas cargó."""
+        if not os.path.exists(path):
+            return 0
+        with open(path, "r", encoding="utf-8") as f:
+            items = json.load(f)
+        n = 0
+        for item in items:
+            answer = _complete_seed(item.get("json_object"))
+            if self.put(item.get("question", ""), answer, pinned=True):
+                n += 1
+        return n
+
+    def put(self, question: str, answer: Any, pinned: bool = False) -> bool:
+        if not valid_answer(answer):
+            self.stats["rejected"] += 1
+            return False
+        key = normalize_question(question)
+        if not key:
+            return False
+        with self._lock:
+            old = self._entries.get(key)
+            if old is not None and old.pinned and not pinned:
+                return False  # no se pisa una respuesta del trainset
+            if old is not None:
+                self._remove(key)
+            entry = _Entry(question, answer, content_words(key), pinned)
+            self._entries[key] = entry
+            for g in entry.tf:
+                self._postings.setdefault(g, set()).add(key)
+            if not pinned:
+                self._learned += 1
+                self.stats["stored"] += 1
+            self._norms = None
+            self._evict()
+        return True
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        for g in entry.tf:
+            keys = self._postings.get(g)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[g]
+        if not entry.pinned:
+            self._learned -= 1
+
+    def _evict(self) -> None:
+        # LRU solo entre las aprendidas; las del trainset no cuentan ni se desalojan
+        if self._learned <= self.max_entries:
+            return
+        for key in list(self._entries):
+            if self._learned <= self.max_entries:
+                break
+            if not self._entries[key].pinned:
+                self._remove(key)
+                self.stats["evicted"] += 1
+
+    # ---------- lectura ----------
+
+    def _idf(self, g: str) -> float:
+        return math.log((1 + len(self._entries)) / (1 + len(self._postings.get(g, ())))) + 1.0
+
+    def _entry_norms(self) -> Dict[str, float]:
+        if self._norms is None:
+            idf = {g: self._idf(g) for g in self._postings}
+            self._norms = {
+                key: math.sqrt(sum((tf * idf[g]) ** 2 for g, tf in e.tf.items())) or 1.0
+                for key, e in self._entries.items()
+            }
+        return self._norms
+
+    def get(self, question: str) -> Tuple[Optional[Any], str, float]:
+        """(respuesta, "exact" | "semantic" | "miss", similitud)."""
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["exact"] += 1
+                return entry.answer, "exact", 1.0
+
+            words = content_words(key)
+            q_tf = _ngrams(words)
+            if not q_tf or not self._entries:
+                self.stats["miss"] += 1
+                return None, "miss", 0.0
+
+            # Producto punto solo contra las entradas que comparten algún n-grama
+            norms = self._entry_norms()
+            dots: Dict[str, float] = {}
+            q_norm = 0.0
+            for g, tf in q_tf.items():
+                idf = self._idf(g)
+                w = tf * idf
+                q_norm += w * w
+                w *= idf
+                for k in self._postings.get(g, ()):
+                    dots[k] = dots.get(k, 0.0) + w * self._entries[k].tf[g]
+            q_norm = math.sqrt(q_norm) or 1.0
+
+            best = 0.0
+            scored = ((dot / (q_norm * norms[k]), k) for k, dot in dots.items())
+            for score, k in heapq.nlargest(TOP_K, scored):
+                best = max(best, score)
+                if score < self.threshold:
+                    break
+                if same_content(words, self._entries[k].words):
+                    self._entries.move_to_end(k)
+                    self.stats["semantic"] += 1
+                    return self._entries[k].answer, "semantic", round(score, 3)
+            self.stats["miss"] += 1
+            return None, "miss", round(best, 3)
+
+    def counters(self) -> Dict[str, Any]:
+        lookups = self.stats["exact"] + self.stats["semantic"] + self.stats["miss"]
+        hits = self.stats["exact"] + self.stats["semantic"]
+        return {**self.stats, "entries": len(self._entries), "learned": self._learned,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0}
+
+
+class QuestionCaches:
+    """
+    Una QuestionCache por (modelo, idioma). model y lang vienen del request:
+    pasado max_partitions, las combinaciones nuevas no tienen caché (get
+    devuelve None) en lugar de crecer sin límite.
+    """
+
+    def __init__(self, seed_model: str, seed_lang: str = SEED_LANG, seed_path: str = SEED_PATH,
+                 max_partitions: int = MAX_PARTITIONS_DEFAULT, **cache_options: Any):
+        self.seed_scope = (seed_model, seed_lang)
+        self.seed_path = seed_path
+        self.max_partitions = max_partitions
+        self.cache_options = cache_options
+        self._caches: Dict[Tuple[str, str], QuestionCache] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model: str, language: str) -> Optional[QuestionCache]:
+        scope = (str(model), str(language))
+        cache = self._caches.get(scope)
+        if cache is not None:
+            return cache
+        with self._lock:
+            cache = self._caches.get(scope)
+            if cache is None and len(self._caches) < self.max_partitions:
+                cache = QuestionCache(**self.cache_options)
+                if scope == self.seed_scope:
+                    cache.seed(self.seed_path)
+                self._caches[scope] = cache
+        return cache
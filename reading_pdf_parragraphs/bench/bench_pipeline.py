@@ -0,0 +1,401 @@
+"""
+Benchmark del pipeline PDF → líneas → párrafos → etiquetas.
+
+Mide por separado cada etapa (tiempo y pico de memoria Python), sobre los
+mismos registros internos (Line/Paragraph) que usa la Lambda:
+  - extract   iter_pages_records (iter_pages_lines sin convertir a dict)
+  - group     page_paragraphs (group_lines_to_paragraphs sobre registros)
+  - hyphens   normalize_hyphens
+  - classify  classify_batch
+
+Documentos: sample.b64 / pdf.b64 del repo y guiones sintéticos de 10/100/500 páginas.
+
+Uso (desde reading_pdf_parragraphs/):
+    python bench/bench_pipeline.py                 # corre y muestra la tabla
+    python bench/bench_pipeline.py --save          # guarda bench/baselines.json
+    python bench/bench_pipeline.py --check         # falla (exit 1) si hay regresión
+    python bench/bench_pipeline.py --docs synthetic-10 sample --repeat 5
+    python bench/bench_pipeline.py --docs --long-paragraph 200   # solo unión de párrafo largo
+    python bench/bench_pipeline.py --parity        # classify_batch == cadena if/elif original (exit 1 si no)
+
+Nota: tracemalloc solo ve memoria reservada por Python; la que usa MuPDF
+internamente (C) no aparece en el pico.
+"""
+import argparse
+import base64
+import contextlib
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+import fitz  # noqa: E402
+
+from pdf_reader.core import (  # noqa: E402
+    FontTable,
+    Line,
+    _join_paragraph_lines,
+    _join_paragraph_lines_incremental,
+    iter_pages_records,
+    normalize_hyphens,
+    page_paragraphs,
+)
+from ml.infer import classifier as _clf  # noqa: E402
+from ml.infer.classifier import load_model  # noqa: E402
+
+BASELINES_PATH = os.path.join(HERE, "baselines.json")
+SYNTHETIC_SIZES = (10, 100, 500)
+
+
+# ===== Documentos =====
+# Posiciones X de un guion estándar (las mismas que usa el clasificador)
+_SCENE = [
+    (55.0, "{n} INT. CASA DE MARÍA. COCINA - NOCHE"),
+    (108.0, "María entra a la cocina, deja las llaves sobre la mesa y mira"),
+    (108.0, "por la ventana. Afuera llueve con fuerza sobre los tejados."),
+    (252.0, "MARÍA"),
+    (208.0, "(en voz baja)"),
+    (180.0, "No pensé que fueras a volver tan temprano. Hay comida en la"),
+    (180.0, "nevera si tienes ham- bre."),
+    (252.0, "PEDRO (CONT'D)"),
+    (180.0, "Vine por lo que dejé la última vez."),
+    (400.0, "CORTE A:"),
+]
+
+
+def synthetic_screenplay(pages: int) -> bytes:
+    """Genera un guion de `pages` páginas (Courier 12, márgenes tipo Final Draft)."""
+    doc = fitz.open()
+    scene = 1
+    for _ in range(pages):
+        page = doc.new_page(width=612, height=792)
+        y = 72.0
+        while y < 700.0:
+            for x, text in _SCENE:
+                if y >= 700.0:
+                    break
+                page.insert_text((x, y), text.format(n=scene), fontname="cour", fontsize=12)
+                y += 14.0 if not text.startswith("{n}") else 24.0
+            scene += 1
+            y += 12.0
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def load_documents(names: List[str]) -> Dict[str, bytes]:
+    docs: Dict[str, bytes] = {}
+    for name in names:
+        if name.startswith("synthetic-"):
+            docs[name] = synthetic_screenplay(int(name.split("-", 1)[1]))
+        else:
+            with open(os.path.join(ROOT, f"{name}.b64"), "r") as f:
+                docs[name] = base64.b64decode(f.read())
+    return docs
+
+
+# ===== Medición =====
+def _measure(fn: Callable[[], Any], repeat: int) -> Tuple[float, float, Any]:
+    """Devuelve (mediana en segundos, pico de memoria en MiB, último resultado)."""
+    times = []
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(times), peak / (1024 * 1024), result
+
+
+def bench_document(pdf_bytes: bytes, repeat: int) -> Dict[str, Dict[str, float]]:
+    model = load_model(os.path.join(ROOT, "ml", "artifacts", "v1"))
+    stats: Dict[str, Dict[str, float]] = {}
+
+    t, mem, pages = _measure(lambda: list(iter_pages_records(pdf_bytes)), repeat)
+    stats["extract"] = {"seconds": t, "peak_mib": mem}
+    line_pages = [p["lines"] for p in pages]
+
+    t, mem, para_pages = _measure(
+        lambda: [page_paragraphs(p["lines"], p["fonts"]) for p in pages], repeat
+    )
+    stats["group"] = {"seconds": t, "peak_mib": mem}
+
+    texts = [p.text for paras in para_pages for p in paras]
+    t, mem, _ = _measure(lambda: [normalize_hyphens(x) for x in texts], repeat)
+    stats["hyphens"] = {"seconds": t, "peak_mib": mem}
+
+    t, mem, _ = _measure(lambda: [model.classify_batch(paras) for paras in para_pages], repeat)
+    stats["classify"] = {"seconds": t, "peak_mib": mem}
+
+    stats["_counts"] = {
+        "pages": len(line_pages),
+        "lines": sum(len(x) for x in line_pages),
+        "paragraphs": len(texts),
+    }
+    return stats
+
+
+def bench_long_paragraph(n_lines: int, repeat: int) -> Dict[str, float]:
+    """
+    Párrafo de acción de `n_lines` líneas (con cortes de palabra "conti- nuaba"):
+    compara la unión lineal contra la incremental original y exige texto idéntico.
+    """
+    words = "la camara sigue a maria por el pasillo mientras la lluvia golpea".split()
+    texts = []
+    for i in range(n_lines):
+        line = " ".join(words[(i + k) % len(words)] for k in range(9))
+        texts.append(line + (" conti-" if i % 7 == 3 else ""))
+        if i % 7 == 4:
+            texts[-1] = "nuaba " + texts[-1]
+    fonts = FontTable()
+    courier = fonts.intern("Courier")
+    lines = [Line(t, 108.0, 72.0 + 12.0 * i, 504.0, 84.0 + 12.0 * i, 12.0, courier, 0)
+             for i, t in enumerate(texts)]
+
+    t_new, _, fast = _measure(lambda: _join_paragraph_lines(texts), repeat)
+    t_old, _, slow = _measure(lambda: _join_paragraph_lines_incremental(texts), repeat)
+    if fast != slow:
+        raise AssertionError("La unión lineal no coincide byte a byte con la incremental")
+    t_group, _, paras = _measure(lambda: page_paragraphs(lines, fonts), repeat)
+    if len(paras) != 1 or paras[0].text != slow:
+        raise AssertionError("group no produjo un único párrafo idéntico")
+    return {"lines": n_lines, "join_ms": t_new * 1000, "join_incremental_ms": t_old * 1000,
+            "group_ms": t_group * 1000, "speedup": t_old / t_new if t_new else 0.0}
+
+
+# ===== Paridad del clasificador =====
+def _looks_all_caps_reference(s: str) -> bool:
+    core = re.sub(r"[0-9 .,?¿!¡'\"()\/\-’`´]+", "", s, flags=re.UNICODE).strip()
+    return bool(core) and core == core.upper()
+
+
+def classify_batch_reference(model, paras: List[Any]) -> List[Dict[str, Any]]:
+    """
+    La cadena if/elif de classify_batch tal como estaba antes de la tabla de
+    reglas (congelada aquí como referencia; no tocar salvo que cambie el
+    comportamiento esperado del clasificador).
+    """
+    out = []
+    for p in paras:
+        t = (p.get("text") or "").strip()
+        x = _clf._get_x(p)
+
+        if x >= 370.0 or _clf._RE_TRANS.search(t):
+            label = "Transition"
+            proba = 0.9 if x >= 370.0 else 0.8
+        elif _clf._RE_SCENE_FLEX.match(t) or _clf._RE_SCENE_DASH_TOD.search(t) or re.search(r"\bOMITTED\b", t, re.IGNORECASE):
+            starts_with_num = bool(re.match(r"^\s*\d+[A-Z]?\.?", t))
+            target = 55.0 if starts_with_num else 108.0
+            if _clf._close_to(x, target):
+                label, proba = "Scene Heading", 0.9
+            else:
+                label, proba = "Scene Heading", 0.75
+        elif (_clf._close_to(x, _clf._TARGET_X["Character"])
+              and (name := _clf._strip_name_prefix(t)) and len(name) <= 50
+              and _looks_all_caps_reference(name)):
+            label, proba = "Character", 0.92
+        elif _clf._RE_PAREN.match(t) and _clf._close_to(x, _clf._TARGET_X["Parenthetical"]):
+            label, proba = "Parenthetical", 0.9
+        elif _clf._close_to(x, _clf._TARGET_X["Dialogue"]):
+            label, proba = "Dialogue", 0.8
+        elif _clf._RE_SHOT.match(t) and _clf._close_to(x, _clf._TARGET_X["Shot"]):
+            label, proba = "Shot", 0.8
+        elif _clf._close_to(x, _clf._TARGET_X["Action"]):
+            if len(t) < 30 and not _looks_all_caps_reference(t):
+                if t.endswith(":"):
+                    label, proba = "Transition", 0.8
+                else:
+                    label, proba = "Action", 0.7
+            else:
+                label, proba = "Action", 0.7
+        elif _clf._is_centered(p) and _looks_all_caps_reference(t):
+            label, proba = "End of Act", 0.88
+        elif (
+            re.fullmatch(r"\d+", (t_num := re.sub(r"[\s\u00a0\u200b\u200c\u200d\ufeff]+", "", t)))
+            or re.fullmatch(r"\d+\.\d+", t_num)
+            or re.fullmatch(r"\d+[A-Za-z]", t_num)
+        ):
+            label, proba = "Number", 0.9
+        else:
+            label, proba = "Other", 0.5
+
+        idx = model.index.get(label, model.index.get("Other", 0))
+        out.append({"label_id": idx, "label": model.labels[idx], "proba": proba, "origin_x": x})
+    for i, o in enumerate(out):
+        if o["label"] == "Character":
+            if i + 1 < len(out) and out[i + 1]["label"] not in ["Parenthetical", "Dialogue"]:
+                o["label"] = "Other"
+                o["proba"] = 0.88
+    return out
+
+
+# Textos que ejercitan cada regla y sus bordes (mayúsculas con acentos, números con
+# espacios invisibles, transiciones sin ':' final, guiones sin token de hora...)
+_PARITY_TEXTS = [
+    "12 INT. CASA DE MARÍA - NOCHE", "EXT. PLAYA", "INT/EXT AUTO - DÍA", "3A. I/E PASILLO",
+    "CALLE PRINCIPAL - MAÑANA", "BOSQUE — NOITE", "LUGAR - ALGO", "OMITTED", "14 omitted",
+    "CORTE A:", "FADE OUT:", "CORTE PARA:", "cut to:", "DISSOLVE TO: ", "Dijo: hola:",
+    "MARÍA", "JOÃO (CONT'D)", "ANGIE (AL TELÉFONO):", "Pedro", "MÃE (V.O.)", "A" * 60,
+    "(en voz baja)", "(pausa", "No pensé que fueras a volver.", "CLOSE ON la mano",
+    "POV de María", "INSERT: carta", "María entra a la cocina.", "FIN DEL ACTO UNO",
+    "FIN", "12", "12.34", "3A", "1 2", "7\u00a0B", "\u200b45", "", "   ", "¿QUÉ?", "...",
+    "Corta:", "TÍTULO:", "-", "12 - NOCHE", "ÁNGELA — CONTINUOUS",
+]
+_PARITY_X = [55.0, 108.0, 180.0, 208.0, 252.0, 306.0, 370.0, 420.0, 20.0]
+
+
+def _random_page(rng: random.Random) -> List[Dict[str, Any]]:
+    page = []
+    for _ in range(rng.randint(1, 40)):
+        x = rng.choice(_PARITY_X) + rng.uniform(-20.0, 20.0)
+        text = rng.choice(_PARITY_TEXTS)
+        if rng.random() < 0.2:
+            text = f"{rng.choice(['  ', ''])}{text}{rng.choice(['', ' ', ':'])}"
+        width = rng.uniform(0.0, 300.0)
+        para = {"text": text, "left_x": x, "right_x": x + width}
+        if rng.random() < 0.1:
+            para = {"text": text, "origin_x": x, "end_x": x + width}
+        page.append(para)
+    return page
+
+
+def classifier_parity(docs: Dict[str, bytes], random_pages: int, seed: int = 0) -> Dict[str, int]:
+    """
+    Compara classify_batch contra classify_batch_reference en cada página de
+    `docs` (registros Paragraph y sus dicts) y en `random_pages` páginas
+    aleatorias. Lanza AssertionError en la primera diferencia.
+    """
+    model = load_model(os.path.join(ROOT, "ml", "artifacts", "v1"))
+    pages: List[Tuple[str, List[Any]]] = []
+    for name, data in docs.items():
+        for rec in iter_pages_records(data):
+            paras = page_paragraphs(rec["lines"], rec["fonts"])
+            pages.append((f"{name} p{rec['page_number']}", paras))
+            pages.append((f"{name} p{rec['page_number']} (dict)", [p.to_dict() for p in paras]))
+    rng = random.Random(seed)
+    pages += [(f"aleatoria {i}", _random_page(rng)) for i in range(random_pages)]
+
+    checked = 0
+    for where, paras in pages:
+        got = model.classify_batch(paras)
+        want = classify_batch_reference(model, paras)
+        if got != want:
+            i = next((k for k, (a, b) in enumerate(zip(got, want)) if a != b), min(len(got), len(want)))
+            text = paras[i].get("text") if i < len(paras) else None
+            raise AssertionError(
+                f"{where}, párrafo {i} ({text!r}): "
+                f"{got[i] if i < len(got) else None} != {want[i] if i < len(want) else None}"
+            )
+        checked += len(paras)
+    return {"pages": len(pages), "paragraphs": checked}
+
+
+def _check(results: Dict[str, Any], baselines: Dict[str, Any], tolerance: float) -> List[str]:
+    regressions = []
+    for doc, stages in results.items():
+        for stage, st in stages.items():
+            if stage.startswith("_"):
+                continue
+            base = baselines.get(doc, {}).get(stage)
+            if not base:
+                continue
+            if st["seconds"] > base["seconds"] * tolerance:
+                regressions.append(
+                    f"{doc}/{stage}: {st['seconds'] * 1000:.1f} ms > "
+                    f"{base['seconds'] * 1000:.1f} ms × {tolerance}"
+                )
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", nargs="*",
+                    default=["sample", "pdf"] + [f"synthetic-{n}" for n in SYNTHETIC_SIZES])
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--save", action="store_true", help="guardar resultados como baseline")
+    ap.add_argument("--check", action="store_true", help="comparar contra el baseline")
+    ap.add_argument("--tolerance", type=float, default=1.25, help="factor permitido vs baseline")
+    ap.add_argument("--long-paragraph", type=int, default=200, metavar="N",
+                    help="líneas del párrafo largo a unir (0 = omitir)")
+    ap.add_argument("--parity", action="store_true",
+                    help="solo verificar classify_batch contra la cadena if/elif original")
+    ap.add_argument("--random-pages", type=int, default=5000,
+                    help="páginas aleatorias de la verificación --parity")
+    args = ap.parse_args(argv)
+
+    if args.parity:
+        names = [d for d in args.docs if not d.startswith("synthetic-")] or ["sample", "pdf"]
+        try:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                parity = classifier_parity(load_documents(names), args.random_pages)
+        except AssertionError as e:
+            print("PARIDAD FALLIDA", e)
+            return 1
+        print(f"classify_batch idéntico a la referencia: {parity['pages']} páginas, "
+              f"{parity['paragraphs']} párrafos (etiquetas, ids y probabilidades)")
+        return 0
+
+    # print() de diagnóstico del pipeline fuera de la tabla
+    results: Dict[str, Any] = {}
+    for name, data in load_documents(args.docs).items():
+        stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+        try:
+            results[name] = bench_document(data, args.repeat)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+    if results:
+        print(f"{'doc':<16}{'stage':<10}{'ms':>10}{'peak MiB':>10}")
+    for name, stages in results.items():
+        c = stages["_counts"]
+        for stage, st in stages.items():
+            if stage.startswith("_"):
+                continue
+            print(f"{name:<16}{stage:<10}{st['seconds'] * 1000:>10.1f}{st['peak_mib']:>10.2f}")
+        print(f"{'':<16}{c['pages']} páginas, {c['lines']} líneas, {c['paragraphs']} párrafos")
+
+    if args.long_paragraph:
+        lp = bench_long_paragraph(args.long_paragraph, args.repeat)
+        print(
+            f"párrafo de {lp['lines']} líneas: unión {lp['join_ms']:.2f} ms vs "
+            f"incremental {lp['join_incremental_ms']:.2f} ms (x{lp['speedup']:.1f}), "
+            f"group {lp['group_ms']:.2f} ms — texto idéntico"
+        )
+
+    if args.save:
+        baselines = {}
+        if os.path.exists(BASELINES_PATH):
+            with open(BASELINES_PATH, "r", encoding="utf-8") as f:
+                baselines = json.load(f)
+        baselines.update(results)
+        with open(BASELINES_PATH, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"Baseline guardado en {BASELINES_PATH}")
+
+    if args.check:
+        if not os.path.exists(BASELINES_PATH):
+            print("No hay baseline; corre primero con --save")
+            return 1
+        with open(BASELINES_PATH, "r", encoding="utf-8") as f:
+            regressions = _check(results, json.load(f), args.tolerance)
+        for r in regressions:
+            print("REGRESIÓN", r)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -32,6 +32,8 @@ TAG="${1:-lambda-v1}"
 echo "==> Build de imagen (${TAG})"
 # Fuerza builder heredado (no BuildKit) para obtener manifest simple aceptado por Lambda
 export DOCKER_BUILDKIT=0
+# Módulos compartidos (symlinks a ../shared) dentro del contexto de build
+mkdir -p .docker_shared && cp -L lambda_log.py .docker_shared/
 docker build -t "pdf-paragraphs:${TAG}" .
 
 echo "==> Login a ECR"
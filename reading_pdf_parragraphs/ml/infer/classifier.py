@@ -1,7 +1,11 @@
 import json
 import os
 import re
-from typing import List, Dict, Any, Tuple
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+from pdf_reader.core import Paragraph
+from pdf_reader.metrics import stage
 
 # Heurísticas básicas (solo para probar el flujo)
 _X_TOL = 14.0
@@ -51,6 +55,14 @@ _RE_TRANS = re.compile(
 )
 _RE_SHOT  = re.compile(r"^(CLOSE ON|ANGLE ON|POV|INSERT|SHOT|WIDE SHOT|ECU|CU|MS|WS)\b", re.IGNORECASE)
 _RE_PAREN = re.compile(r"^\s*\(.*\)\s*$")
+_RE_OMITTED = re.compile(r"\bOMITTED\b", re.IGNORECASE)
+_RE_LEADING_NUM = re.compile(r"^\s*\d+[A-Z]?\.?")
+# Caracteres que no cuentan para decidir si un texto está en MAYÚSCULAS
+_RE_NON_ALPHA = re.compile(r"[0-9 .,?¿!¡'\"()\/\-’`´]+", re.UNICODE)
+# Espacios, NBSP y zero-width que se ignoran al detectar números de escena
+_RE_INVISIBLE_WS = re.compile(r"[\s\u00a0\u200b\u200c\u200d\ufeff]+")
+# 123 | 12.34 | 3A
+_RE_NUMBER = re.compile(r"\d+(?:\.\d+|[A-Za-z])?")
 
 _CENTER_X = 306.0
 _CENTER_TOL = 16.0  # margen en puntos
@@ -110,7 +122,7 @@ def _looks_all_caps(s: str) -> bool:
 
 
 def get_alpha_core(s):
-    core = re.sub(r"[0-9 .,?¿!¡'\"()\/\-’`´]+", "", s, flags=re.UNICODE).strip()
+    core = _RE_NON_ALPHA.sub("", s).strip()
     return core
 
 def _bbox_x0x1(p: Dict[str, Any]) -> Tuple[float, float]:
@@ -144,8 +156,9 @@ def _is_centered(p, mid_target: float = _CENTER_X, tol: float = _CENTER_TOL) ->
     return abs(mid_text - mid_target) <= tol
 
 class DummyHeuristicClassifier:
-    def __init__(self, labels: List[str]):
+    def __init__(self, labels: List[str], version: str = ""):
         self.labels = labels
+        self.version = version
         self.index = {name: i for i, name in enumerate(labels)}
 
     def _pick(self, name: str, proba: float) -> Tuple[int, float]:
@@ -153,69 +166,24 @@ class DummyHeuristicClassifier:
         return idx, proba
 
     def classify_batch(self, paras: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        with stage("classify"):
+            return self._classify_batch(paras)
+
+    def _classify_batch(self, paras: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Features de la página en una sola pasada; luego reglas en orden de prioridad
+        feats = [_ParaFeatures(p) for p in paras]
         out = []
-        for p in paras:
-            t = (p.get("text") or "").strip()
-            x = _get_x(p)
-
-            # 1) TRANSITION: a la derecha + patrón típico
-            if x >= 370.0 or _RE_TRANS.search(t):
-                label = "Transition"
-                proba = 0.9 if x >= 370.0 else 0.8
-            # 2) SCENE HEADING: INT./EXT. ; si empieza con número → x≈55, sino x≈108
-            # 2) SCENE HEADING (flexible):
-            #    a) si matchea INT/EXT flexible con número opcional
-            #    b) o si trae ' - ' / ' — ' y un token de tiempo del día
-            #    c) y además respeta la X típica: ~55 si empieza con número, ~108 si no
-            elif _RE_SCENE_FLEX.match(t) or _RE_SCENE_DASH_TOD.search(t) or re.search(r"\bOMITTED\b", t, re.IGNORECASE):
-                starts_with_num = bool(re.match(r"^\s*\d+[A-Z]?\.?", t))
-                target = 55.0 if starts_with_num else 108.0
-                if _close_to(x, target):
-                    label, proba = "Scene Heading", 0.9
-                else:
-                    # Acepta como heading pero con menor confianza si la X se fue un poco
-                    label, proba = "Scene Heading", 0.75
-           # 3) CHARACTER: centrado ~252; nombre en mayúsculas (el resto puede llevar paréntesis/CONT’D)
-            elif _is_character_line(t, x):
-                label, proba = "Character", 0.92
-            # 4) PARENTHETICAL: línea entre paréntesis en ~208
-            elif _RE_PAREN.match(t) and _close_to(x, _TARGET_X["Parenthetical"]):
-                label, proba = "Parenthetical", 0.9
-            # 5) DIALOGUE: bloque a ~180 (no todo caps)
-            elif _close_to(x, _TARGET_X["Dialogue"]):
-                label, proba = "Dialogue", 0.8
-            # 6) SHOT: palabras clave de plano a ~108
-            elif _RE_SHOT.match(t) and _close_to(x, _TARGET_X["Shot"]):
-                label, proba = "Shot", 0.8
-            # 7) ACTION/GENERAL: ambos a ~108 → decide por texto (allcaps corto=título → General)
-            # se eliminan por ahor alos generales
-            elif _close_to(x, _TARGET_X["Action"]):
-                if len(t) < 30 and not _looks_all_caps(t):
-                    if t.endswith(":"):
-                        label, proba = "Transition", 0.8
-                    else:
-                        label, proba = "Action", 0.7
-                else:
-                    label, proba = "Action", 0.7
-
-            # 8) End of Act — SOLO si nada anterior aplicó
-            elif _is_centered(p) and _looks_all_caps(t):
-                label, proba = "End of Act", 0.88
-            # 9) NUMBER: entero, decimal, o entero + letra (p.ej. 3A)
-            elif (
-                re.fullmatch(
-                    r"\d+",
-                    (t_num := re.sub(r"[\s\u00a0\u200b\u200c\u200d\ufeff]+", "", t)),
-                )                               # 123 (incluye espacios/NBSP/ZWSP invisibles)
-                or re.fullmatch(r"\d+\.\d+", t_num)          # 12.34
-                or re.fullmatch(r"\d+[A-Za-z]", t_num)       # 3A, 12B
-            ):
-                label, proba = "Number", 0.9
+        for f in feats:
+            for rule in _RULES:
+                hit = rule(f)
+                if hit is not None:
+                    label, proba = hit
+                    break
             else:
                 label, proba = "Other", 0.5
 
             idx = self.index.get(label, self.index.get("Other", 0))
-            out.append({"label_id": idx, "label": self.labels[idx], "proba": proba, "origin_x": x})
+            out.append({"label_id": idx, "label": self.labels[idx], "proba": proba, "origin_x": f.x})
         # Check if current label is 'Character' and next is not 'Parenthetical' or 'Dialogue'
         for i, o in enumerate(out):
             if o['label'] == 'Character':
@@ -225,6 +193,136 @@ class DummyHeuristicClassifier:
         return out
 
 
+# ===== Motor de reglas =====
+class _ParaFeatures:
+    """Texto y features horizontales de un párrafo, calculados una sola vez."""
+    __slots__ = ("p", "text", "x", "mid")
+
+    def __init__(self, p: Any):
+        self.p = p
+        if isinstance(p, Paragraph):
+            # Registro compacto de pdf_reader.core: atributos directos, sin dict
+            self.text = (p.text or "").strip()
+            self.x = p.left_x
+            self.mid = (p.left_x + p.right_x) / 2.0
+            return
+        self.text = (p.get("text") or "").strip()
+        self.x = _get_x(p)
+        x0, x1 = _bbox_x0x1(p)
+        self.mid = (x0 + x1) / 2.0
+
+
+# Cada regla devuelve (label, proba) o None; se evalúan en orden y gana la primera.
+def _rule_transition(f: _ParaFeatures) -> Optional[Tuple[str, float]]:
+    # 1) TRANSITION: a la derecha + patrón típico
+    if f.x >= 370.0:
+        return "Transition", 0.9
+    # Todas las transiciones terminan en ':' → se evita el search en el resto
+    if f.text.endswith(":") and _RE_TRANS.search(f.text):
+        return "Transition", 0.8
+    return None
+
+def _rule_scene_heading(f: _ParaFeatures) -> Optional[Tuple[str, float]]:
+    # 2) SCENE HEADING (flexible):
+    #    a) si matchea INT/EXT flexible con número opcional
+    #    b) o si trae ' - ' / ' — ' y un token de tiempo del día
+    #    c) y además respeta la X típica: ~55 si empieza con número, ~108 si no
+    t = f.text
+    has_dash = "-" in t or "—" in t
+    if not (_RE_SCENE_FLEX.match(t) or (has_dash and _RE_SCENE_DASH_TOD.search(t)) or _RE_OMITTED.search(t)):
+        return None
+    target = 55.0 if _RE_LEADING_NUM.match(t) else 108.0
+    # Acepta como heading pero con menor confianza si la X se fue un poco
+    return "Scene Heading", 0.9 if _close_to(f.x, target) else 0.75
+
+def _rule_character(f: _ParaFeatures) -> Optional[Tuple[str, float]]:
+    # 3) CHARACTER: centrado ~252; nombre en mayúsculas (el resto puede llevar paréntesis/CONT’D)
+    return ("Character", 0.92) if _is_character_line(f.text, f.x) else None
+
+def _rule_parenthetical(f: _ParaFeatures) -> Optional[Tuple[str, float]]:
+    # 4) PARENTHETICAL: línea entre paréntesis en ~208
+    if _close_to(f.x, _TARGET_X["Parenthetical"]) and _RE_PAREN.match(f.text):
+        return "Parenthetical", 0.9
+    return None
+
+def _rule_dialogue(f: _ParaFeatures) -> Optional[Tuple[str, float]]:
+    # 5) DIALOGUE: bloque a ~180 (no todo caps)
+    return ("Dialogue", 0.8) if _close_to(f.x, _TARGET_X["Dialogue"]) else None
+
+def _rule_shot(f: _ParaFeatures) -> Optional[Tuple[str, float]]:
+    # 6) SHOT: palabras clave de plano a ~108
+    if _close_to(f.x, _TARGET_X["Shot"]) and _RE_SHOT.match(f.text):
+        return "Shot", 0.8
+    return None
+
+def _rule_action(f: _ParaFeatures) -> Optional[Tuple[str, float]]:
+    # 7) ACTION/GENERAL: ambos a ~108 → decide por texto (allcaps corto=título → General)
+    # se eliminan por ahor alos generales
+    if not _close_to(f.x, _TARGET_X["Action"]):
+        return None
+    t = f.text
+    if len(t) < 30 and t.endswith(":") and not _looks_all_caps(t):
+        return "Transition", 0.8
+    return "Action", 0.7
+
+def _rule_end_of_act(f: _ParaFeatures) -> Optional[Tuple[str, float]]:
+    # 8) End of Act — SOLO si nada anterior aplicó
+    if abs(f.mid - _CENTER_X) <= _CENTER_TOL and _looks_all_caps(f.text):
+        return "End of Act", 0.88
+    return None
+
+def _rule_number(f: _ParaFeatures) -> Optional[Tuple[str, float]]:
+    # 9) NUMBER: entero, decimal, o entero + letra (p.ej. 3A), ignorando espacios/NBSP/ZWSP
+    if _RE_NUMBER.fullmatch(_RE_INVISIBLE_WS.sub("", f.text)):
+        return "Number", 0.9
+    return None
+
+_RULES = (
+    _rule_transition,
+    _rule_scene_heading,
+    _rule_character,
+    _rule_parenthetical,
+    _rule_dialogue,
+    _rule_shot,
+    _rule_action,
+    _rule_end_of_act,
+    _rule_number,
+)
+
 def load_model(model_dir: str):
     labels = _load_labels(model_dir)
-    return DummyHeuristicClassifier(labels)
\ No newline at end of file
+    return DummyHeuristicClassifier(labels, version=os.path.basename(os.path.normpath(model_dir)))
+
+
+# ===== Registro de modelos por proceso =====
+# (directorio de artefactos absoluto, versión) -> clasificador ya construido.
+# Vive mientras viva el contenedor: se carga una vez y se reutiliza entre invocaciones.
+_MODEL_REGISTRY: Dict[Tuple[str, str], DummyHeuristicClassifier] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_model(artifacts_dir: str, version: str = "v1") -> DummyHeuristicClassifier:
+    """
+    Devuelve el modelo de `artifacts_dir/version`, cargándolo solo la primera vez.
+    Varias versiones pueden convivir (cada una con su entrada en el registro).
+    """
+    key = (os.path.abspath(artifacts_dir), version)
+    model = _MODEL_REGISTRY.get(key)
+    if model is None:
+        with _REGISTRY_LOCK:
+            model = _MODEL_REGISTRY.get(key)
+            if model is None:
+                model = load_model(os.path.join(artifacts_dir, version))
+                _MODEL_REGISTRY[key] = model
+    return model
+
+
+def warm_models(artifacts_dir: str, versions: Optional[List[str]] = None) -> List[DummyHeuristicClassifier]:
+    """Precarga versiones (p. ej. en la fase init del handler). Por defecto solo v1."""
+    return [get_model(artifacts_dir, v) for v in (versions or ["v1"])]
+
+
+def clear_model_cache() -> None:
+    """Vacía el registro (útil si se reemplazan artefactos en caliente o en pruebas)."""
+    with _REGISTRY_LOCK:
+        _MODEL_REGISTRY.clear()
\ No newline at end of file
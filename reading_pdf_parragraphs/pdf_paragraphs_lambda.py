@@ -9,15 +9,53 @@ import json
 import sys
 import base64
 from io import BytesIO
-from typing import Any, Dict, List
+import difflib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 # Para correr local con .env (en Lambda NO es necesario)
 from dotenv import load_dotenv
 load_dotenv()
 
+from lambda_log import get_logger, truncate
+
+log = get_logger("reading_pdf_paragraphs")
+
 # --- imports de tu pipeline ---
-from pdf_reader.core import doc_summary, iter_pages_paragraphs
-from ml.infer.classifier import load_model
+from pdf_reader.core import PDF_WORKERS_MAX, doc_summary, iter_pages_records, open_pdf_bytes, page_fingerprint, page_paragraphs
+from ml.infer.classifier import get_model, warm_models
+from pdf_reader.metrics import RequestMetrics, collecting, incr, stage
+from pdf_reader.cache import ResultCache, cache_from_spec
+from pdf_reader.scenes import iter_scenes
+
+# Procesos para extraer páginas en paralelo (1 = secuencial)
+PDF_WORKERS_DEFAULT = int(os.getenv("PDF_WORKERS", "1"))
+
+# Artefactos del clasificador: ml/artifacts/<versión>
+MODEL_ARTIFACTS_DIR = os.getenv("MODEL_ARTIFACTS_DIR", "ml/artifacts")
+MODEL_VERSION_DEFAULT = os.getenv("MODEL_VERSION", "v1")
+
+# Cache de resultados por hash del PDF: "memory" (default), "disk:/tmp/pdf-cache", "s3://bucket/prefix" u "off"
+RESULT_CACHE = cache_from_spec(os.getenv("RESULT_CACHE", "memory"))
+
+# Modo lote ("documents": [...]): procesos en paralelo y presupuesto total de memoria (MB).
+# Son topes: batch_workers / memory_mb del request solo pueden pedir menos
+BATCH_WORKERS_DEFAULT = int(os.getenv("BATCH_WORKERS", "2"))
+BATCH_MEMORY_MB = int(os.getenv("BATCH_MEMORY_MB", "1536"))
+# Estimación de memoria: cada proceso worker (intérprete + modelo) y cada PDF
+# en curso (~8 MB por MB de PDF: documento abierto, líneas, párrafos, resultado)
+BATCH_WORKER_BASE_MB = 64
+BATCH_MB_PER_PDF_MB = 8
+BATCH_DOC_OVERHEAD_MB = 16
+# Documentos {"path": ...} del lote: solo rutas dentro de este directorio (sin
+# definir = deshabilitado). Nunca se aceptan en eventos de API Gateway.
+BATCH_LOCAL_ROOT = os.getenv("BATCH_LOCAL_ROOT", "")
+
+# Fase init de Lambda: los modelos quedan cargados para todas las invocaciones del contenedor
+warm_models(
+    MODEL_ARTIFACTS_DIR,
+    [v.strip() for v in os.getenv("WARM_MODEL_VERSIONS", MODEL_VERSION_DEFAULT).split(",") if v.strip()],
+)
 
 # === Helpers ===
 def _get_payload(event):
@@ -48,6 +86,13 @@ def _json_response(status: int, obj: Any) -> Dict[str, Any]:
         "body": json.dumps(obj, ensure_ascii=False)
     }
 
+def _ndjson_response(status: int, lines: Iterable[str]) -> Dict[str, Any]:
+    return {
+        "statusCode": status,
+        "headers": {"Content-Type": "application/x-ndjson; charset=utf-8"},
+        "body": "".join(lines)
+    }
+
 def parse_pages_arg(spec: str, max_pages: int) -> set[int]:
     """
     Convierte '3-5,10,12-' en un set de páginas {3,4,5,10,12,13,...max_pages}.
@@ -82,15 +127,6 @@ def parse_pages_arg(spec: str, max_pages: int) -> set[int]:
                 pass
     return pages
 
-def _save_tmp_pdf(pdf_bytes: bytes, filename: str = "incoming.pdf") -> str:
-    """
-    Guarda el PDF en /tmp (escritura permitida en Lambda) y devuelve la ruta.
-    """
-    tmp_path = f"/tmp/{filename}"
-    with open(tmp_path, "wb") as f:
-        f.write(pdf_bytes)
-    return tmp_path
-
 def _extract_body(event: Dict[str, Any]) -> Dict[str, Any]:
     """
     Extrae un JSON desde:
@@ -120,101 +156,463 @@ def _extract_body(event: Dict[str, Any]) -> Dict[str, Any]:
 
 # === Core ===
 
-def classify_pdf_from_bytes(pdf_bytes: bytes, pages_spec: str = "", y_gap: float = 15.0, indent_gap: float = 12.0) -> List[Dict[str, Any]]:
+def _pages_target(pages_spec: str, total_pages: int) -> set[int]:
+    return parse_pages_arg(pages_spec, total_pages) if pages_spec else set(range(1, total_pages + 1))
+
+def _classify_page(model, page: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Clasifica los párrafos de una página y arma los registros de salida."""
+    paras = page.get("paragraphs") or []
+    if not paras:
+        return []
+    preds = model.classify_batch(paras)
+    return [
+        {
+            "page": page["page_number"],
+            "text": p.get("text", ""),
+            # "left_x": p.get("left_x"),
+            # "right_x": p.get("right_x"),
+            "start_y": p.get("start_y"),
+            "end_y": p.get("end_y"),
+            # "lines_count": p.get("lines_count"),
+            "label": pred["label"],
+            "proba": pred["proba"],
+        }
+        for p, pred in zip(paras, preds)
+    ]
+
+def iter_classified_pages(pdf_bytes: bytes, pages_spec: str = "", y_gap: float = 15.0, indent_gap: float = 12.0, workers: int = PDF_WORKERS_DEFAULT, model_version: str = MODEL_VERSION_DEFAULT, use_cache: bool = True, previous_document_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
     """
-    Recibe PDF en bytes, clasifica párrafos con tu pipeline y devuelve lista de dicts.
+    Generador: clasifica página a página y entrega {page, paragraphs} en cuanto
+    cada página está lista (las páginas sin párrafos se omiten).
+    workers > 1 extrae las páginas en paralelo con un pool de procesos.
+    Con cache (RESULT_CACHE) las páginas ya vistas de este mismo PDF y
+    parámetros salen de la cache; si están todas, el PDF ni se abre.
+    Con previous_document_id (document_id de un borrador anterior ya procesado)
+    las páginas cuya huella de líneas coincide con alguna del borrador anterior
+    reutilizan sus párrafos: solo se agrupan y clasifican las páginas cambiadas.
     """
-    print(f"=== INICIANDO PROCESAMIENTO ===")
-    print(f"PDF bytes: {len(pdf_bytes)} bytes")
-    print(f"Pages spec: '{pages_spec}'")
-    print(f"Y gap: {y_gap}, Indent gap: {indent_gap}")
-    
-    # Guardar a /tmp y usar el pipeline existente basado en ruta
-    pdf_path = _save_tmp_pdf(pdf_bytes)
-    print(f"PDF guardado en: {pdf_path}")
+    log.debug("Procesando PDF", bytes=len(pdf_bytes), pages=pages_spec, y_gap=y_gap, indent_gap=indent_gap, workers=workers)
+
+    model = get_model(MODEL_ARTIFACTS_DIR, model_version)
+    cache = RESULT_CACHE if use_cache else None
+
+    cached: Dict[int, List[Dict[str, Any]]] = {}
+    cached_meta: Optional[Dict[str, Any]] = None
+    if cache is not None:
+        doc_key = ResultCache.document_key(ResultCache.document_id(pdf_bytes), y_gap, indent_gap, model.version)
+        cached_meta = cache.get_meta(doc_key)
+        if cached_meta:
+            pages_target = _pages_target(pages_spec, cached_meta["pages"])
+            cached = cache.get_pages(doc_key, pages_target)
+            incr("cache_hit_pages", len(cached))
+            if len(cached) == len(pages_target):
+                for n in sorted(pages_target):
+                    if cached[n]:
+                        yield {"page": n, "paragraphs": cached[n]}
+                return
+
+    # Huella -> página del borrador anterior (solo si está en cache)
+    previous_pages: Dict[str, int] = {}
+    if cache is not None and previous_document_id:
+        prev_key = ResultCache.document_key(previous_document_id, y_gap, indent_gap, model.version)
+        prev_meta = cache.get_meta(prev_key) or {}
+        previous_pages = {fp: int(n) for n, fp in (prev_meta.get("fingerprints") or {}).items()}
+
+    # Una sola apertura en memoria, compartida por el resumen y la extracción
+    with open_pdf_bytes(pdf_bytes) as doc:
+        meta = doc_summary(doc)
+        total_pages = meta.get("pages") or 0
+        pages_target = _pages_target(pages_spec, total_pages)
+        fingerprints: Dict[str, str] = dict((cached_meta or {}).get("fingerprints") or {})
 
-    print("Cargando modelo de clasificación...")
-    model = load_model("ml/artifacts/v1")
+        # Solo se extraen las páginas pedidas que no están en cache (y se corta tras la última)
+        missing = pages_target - cached.keys()
+        fresh = iter_pages_records(doc, workers=workers, pages=missing)
+        for n in sorted(pages_target):
+            if n in cached:
+                records = cached[n]
+            else:
+                # fresh entrega las páginas faltantes en el mismo orden ascendente
+                page = next(fresh)
+                fp = page_fingerprint(page["lines"], page["fonts"])
+                fingerprints[str(n)] = fp
+                records = None
+                if fp in previous_pages:
+                    prev = cache.get_pages(prev_key, [previous_pages[fp]]).get(previous_pages[fp])
+                    if prev is not None:
+                        records = [dict(r, page=n) for r in prev]
+                        incr("reused_pages")
+                if records is None:
+                    paras = page_paragraphs(page["lines"], page["fonts"], y_gap, indent_gap)
+                    records = _classify_page(model, {"page_number": n, "paragraphs": paras})
+                if cache is not None:
+                    cache.put_page(doc_key, n, records)
+            if records:
+                yield {"page": n, "paragraphs": records}
 
-    meta = doc_summary(pdf_path)
-    total_pages = meta.get("pages") or 0
-    pages_target = parse_pages_arg(pages_spec, total_pages) if pages_spec else set(range(1, total_pages + 1))
+        if cache is not None:
+            cache.put_meta(doc_key, {"pages": total_pages, "fingerprints": fingerprints})
 
+def classify_pdf_from_bytes(pdf_bytes: bytes, pages_spec: str = "", y_gap: float = 15.0, indent_gap: float = 12.0, workers: int = PDF_WORKERS_DEFAULT, model_version: str = MODEL_VERSION_DEFAULT, use_cache: bool = True, previous_document_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Recibe PDF en bytes, clasifica párrafos con tu pipeline y devuelve lista de dicts.
+    workers > 1 extrae las páginas en paralelo con un pool de procesos.
+    previous_document_id reutiliza las páginas sin cambios de un borrador anterior.
+    """
     results: List[Dict[str, Any]] = []
-    for page in iter_pages_paragraphs(pdf_path, y_gap_threshold=y_gap, indent_threshold=indent_gap):
-        if page["page_number"] not in pages_target:
+    for page in iter_classified_pages(pdf_bytes, pages_spec=pages_spec, y_gap=y_gap, indent_gap=indent_gap, workers=workers, model_version=model_version, use_cache=use_cache, previous_document_id=previous_document_id):
+        results.extend(page["paragraphs"])
+
+    # Párrafos con end_y < start_y: solo se avisa la cantidad y el primero
+    invalid = [p for p in results if p.get("end_y", 0) < p.get("start_y", 0)]
+    if invalid:
+        log.warning("%d párrafos con end_y < start_y", len(invalid), primero=invalid[0])
+    return results
+
+def iter_ndjson(pdf_bytes: bytes, **kwargs) -> Iterator[str]:
+    """
+    Salida en streaming: una línea NDJSON por página clasificada
+    ({"page": n, "paragraphs": [...]}) y una línea final {"done": true, ...}.
+    Acepta los mismos kwargs que iter_classified_pages. Sirve tanto para
+    Lambda response streaming como para consumirlo localmente como generador.
+    """
+    pages = 0
+    paragraphs = 0
+    for page in iter_classified_pages(pdf_bytes, **kwargs):
+        pages += 1
+        paragraphs += len(page["paragraphs"])
+        with stage("serialise"):
+            line = json.dumps(page, ensure_ascii=False) + "\n"
+        yield line
+    yield json.dumps({"done": True, "pages": pages, "paragraph_count": paragraphs}) + "\n"
+
+def iter_scenes_ndjson(pdf_bytes: bytes, include_omitted: bool = False, **kwargs) -> Iterator[str]:
+    """
+    Como iter_ndjson pero por escenas: una línea {"content": [...]} por escena
+    (formato de scene_breakdown) en cuanto se cierra, y al final {"done": true, ...}.
+    """
+    scenes = 0
+    for scene in iter_scenes(iter_classified_pages(pdf_bytes, **kwargs), include_omitted=include_omitted):
+        scenes += 1
+        with stage("serialise"):
+            line = json.dumps(scene, ensure_ascii=False) + "\n"
+        yield line
+    yield json.dumps({"done": True, "scenes": scenes}) + "\n"
+
+# === Revisiones ===
+
+def previous_paragraphs(previous_document_id: str, pages_spec: str = "", y_gap: float = 15.0, indent_gap: float = 12.0, model_version: str = MODEL_VERSION_DEFAULT) -> Optional[List[Dict[str, Any]]]:
+    """
+    Párrafos cacheados del borrador anterior (mismo rango de páginas que el
+    request), o None si el borrador no está en RESULT_CACHE con estos parámetros.
+    """
+    if RESULT_CACHE is None:
+        return None
+    version = get_model(MODEL_ARTIFACTS_DIR, model_version).version
+    prev_key = ResultCache.document_key(previous_document_id, y_gap, indent_gap, version)
+    prev_meta = RESULT_CACHE.get_meta(prev_key)
+    if not prev_meta:
+        return None
+    found = RESULT_CACHE.get_pages(prev_key, _pages_target(pages_spec, prev_meta.get("pages") or 0))
+    return [p for n in sorted(found) for p in found[n]]
+
+def diff_paragraphs(before: List[Dict[str, Any]], after: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """
+    Diferencias entre dos listas de párrafos clasificados (por texto + etiqueta):
+      added   párrafos nuevos
+      removed párrafos que ya no están
+      changed pares {before, after} de párrafos reemplazados
+    """
+    keys_a = [(p.get("label"), p.get("text")) for p in before]
+    keys_b = [(p.get("label"), p.get("text")) for p in after]
+    diff: Dict[str, List[Any]] = {"added": [], "removed": [], "changed": []}
+    matcher = difflib.SequenceMatcher(None, keys_a, keys_b, autojunk=False)
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op == "equal":
             continue
+        old_part, new_part = before[i1:i2], after[j1:j2]
+        pairs = min(len(old_part), len(new_part)) if op == "replace" else 0
+        diff["changed"].extend({"before": a, "after": b} for a, b in zip(old_part[:pairs], new_part[:pairs]))
+        diff["removed"].extend(old_part[pairs:])
+        diff["added"].extend(new_part[pairs:])
+    return diff
+
+# === Lote (batch) ===
+
+def _is_api_gateway_event(event: Any) -> bool:
+    """Eventos de API Gateway (REST v1 / HTTP v2): el body viene de un cliente externo."""
+    return isinstance(event, dict) and any(k in event for k in ("requestContext", "httpMethod", "routeKey"))
+
+def _local_path(path: Any) -> str:
+    """
+    Ruta real de un documento {"path": ...}, que debe quedar dentro de
+    BATCH_LOCAL_ROOT (se resuelven symlinks y "..").
+    """
+    if not BATCH_LOCAL_ROOT:
+        raise ValueError("Documentos por 'path' deshabilitados (definir BATCH_LOCAL_ROOT).")
+    root = os.path.realpath(BATCH_LOCAL_ROOT)
+    real = os.path.realpath(os.path.join(root, str(path)))
+    if os.path.commonpath([root, real]) != root or not os.path.isfile(real):
+        # Mismo mensaje para "fuera del directorio" e "inexistente": no revela qué archivos hay
+        raise ValueError("'path' no es un archivo dentro de BATCH_LOCAL_ROOT.")
+    return real
+
+def _document_size(doc: Dict[str, Any]) -> int:
+    """Tamaño en bytes del PDF referenciado, sin cargarlo."""
+    if doc.get("pdf_base64"):
+        return len(doc["pdf_base64"]) * 3 // 4
+    if doc.get("path"):
+        return os.path.getsize(_local_path(doc["path"]))
+    if doc.get("s3_bucket") and doc.get("s3_key"):
+        import boto3  # solo en modo lote con referencias S3
+        head = boto3.client("s3").head_object(Bucket=doc["s3_bucket"], Key=doc["s3_key"])
+        return int(head["ContentLength"])
+    raise ValueError("Documento sin 'pdf_base64', 'path' ni 's3_bucket'/'s3_key'.")
+
+def _load_document(doc: Dict[str, Any]) -> bytes:
+    """Bytes del PDF: base64 en línea, ruta local o objeto S3."""
+    if doc.get("pdf_base64"):
+        return base64.b64decode(doc["pdf_base64"])
+    if doc.get("path"):
+        with open(_local_path(doc["path"]), "rb") as f:
+            return f.read()
+    if doc.get("s3_bucket") and doc.get("s3_key"):
+        import boto3
+        obj = boto3.client("s3").get_object(Bucket=doc["s3_bucket"], Key=doc["s3_key"])
+        return obj["Body"].read()
+    raise ValueError("Documento sin 'pdf_base64', 'path' ni 's3_bucket'/'s3_key'.")
+
+def _estimate_mb(size: int) -> float:
+    return BATCH_DOC_OVERHEAD_MB + BATCH_MB_PER_PDF_MB * size / (1024 * 1024)
+
+def _classify_document(doc: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Worker del lote: carga y clasifica un documento con classify_pdf_from_bytes.
+    Nunca lanza: los errores quedan en el resultado de ese documento.
+    """
+    try:
+        pdf_bytes = _load_document(doc)
+        paragraphs = classify_pdf_from_bytes(
+            pdf_bytes,
+            pages_spec=str(doc.get("pages", options["pages_spec"]) or "").strip(),
+            y_gap=options["y_gap"],
+            indent_gap=options["indent_gap"],
+            workers=1,  # el paralelismo del lote es por documento
+            model_version=options["model_version"],
+            use_cache=options["use_cache"],
+        )
+        return {"document_id": ResultCache.document_id(pdf_bytes), "paragraphs": paragraphs}
+    except Exception as e:
+        log.warning("Error en documento del lote: %r", e)
+        return {"error": str(e) or repr(e)}
 
-        paras = page.get("paragraphs") or []
-        if not paras:
+def classify_documents(documents: List[Dict[str, Any]], pages_spec: str = "", y_gap: float = 15.0, indent_gap: float = 12.0, workers: int = BATCH_WORKERS_DEFAULT, memory_mb: int = BATCH_MEMORY_MB, model_version: str = MODEL_VERSION_DEFAULT, use_cache: bool = True, allow_paths: bool = True) -> List[Dict[str, Any]]:
+    """
+    Clasifica un lote de documentos ({pdf_base64} | {path} | {s3_bucket, s3_key},
+    opcionalmente con "id" y "pages" propios) en un pool de `workers` procesos.
+    {path} solo se acepta con allow_paths y dentro de BATCH_LOCAL_ROOT.
+
+    Presupuesto de memoria: memory_mb cubre los procesos worker y la estimación
+    de cada PDF en curso; un documento solo arranca si cabe en lo que queda
+    (si no, espera a que termine otro). Un documento que por sí solo no cabe
+    se rechaza. Devuelve un resultado por documento, en el orden recibido:
+    {index, id?, document_id, paragraphs} o {index, id?, error}.
+    """
+    options = {"pages_spec": pages_spec, "y_gap": y_gap, "indent_gap": indent_gap, "model_version": model_version, "use_cache": use_cache}
+    results: List[Optional[Dict[str, Any]]] = [None] * len(documents)
+
+    # Menos procesos si el presupuesto no alcanza para sus intérpretes
+    workers = max(1, min(workers, len(documents)))
+    while workers > 1 and memory_mb - workers * BATCH_WORKER_BASE_MB < BATCH_WORKER_BASE_MB:
+        workers -= 1
+    doc_budget = memory_mb - workers * BATCH_WORKER_BASE_MB if workers > 1 else memory_mb
+
+    queue: List[Tuple[int, Dict[str, Any], float]] = []
+    for i, doc in enumerate(documents):
+        try:
+            if not isinstance(doc, dict):
+                raise ValueError("Cada documento debe ser un objeto JSON.")
+            if doc.get("path") and not allow_paths:
+                raise ValueError("'path' no se acepta en este endpoint; usar 'pdf_base64' o 's3_bucket'/'s3_key'.")
+            estimate = _estimate_mb(_document_size(doc))
+        except Exception as e:
+            results[i] = {"error": str(e) or repr(e)}
             continue
+        if estimate > doc_budget:
+            results[i] = {"error": f"Documento de ~{estimate:.0f} MB excede el presupuesto de memoria del lote ({doc_budget:.0f} MB)."}
+            continue
+        queue.append((i, doc, estimate))
 
-        preds = model.classify_batch(paras)
-        for p, pred in zip(paras, preds):
-            results.append({
-                "page": page["page_number"],
-                "text": p.get("text", ""),
-                # "left_x": p.get("left_x"),
-                # "right_x": p.get("right_x"),
-                "start_y": p.get("start_y"),
-                "end_y": p.get("end_y"),
-                # "lines_count": p.get("lines_count"),
-                "label": pred["label"],
-                "proba": pred["proba"],
-            })
-
-    # Find the object with the maximum end_y
-    min_obj = min(results, key=lambda p: p.get("start_y", 0), default=None)
-    max_obj = max(results, key=lambda p: p.get("end_y", 0), default=None)
-    # Find objects where end_y < start_y
-    invalid_objs = [p for p in results if p.get("end_y", 0) < p.get("start_y", 0)]
-    print("Objects where end_y < start_y:", invalid_objs)
-    return results
+    executor = None
+    if workers > 1 and len(queue) > 1:
+        try:
+            executor = ProcessPoolExecutor(max_workers=workers)
+        except (OSError, NotImplementedError) as e:
+            # Lambda no tiene /dev/shm → multiprocessing no puede crear semáforos
+            log.warning("Pool de procesos no disponible (%r); lote secuencial.", e)
+
+    with stage("batch"):
+        if executor is None:
+            for i, doc, _ in queue:
+                results[i] = _classify_document(doc, options)
+        else:
+            with executor:
+                running: Dict[Any, Tuple[int, float]] = {}
+                in_use = 0.0
+                while queue or running:
+                    # Admisión en orden mientras haya proceso libre y memoria
+                    while queue and len(running) < workers and in_use + queue[0][2] <= doc_budget:
+                        i, doc, estimate = queue.pop(0)
+                        running[executor.submit(_classify_document, doc, options)] = (i, estimate)
+                        in_use += estimate
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        i, estimate = running.pop(fut)
+                        in_use -= estimate
+                        try:
+                            results[i] = fut.result()
+                        except Exception as e:
+                            # p.ej. worker muerto por falta de memoria
+                            results[i] = {"error": str(e) or repr(e)}
+
+    out: List[Dict[str, Any]] = []
+    for i, (doc, res) in enumerate(zip(documents, results)):
+        entry: Dict[str, Any] = {"index": i}
+        if isinstance(doc, dict) and doc.get("id") is not None:
+            entry["id"] = doc["id"]
+        entry.update(res or {"error": "sin resultado"})
+        incr("documents_failed" if "error" in entry else "documents")
+        out.append(entry)
+    return out
 
 # === Lambda handler ===
 
 def lambda_handler(event, context):
-    print("=== LAMBDA HANDLER INICIADO ===")
-    data = _get_payload(event)
+    # Una línea EMF por request con duración de cada etapa y contadores
+    metrics = RequestMetrics()
+    try:
+        with collecting(metrics):
+            return _handle(event, metrics)
+    finally:
+        metrics.emit()
+
+def _handle(event, metrics: RequestMetrics):
     """
     Espera un JSON con:
       - pdf_base64: str  (PDF en base64)  [recomendado ahora]
       - pages: str       (rango, ej. "2-5", "1,4,7-8", "10-", "-3")
       - y_gap: float     (umbral de salto vertical; default 15.0)
       - indent_gap: float(default 12.0)
+      - workers: int     (procesos para extraer páginas; default PDF_WORKERS o 1,
+                         máximo PDF_WORKERS_MAX o las CPUs del contenedor)
+      - model_version: str (versión en ml/artifacts; default MODEL_VERSION o "v1")
+      - format: str      ("json" por defecto; "ndjson" = una línea por página)
+      - metrics: bool    (incluye duraciones, memoria por etapa y contadores en la respuesta JSON)
+      - cache: bool      (default true; false ignora y no actualiza la cache de resultados)
+      - previous_document_id: str (document_id de un borrador anterior: reutiliza sus
+                         páginas sin cambios y agrega "diff" {added, removed, changed}.
+                         Usa la cache: 400 con cache=false, 404 si el borrador no está)
+      - output: str      ("paragraphs" por defecto; "scenes" = escenas listas para
+                         scene_breakdown: {document_id, scenes: [{content: [...]}]} o, con
+                         format=ndjson, una línea por escena)
+      - include_omitted: bool (con output=scenes conserva las escenas OMITTED/OMITIDA)
+      - documents: list  (modo lote, en lugar de pdf_base64: [{pdf_base64 | path |
+                         s3_bucket+s3_key, id?, pages?}, ...]; usa además
+                         batch_workers y memory_mb, limitados a BATCH_WORKERS /
+                         BATCH_MEMORY_MB. path: relativo a BATCH_LOCAL_ROOT,
+                         solo en invocación directa, nunca vía API Gateway)
 
     Devuelve:
-      { paragraphs: [ {page, text, left_x, right_x, start_y, end_y, lines_count, label, proba}, ... ] }
+      { document_id, paragraphs: [ {page, text, left_x, right_x, start_y, end_y, lines_count, label, proba}, ... ] }
+      o, con format=ndjson, líneas {page, paragraphs} seguidas de {done, pages, paragraph_count}
+      o, en modo lote, { documents: [ {index, id?, document_id, paragraphs} | {index, id?, error} ], ok, failed }
     """
     try:
         body = _extract_body(event)
-        print(f"Body extraído: {list(body.keys()) if body else 'VACÍO'}")
+        log.debug("Body extraído", keys=list(body.keys()) if body else [])
 
         # Parámetros
         pdf_b64 = body.get("pdf_base64")
         pages   = (body.get("pages") or "").strip()
         y_gap   = float(body.get("y_gap", 15.0))
         indent  = float(body.get("indent_gap", 12.0))
-        
-        print(f"Parámetros - Pages: '{pages}', Y_gap: {y_gap}, Indent: {indent}")
-        print(f"PDF base64 length: {len(pdf_b64) if pdf_b64 else 0}")
+        workers = max(1, min(int(body.get("workers", PDF_WORKERS_DEFAULT)), PDF_WORKERS_MAX))
+        model_version = str(body.get("model_version") or MODEL_VERSION_DEFAULT)
+        out_format = str(body.get("format") or "json").lower()
+        want_metrics = bool(body.get("metrics", False))
+        use_cache = bool(body.get("cache", True))
+        previous_id = body.get("previous_document_id") or None
+        output = str(body.get("output") or "paragraphs").lower()
+        include_omitted = bool(body.get("include_omitted", False))
+
+        log.info("Request", pages=pages, y_gap=y_gap, indent_gap=indent, workers=workers,
+                 format=out_format, output=output, pdf_base64_chars=len(pdf_b64) if pdf_b64 else 0,
+                 documents=len(body["documents"]) if isinstance(body.get("documents"), list) else None)
+
+        documents = body.get("documents")
+        if isinstance(documents, list):
+            results = classify_documents(
+                documents,
+                pages_spec=pages,
+                y_gap=y_gap,
+                indent_gap=indent,
+                # El body solo puede bajar los topes de BATCH_WORKERS / BATCH_MEMORY_MB, nunca subirlos
+                workers=max(1, min(int(body.get("batch_workers", BATCH_WORKERS_DEFAULT)), BATCH_WORKERS_DEFAULT)),
+                memory_mb=max(1, min(int(body.get("memory_mb", BATCH_MEMORY_MB)), BATCH_MEMORY_MB)),
+                model_version=model_version,
+                use_cache=use_cache,
+                allow_paths=not _is_api_gateway_event(event),
+            )
+            failed = sum(1 for r in results if "error" in r)
+            payload = {"documents": results, "ok": len(results) - failed, "failed": failed}
+            if want_metrics:
+                payload["metrics"] = metrics.as_dict()
+            with stage("serialise"):
+                return _json_response(200, payload)
 
         if not pdf_b64:
             return _json_response(400, {"error": "Falta 'pdf_base64' en el body."})
 
         # Decode base64
         try:
-            pdf_bytes = base64.b64decode(pdf_b64)
+            with stage("decode"):
+                pdf_bytes = base64.b64decode(pdf_b64)
         except Exception as e:
             return _json_response(400, {"error": f"pdf_base64 inválido: {repr(e)}"})
 
         # Clasificar
-        paragraphs = classify_pdf_from_bytes(pdf_bytes, pages_spec=pages, y_gap=y_gap, indent_gap=indent)
-        return _json_response(200, {"paragraphs": paragraphs, "test": "este es mi test"})
+        if output == "scenes":
+            kwargs = dict(pages_spec=pages, y_gap=y_gap, indent_gap=indent, workers=workers, model_version=model_version, use_cache=use_cache, previous_document_id=previous_id)
+            if out_format == "ndjson":
+                return _ndjson_response(200, iter_scenes_ndjson(pdf_bytes, include_omitted=include_omitted, **kwargs))
+            scenes = list(iter_scenes(iter_classified_pages(pdf_bytes, **kwargs), include_omitted=include_omitted))
+            payload = {"document_id": ResultCache.document_id(pdf_bytes), "scenes": scenes}
+            if want_metrics:
+                payload["metrics"] = metrics.as_dict()
+            with stage("serialise"):
+                return _json_response(200, payload)
+        if out_format == "ndjson":
+            return _ndjson_response(200, iter_ndjson(pdf_bytes, pages_spec=pages, y_gap=y_gap, indent_gap=indent, workers=workers, model_version=model_version, use_cache=use_cache, previous_document_id=previous_id))
+        before = None
+        if previous_id:
+            # El diff sale del borrador anterior en cache: sin cache no hay contra qué comparar
+            if not use_cache or RESULT_CACHE is None:
+                return _json_response(400, {"error": "'previous_document_id' requiere la cache de resultados (no usar 'cache': false)."})
+            before = previous_paragraphs(previous_id, pages, y_gap=y_gap, indent_gap=indent, model_version=model_version)
+            if before is None:
+                return _json_response(404, {"error": f"El borrador anterior {previous_id} no está en la cache con estos y_gap/indent_gap/model_version; procesarlo primero."})
+        paragraphs = classify_pdf_from_bytes(pdf_bytes, pages_spec=pages, y_gap=y_gap, indent_gap=indent, workers=workers, model_version=model_version, use_cache=use_cache, previous_document_id=previous_id)
+        payload = {"document_id": ResultCache.document_id(pdf_bytes), "paragraphs": paragraphs, "test": "este es mi test"}
+        if before is not None:
+            payload["diff"] = diff_paragraphs(before, paragraphs)
+        if want_metrics:
+            payload["metrics"] = metrics.as_dict()
+        with stage("serialise"):
+            return _json_response(200, payload)
 
     except Exception as e:
         # Log de emergencia y 500
-        print("Exception:", repr(e), "python:", sys.version)
+        log.error("Exception: %r (python %s)", e, sys.version, exc_info=True)
         return _json_response(500, {"error": str(e)})
 
 # === Runner local ===
@@ -234,5 +632,7 @@ if __name__ == "__main__":
             }, ensure_ascii=False)
         }
     response = lambda_handler(evt, None)
-    print("=== RESPONSE COMPLETA ===")
-    print(json.dumps(response, indent=2, ensure_ascii=False))
+    # Resumen, no el payload completo (miles de párrafos); LOG_MAX_CHARS=0 lo muestra entero
+    body = response.get("body")
+    print(f"=== RESPONSE {response.get('statusCode')} ({len(body or '')} chars) ===")
+    print(truncate(body if isinstance(body, str) else json.dumps(body, ensure_ascii=False)))
@@ -0,0 +1,171 @@
+"""
+Cache de resultados clasificados por contenido del PDF.
+
+La clave del documento es el SHA-256 de los bytes del PDF más los parámetros
+que cambian el resultado (y_gap, indent_gap, versión del modelo). Por cada
+documento se guarda:
+  - <doc_key>/meta        {"pages": total_de_páginas, "fingerprints": {n: huella}}
+  - <doc_key>/page-<n>    lista de párrafos clasificados de la página n
+
+Con el meta y las páginas pedidas en cache, un request (cualquier subconjunto
+de páginas) se responde sin abrir el PDF.
+
+Backends intercambiables (get/put de valores JSON):
+  - MemoryBackend  LRU en el proceso (sobrevive entre invocaciones en caliente;
+                   guarda JSON serializado, cada hit es una copia)
+  - DiskBackend    un archivo JSON por clave en un directorio (p. ej. /tmp)
+  - S3Backend      cualquier cliente con get_object/put_object estilo boto3
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+
+class MemoryBackend:
+    """
+    Guarda el JSON serializado, igual que disco/S3: cada hit devuelve objetos
+    nuevos, así el llamador puede modificar la respuesta sin tocar la cache.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            raw = self._data[key]
+        return json.loads(raw)
+
+    def put(self, key: str, value: Any) -> None:
+        raw = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._data[key] = raw
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+
+class DiskBackend:
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, *key.split("/")) + ".json"
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put(self, key: str, value: Any) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Escritura atómica: otra invocación nunca lee un archivo a medias
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+
+class S3Backend:
+    """
+    Usa un cliente con la interfaz de boto3 (get_object/put_object). Para
+    probar local basta cualquier objeto con esos dos métodos.
+    """
+
+    def __init__(self, client: Any, bucket: str, prefix: str = ""):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}.json" if self.prefix else f"{key}.json"
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            obj = self.client.get_object(Bucket=self.bucket, Key=self._key(key))
+        except Exception as e:
+            if _is_missing_key(e):
+                return None
+            raise
+        return json.loads(obj["Body"].read())
+
+    def put(self, key: str, value: Any) -> None:
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self._key(key),
+            Body=json.dumps(value, ensure_ascii=False).encode("utf-8"),
+            ContentType="application/json",
+        )
+
+
+def _is_missing_key(exc: Exception) -> bool:
+    """NoSuchKey / 404 de boto3 (ClientError) o de un cliente compatible."""
+    if type(exc).__name__ in ("NoSuchKey", "KeyError"):
+        return True
+    code = (getattr(exc, "response", None) or {}).get("Error", {}).get("Code")
+    return code in ("NoSuchKey", "404", "NotFound")
+
+
+class ResultCache:
+    def __init__(self, backend: Any):
+        self.backend = backend
+
+    @staticmethod
+    def document_id(pdf_bytes: bytes) -> str:
+        """SHA-256 del PDF: identifica el documento (p. ej. como borrador previo)."""
+        return hashlib.sha256(pdf_bytes).hexdigest()
+
+    @staticmethod
+    def document_key(document_id: str, y_gap: float, indent_gap: float, model_version: str) -> str:
+        return f"{document_id}/{y_gap:g}-{indent_gap:g}-{model_version}"
+
+    def get_meta(self, doc_key: str) -> Optional[Dict[str, Any]]:
+        return self.backend.get(f"{doc_key}/meta")
+
+    def put_meta(self, doc_key: str, meta: Dict[str, Any]) -> None:
+        self.backend.put(f"{doc_key}/meta", meta)
+
+    def get_pages(self, doc_key: str, pages: Iterable[int]) -> Dict[int, list]:
+        """Solo las páginas presentes en cache: {n: párrafos}."""
+        found: Dict[int, list] = {}
+        for n in pages:
+            paras = self.backend.get(f"{doc_key}/page-{n}")
+            if paras is not None:
+                found[n] = paras
+        return found
+
+    def put_page(self, doc_key: str, page_number: int, paragraphs: list) -> None:
+        self.backend.put(f"{doc_key}/page-{page_number}", paragraphs)
+
+
+def cache_from_spec(spec: str) -> Optional[ResultCache]:
+    """
+    Construye la cache a partir de un string de configuración:
+      "memory" | "memory:<max_entries>" | "disk:<dir>" | "s3://<bucket>/<prefix>" | "off"
+    """
+    spec = (spec or "").strip()
+    if not spec or spec == "off":
+        return None
+    if spec.startswith("memory"):
+        _, _, size = spec.partition(":")
+        return ResultCache(MemoryBackend(int(size) if size else 4096))
+    if spec.startswith("disk:"):
+        return ResultCache(DiskBackend(spec[len("disk:"):]))
+    if spec.startswith("s3://"):
+        import boto3  # solo se importa si se usa
+
+        bucket, _, prefix = spec[len("s3://"):].partition("/")
+        return ResultCache(S3Backend(boto3.client("s3"), bucket, prefix))
+    raise ValueError(f"RESULT_CACHE no reconocido: {spec!r}")
@@ -1,8 +1,20 @@
 import fitz  # PyMuPDF
+import hashlib
 import math
-from typing import Iterator, Dict, Any, List, Optional
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Iterator, Iterable, Dict, Any, List, Optional, Union
 import re
 
+from lambda_log import get_logger
+from pdf_reader.metrics import incr, stage
+
+log = get_logger("reading_pdf_paragraphs.core")
+
+# Tope de procesos de extracción (workers viene del request): por defecto las CPUs del contenedor
+PDF_WORKERS_MAX = max(1, int(os.getenv("PDF_WORKERS_MAX") or os.cpu_count() or 1))
+
 _SOFT_HYPHEN = "\u00AD"  # soft hyphen (invisible)
 
 # Une "Casca- \n das" -> "Cascadas" (si la siguiente empieza en minúscula, ES/PT)
@@ -13,13 +25,166 @@ _HYPHEN_JOIN_RE = re.compile(
 _INVISIBLES_RE = re.compile(r"[\u200B-\u200D\uFEFF]")  # zero-width & BOM
 
 
+# Origen de un PDF: ruta en disco, bytes en memoria o Document ya abierto
+PdfSource = Union[str, bytes, fitz.Document]
+
+# Tokens del nombre de fuente que indican estilo (se evalúan una vez por fuente)
+_BOLD_FONT_RE = re.compile(r"\b(bold|black|demi|bd|bf|blk)\b")
+_ITALIC_FONT_RE = re.compile(r"italic|oblique|\bit\b")
+_MONO_FONT_RE = re.compile(r"courier|mono|typewriter|consol")
+
+
+class FontTable:
+    """
+    Tabla de fuentes de un documento: cada nombre distinto se guarda una
+    sola vez y las líneas llevan su índice (font_id). Los atributos de
+    estilo (negrita, cursiva, monoespaciada) se calculan al registrar la
+    fuente, no por cada línea.
+    """
+    __slots__ = ("names", "bold", "italic", "mono", "_ids")
+
+    def __init__(self, names: Iterable[str] = ()):
+        self.names: List[str] = []
+        self.bold: List[bool] = []
+        self.italic: List[bool] = []
+        self.mono: List[bool] = []
+        self._ids: Dict[str, int] = {}
+        for name in names:
+            self.intern(name)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def intern(self, name: str) -> int:
+        """Id de la fuente `name`; la registra si es nueva."""
+        font_id = self._ids.get(name)
+        if font_id is None:
+            font_id = len(self.names)
+            fname = (name or "").lower()
+            self._ids[name] = font_id
+            self.names.append(name)
+            self.bold.append(bool(fname) and bool(_BOLD_FONT_RE.search(fname)))
+            self.italic.append(bool(_ITALIC_FONT_RE.search(fname)))
+            self.mono.append(bool(_MONO_FONT_RE.search(fname)))
+        return font_id
+
+    def remap(self, other: "FontTable") -> List[int]:
+        """Ids en esta tabla para cada id de `other` (unir tablas de workers)."""
+        return [self.intern(name) for name in other.names]
+
+
+class Line:
+    """
+    Línea extraída de una página. Registro compacto (__slots__, sin bbox
+    duplicado) que se usa internamente; to_dict() da el formato público.
+    La fuente es un índice en la FontTable del documento.
+    """
+    __slots__ = ("text", "origin_x", "origin_y", "end_x", "end_y", "size", "font_id", "flags")
+
+    def __init__(self, text: str, origin_x: float, origin_y: float, end_x: float,
+                 end_y: float, size: float, font_id: int, flags: int):
+        self.text = text
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self.end_x = end_x
+        self.end_y = end_y
+        self.size = size
+        self.font_id = font_id
+        self.flags = flags
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any], fonts: FontTable) -> "Line":
+        return cls(d["text"], d["origin_x"], d["origin_y"], d["end_x"], d.get("end_y", d["origin_y"]),
+                   d.get("size", 0.0), fonts.intern(d.get("font", "")), d.get("flags", 0))
+
+    def to_dict(self, fonts: FontTable) -> Dict[str, Any]:
+        return {
+            "text": self.text,
+            "origin_x": self.origin_x,
+            "origin_y": self.origin_y,
+            "end_x": self.end_x,
+            "end_y": self.end_y,
+            "size": self.size,
+            "font": fonts.names[self.font_id],
+            "flags": self.flags,
+            "bbox": (self.origin_x, self.origin_y, self.end_x, self.end_y),
+        }
+
+
+class Paragraph:
+    """
+    Párrafo agrupado (registro compacto). Admite acceso tipo dict de solo
+    lectura (p.get("text"), p["left_x"]) para el código que espera dicts.
+    """
+    __slots__ = ("text", "start_y", "end_y", "left_x", "right_x", "lines_count")
+    _FIELDS = frozenset(__slots__)
+
+    def __init__(self, text: str, start_y: float, end_y: float, left_x: float,
+                 right_x: float, lines_count: int = 1):
+        self.text = text
+        self.start_y = start_y
+        self.end_y = end_y
+        self.left_x = left_x
+        self.right_x = right_x
+        self.lines_count = lines_count
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._FIELDS
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in self._FIELDS else default
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "text": self.text,
+            "start_y": self.start_y,
+            "end_y": self.end_y,
+            "left_x": self.left_x,
+            "right_x": self.right_x,
+            "lines_count": self.lines_count,
+        }
+
+
 def open_pdf(pdf_path: str) -> fitz.Document:
     """Abre un PDF y retorna el objeto Document de PyMuPDF."""
-    return fitz.open(pdf_path)
+    with stage("open"):
+        return fitz.open(pdf_path)
+
+def open_pdf_bytes(pdf_bytes: bytes) -> fitz.Document:
+    """Abre un PDF desde memoria (sin pasar por disco)."""
+    with stage("open"):
+        return fitz.open(stream=bytes(pdf_bytes), filetype="pdf")
 
-def doc_summary(pdf_path: str) -> dict:
+@contextmanager
+def _as_document(source: PdfSource) -> Iterator[fitz.Document]:
+    """
+    Entrega un Document para `source`. Si ya es un Document se reutiliza
+    tal cual y NO se cierra (el dueño es quien lo abrió).
+    """
+    if isinstance(source, fitz.Document):
+        yield source
+        return
+    doc = open_pdf_bytes(source) if isinstance(source, (bytes, bytearray)) else open_pdf(source)
+    with doc:
+        yield doc
+
+def _picklable_source(source: PdfSource) -> Union[str, bytes]:
+    """Ruta o bytes que un proceso worker puede usar para reabrir el documento."""
+    if not isinstance(source, fitz.Document):
+        return source
+    if source.name:
+        return source.name
+    # Abierto desde memoria: PyMuPDF conserva el buffer original en .stream
+    return getattr(source, "stream", None) or source.tobytes()
+
+def doc_summary(source: PdfSource) -> dict:
     """Devuelve páginas y metadatos básicos."""
-    with open_pdf(pdf_path) as doc:
+    with _as_document(source) as doc:
         meta = doc.metadata or {}
         return {
             "pages": doc.page_count,
@@ -27,78 +192,189 @@ def doc_summary(pdf_path: str) -> dict:
             "author": meta.get("author"),
         }
 
-def first_page_text(pdf_path: str, n_chars: int = 300) -> str:
+def first_page_text(source: PdfSource, n_chars: int = 300) -> str:
     """Devuelve los primeros n_chars de la primera página."""
-    with open_pdf(pdf_path) as doc:
+    with _as_document(source) as doc:
         if doc.page_count == 0:
             return ""
         text = doc[0].get_text("text")
         return text[:n_chars].replace("\n", " ")
 
-def iter_pages_lines(pdf_path: str) -> Iterator[Dict[str, Any]]:
-    print("=====ACA EXTRAE EL TEXTO DE CADA PÁGINA======")
+def iter_pages_lines(
+    source: PdfSource,
+    workers: int = 1,
+    pages: Optional[Iterable[int]] = None,
+) -> Iterator[Dict[str, Any]]:
     """
     Devuelve por página una lista de 'líneas' ordenadas.
     Cada línea: {text, origin_x, origin_y, end_x, size, font, bbox}
+
+    source puede ser una ruta, los bytes del PDF o un Document ya abierto
+    (en ese caso no se reabre ni se cierra).
+
+    pages (1-based) limita la extracción a esas páginas, en orden ascendente;
+    las demás no se cargan ni se parsean. None = todas.
+
+    Con workers > 1 reparte las páginas entre procesos (cada uno abre
+    su propia copia del documento) y devuelve las páginas en orden.
+    """
+    log.debug("Extrayendo texto por página", workers=workers)
+    for page in iter_pages_records(source, workers=workers, pages=pages):
+        fonts = page["fonts"]
+        yield {"page_number": page["page_number"], "lines": [L.to_dict(fonts) for L in page["lines"]]}
+
+def iter_pages_records(
+    source: PdfSource,
+    workers: int = 1,
+    pages: Optional[Iterable[int]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Como iter_pages_lines pero con líneas como registros Line (uso interno).
+    Cada página trae "fonts": la FontTable del documento (la misma para
+    todas las páginas) que resuelve los font_id de sus líneas.
+    workers se limita a PDF_WORKERS_MAX.
+    """
+    workers = min(workers, PDF_WORKERS_MAX)
+    if workers > 1:
+        yield from _iter_pages_lines_parallel(source, workers, pages)
+        return
+    fonts = FontTable()
+    with _as_document(source) as doc:
+        for n in _select_pages(doc.page_count, pages):
+            with stage("extract"):
+                lines = _page_lines(doc[n - 1], fonts)
+            incr("pages")
+            incr("lines", len(lines))
+            yield {"page_number": n, "lines": lines, "fonts": fonts}
+
+def _select_pages(page_count: int, pages: Optional[Iterable[int]]) -> List[int]:
+    """Páginas válidas (1-based) ordenadas; todas si pages es None."""
+    if pages is None:
+        return list(range(1, page_count + 1))
+    return sorted({n for n in pages if 1 <= n <= page_count})
+
+def _page_lines(page: fitz.Page, fonts: FontTable) -> List[Line]:
+    """Extrae, filtra y ordena las líneas de texto horizontal de una página."""
+    data = page.get_text("dict")
+    page_height = float(page.rect.height)
+    lines: List[Line] = []
+    for block in data.get("blocks", []):
+        if block.get("type") != 0:  # solo texto
+            continue
+        for line in block.get("lines", []):
+            # print("LINEA DETECTADA:", line)  # Debug line
+            spans = line.get("spans") or []
+            if not spans:
+                continue
+            # Filtrar marcas de agua / texto en diagonal
+            # Usamos la dirección del primer span como referencia
+            if not _is_horizontal_dir(line.get('dir')):
+                 continue
+            
+            text = "".join(s.get("text", "") for s in spans)
+            text = _clean_line_text(text)  # limpia NBSP, invisibles, soft hyphen, espacios
+            
+            bbox = line.get("bbox") or spans[0].get("bbox")
+            origin_x, origin_y, end_x, end_y = bbox[0], bbox[1], bbox[2], bbox[3]
+           
+            if not text or float(origin_y) < 50 or float(origin_y) > (page_height - 50):
+                # if text:
+                #     print("--" * 50)
+                #     print("Skipping line due to position or empty text")  # Debug line
+                #     print(text)
+                #     print("--" * 50)
+                continue
+            s0 = spans[0]
+            lines.append(Line(
+                text,
+                float(origin_x),
+                float(origin_y),
+                float(end_x),
+                float(end_y),
+                float(s0.get("size", 0)),
+                fonts.intern(s0.get("font", "")),
+                s0.get("flags", 0),
+            ))
+
+    # Ordenar por y luego x
+    lines.sort(key=lambda L: (round(L.origin_y, 1), L.origin_x))
+
+    # 🔹 Eliminar duplicados de texto en la misma línea (misma y redondeada)
+    seen = set()
+    filtered = []
+    for L in lines:
+        key = (round(L.origin_y, 1), L.text)
+        if key in seen:
+            continue  # duplicado → lo saltamos
+        seen.add(key)
+        filtered.append(L)
+    return filtered
+
+def _extract_pages(source: Union[str, bytes], page_numbers: List[int]) -> Dict[str, Any]:
     """
-    with open_pdf(pdf_path) as doc:
-        for i, page in enumerate(doc, start=1):
-            data = page.get_text("dict")
-            page_height = float(page.rect.height)
-            lines: List[Dict[str, Any]] = []
-            for block in data.get("blocks", []):
-                if block.get("type") != 0:  # solo texto
-                    continue
-                for line in block.get("lines", []):
-                    # print("LINEA DETECTADA:", line)  # Debug line
-                    spans = line.get("spans") or []
-                    if not spans:
-                        continue
-                    # Filtrar marcas de agua / texto en diagonal
-                    # Usamos la dirección del primer span como referencia
-                    if not _is_horizontal_dir(line.get('dir')):
-                         continue
-                    
-                    text = "".join(s.get("text", "") for s in spans)
-                    text = _clean_line_text(text)  # limpia NBSP, invisibles, soft hyphen, espacios
-                    
-                    bbox = line.get("bbox") or spans[0].get("bbox")
-                    origin_x, origin_y, end_x, end_y = bbox[0], bbox[1], bbox[2], bbox[3]
-                   
-                    if not text or float(origin_y) < 50 or float(origin_y) > (page_height - 50):
-                        # if text:
-                        #     print("--" * 50)
-                        #     print("Skipping line due to position or empty text")  # Debug line
-                        #     print(text)
-                        #     print("--" * 50)
-                        continue
-                    s0 = spans[0]
-                    lines.append({
-                        "text": text,
-                        "origin_x": float(origin_x),
-                        "origin_y": float(origin_y),
-                        "end_x": float(end_x),
-                        "end_y": float(end_y),
-                        "size": float(s0.get("size", 0)),
-                        "font": s0.get("font", ""),
-                        "flags": s0.get("flags", 0),
-                        "bbox": bbox,
-                    })
-
-            # Ordenar por y luego x
-            lines.sort(key=lambda L: (round(L["origin_y"], 1), L["origin_x"]))
-
-            # 🔹 Eliminar duplicados de texto en la misma línea (misma y redondeada)
-            seen = set()
-            filtered = []
-            for L in lines:
-                key = (round(L["origin_y"], 1), L["text"])
-                if key in seen:
-                    continue  # duplicado → lo saltamos
-                seen.add(key)
-                filtered.append(L)
-
-            yield {"page_number": i, "lines": filtered}
+    Worker: abre su propia copia del PDF y extrae las páginas indicadas (1-based).
+    Devuelve también los nombres de su FontTable local para remapear los ids.
+    """
+    fonts = FontTable()
+    with _as_document(source) as doc:
+        pages = [
+            {"page_number": n, "lines": _page_lines(doc[n - 1], fonts)}
+            for n in page_numbers
+        ]
+    return {"pages": pages, "font_names": fonts.names}
+
+def _split_pages(page_numbers: List[int], parts: int) -> List[List[int]]:
+    """Divide la lista de páginas en `parts` tramos contiguos de tamaño similar."""
+    parts = max(1, min(parts, len(page_numbers)))
+    size, extra = divmod(len(page_numbers), parts)
+    chunks: List[List[int]] = []
+    start = 0
+    for k in range(parts):
+        end = start + size + (1 if k < extra else 0)
+        chunks.append(page_numbers[start:end])
+        start = end
+    return chunks
+
+def _iter_pages_lines_parallel(
+    source: PdfSource,
+    workers: int,
+    pages: Optional[Iterable[int]] = None,
+) -> Iterator[Dict[str, Any]]:
+    with _as_document(source) as doc:
+        page_numbers = _select_pages(doc.page_count, pages)
+    if len(page_numbers) < 2:
+        yield from iter_pages_records(source, pages=page_numbers)
+        return
+
+    try:
+        executor = ProcessPoolExecutor(max_workers=min(workers, len(page_numbers)))
+    except (OSError, NotImplementedError) as e:
+        # Lambda no tiene /dev/shm → multiprocessing no puede crear semáforos
+        log.warning("Pool de procesos no disponible (%r); extracción secuencial.", e)
+        yield from iter_pages_records(source, pages=page_numbers)
+        return
+
+    worker_source = _picklable_source(source)
+    fonts = FontTable()
+    with executor:
+        futures = [
+            executor.submit(_extract_pages, worker_source, chunk)
+            for chunk in _split_pages(page_numbers, workers)
+        ]
+        # Los tramos se consumen en orden: la primera página sale en cuanto su tramo termina
+        for fut in futures:
+            with stage("extract"):
+                chunk = fut.result()
+                # Ids locales del worker → ids de la tabla del documento
+                ids = fonts.remap(FontTable(chunk["font_names"]))
+                for page in chunk["pages"]:
+                    for L in page["lines"]:
+                        L.font_id = ids[L.font_id]
+            for page in chunk["pages"]:
+                page["fonts"] = fonts
+                incr("pages")
+                incr("lines", len(page["lines"]))
+                yield page
 
 def group_lines_to_paragraphs(
     lines: List[Dict[str, Any]],
@@ -112,39 +388,38 @@ def group_lines_to_paragraphs(
       o si la línea previa termina con punto y la siguiente está claramente separada.
     Retorna: lista de {text, start_y, end_y, left_x, right_x, lines_count}
     """
-    paragraphs: List[Dict[str, Any]] = []
+    fonts = FontTable()
+    records = [Line.from_dict(L, fonts) for L in lines]
+    return [p.to_dict() for p in _group_records(records, fonts, y_gap_threshold, indent_threshold)]
+
+def _group_records(
+    lines: List[Line],
+    fonts: FontTable,
+    y_gap_threshold: float = 15.0,
+    indent_threshold: float = 12.0,
+) -> List[Paragraph]:
+    """Heurística de group_lines_to_paragraphs sobre registros Line → Paragraph."""
+    paragraphs: List[Paragraph] = []
     if not lines:
         return paragraphs
 
-    def new_para_from_line(L):
-        return {
-            "text": L["text"],
-            "start_y": L["origin_y"],
-            "end_y": L["origin_y"],
-            "left_x": L["origin_x"],
-            "right_x": L["end_x"],
-            "lines_count": 1,
-        }
-    
-    def _is_bold(font: str) -> bool:
-        """
-        Detecta heurísticamente si el nombre de la fuente indica estilo negrita.
-        Busca tokens comunes en el nombre de la fuente (bold, black, demi, bd, bf, blk).
-        """
-        if not font:
-            return False
-        fname = font.lower()
-        return bool(re.search(r"\b(bold|black|demi|bd|bf|blk)\b", fname))
+    def new_para_from_line(L: Line) -> Paragraph:
+        return Paragraph(L.text, L.origin_y, L.origin_y, L.origin_x, L.end_x, 1)
+
+    # Textos de las líneas del párrafo en curso; se unen una sola vez al cerrarlo
+    texts: List[str] = [lines[0].text]
+    # Negrita precalculada por fuente (tokens bold, black, demi, bd, bf, blk)
+    is_bold = fonts.bold
 
     cur = new_para_from_line(lines[0])
     prev = lines[0]
 
     for L in lines[1:]:
-        dy = L["origin_y"] - prev["origin_y"]
-        d_indent = abs(L["origin_x"] - prev["origin_x"])
-        prev_ends_sentence = prev["text"].rstrip().endswith((".", "!", "?"))
+        dy = L.origin_y - prev.origin_y
+        d_indent = abs(L.origin_x - prev.origin_x)
+        prev_ends_sentence = prev.text.rstrip().endswith((".", "!", "?"))
         
-        change_line_style = _is_bold(L["font"]) != _is_bold(prev["font"])
+        change_line_style = is_bold[L.font_id] != is_bold[prev.font_id]
 
         should_break = False
         if dy > y_gap_threshold:
@@ -155,41 +430,107 @@ def group_lines_to_paragraphs(
             should_break = True
         elif change_line_style:
             should_break = True
-        elif L["flags"] != prev["flags"]:
+        elif L.flags != prev.flags:
             should_break = True
 
         if should_break:
+            cur.text = _join_paragraph_lines(texts)
             paragraphs.append(cur)
             cur = new_para_from_line(L)
+            texts = [L.text]
         else:
             # Continuación del párrafo actual
-            # Unir línea al párrafo actual con normalización de guiones
-            merged = (cur["text"].rstrip() + " " + L["text"].lstrip()).strip()
-            merged = normalize_hyphens(merged)
-            cur["text"] = merged
-            cur["end_y"] = L["origin_y"]
-            cur["left_x"] = min(cur["left_x"], L["origin_x"])
-            cur["right_x"] = max(cur["right_x"], L["end_x"])
-            cur["lines_count"] += 1
+            texts.append(L.text)
+            cur.end_y = L.origin_y
+            cur.left_x = min(cur.left_x, L.origin_x)
+            cur.right_x = max(cur.right_x, L.end_x)
+            cur.lines_count += 1
 
         prev = L
 
+    cur.text = _join_paragraph_lines(texts)
     paragraphs.append(cur)
     return paragraphs
 
+def _join_paragraph_lines(texts: List[str]) -> str:
+    """
+    Une las líneas de un párrafo normalizando guiones de corte.
+
+    Da exactamente el mismo texto que unir línea a línea y pasar
+    normalize_hyphens por todo el acumulado en cada paso, pero en tiempo
+    lineal: tras la primera unión el acumulado ya está normalizado, así que
+    solo hace falta normalizar la frontera (últimos 2 caracteres + línea nueva).
+    Si algo impide garantizarlo (línea con espacios en los bordes, soft hyphen,
+    o quedan cortes sin unir en el resultado) se usa la unión incremental original.
+    """
+    if len(texts) == 1:
+        return texts[0]
+    first = normalize_hyphens((texts[0].rstrip() + " " + texts[1].lstrip()).strip())
+    if len(texts) > 2 and first != first.strip():
+        return _join_paragraph_lines_incremental(texts)
+    parts = [first]
+    for t in texts[2:]:
+        tail = parts[-1]
+        if not t or t != t.strip() or _SOFT_HYPHEN in t or len(tail) < 2:
+            return _join_paragraph_lines_incremental(texts)
+        parts[-1] = tail[:-2]
+        parts.append(normalize_hyphens(tail[-2:] + " " + t))
+    text = "".join(parts)
+    if len(texts) > 2 and _HYPHEN_JOIN_RE.search(text):
+        return _join_paragraph_lines_incremental(texts)
+    return text
+
+def _join_paragraph_lines_incremental(texts: List[str]) -> str:
+    """Unión original (cuadrática): re-normaliza todo el acumulado en cada línea."""
+    text = texts[0]
+    for t in texts[1:]:
+        # Unir línea al párrafo actual con normalización de guiones
+        merged = (text.rstrip() + " " + t.lstrip()).strip()
+        text = normalize_hyphens(merged)
+    return text
+
 def iter_pages_paragraphs(
-    pdf_path: str,
+    source: PdfSource,
     y_gap_threshold: float = 15.0,   # antes 6.0
     indent_threshold: float = 12.0,
+    workers: int = 1,
+    pages: Optional[Iterable[int]] = None,
 ) -> Iterator[Dict[str, Any]]:
-    """Devuelve párrafos por página aplicando la heurística anterior."""
-    for page in iter_pages_lines(pdf_path):
-        paras = group_lines_to_paragraphs(
-            page["lines"],
+    """Devuelve párrafos por página aplicando la heurística anterior (solo `pages` si se indica)."""
+    for page in iter_pages_records(source, workers=workers, pages=pages):
+        paras = page_paragraphs(page["lines"], page["fonts"], y_gap_threshold, indent_threshold)
+        yield {"page_number": page["page_number"], "paragraphs": [p.to_dict() for p in paras]}
+
+def page_paragraphs(
+    lines: List[Line],
+    fonts: FontTable,
+    y_gap_threshold: float = 15.0,
+    indent_threshold: float = 12.0,
+) -> List[Paragraph]:
+    """Agrupa registros Line en Paragraph con instrumentación (etapa 'group' y contador)."""
+    with stage("group"):
+        paras = _group_records(
+            lines,
+            fonts,
             y_gap_threshold=y_gap_threshold,
             indent_threshold=indent_threshold,
         )
-        yield {"page_number": page["page_number"], "paragraphs": paras}
+    incr("paragraphs", len(paras))
+    return paras
+
+def page_fingerprint(lines: List[Line], fonts: FontTable) -> str:
+    """
+    Huella de una página a partir de sus líneas extraídas (texto, posición,
+    fuente y flags): si no cambia, los párrafos y etiquetas tampoco cambian.
+    """
+    h = hashlib.sha1()
+    names = fonts.names
+    for L in lines:
+        h.update(
+            f"{L.text}\x1f{L.origin_x:.1f}\x1f{L.origin_y:.1f}\x1f"
+            f"{L.end_x:.1f}\x1f{names[L.font_id]}\x1f{L.flags}\x1e".encode("utf-8")
+        )
+    return h.hexdigest()
 
 def normalize_hyphens(text: str) -> str:
     """
@@ -0,0 +1,141 @@
+"""
+Instrumentación por request del pipeline PDF.
+
+Se abre un RequestMetrics por invocación con `collecting(...)`; mientras está
+activo, `stage(nombre)` acumula la duración de cada etapa e `incr(nombre, n)`
+suma contadores. Fuera de `collecting` ambas funciones no hacen nada, así que
+core y el clasificador se pueden usar sin instrumentación.
+
+Memoria: peak_memory_mb es el máximo RSS del proceso (ru_maxrss) al emitir;
+por etapa se guarda cuánto subió ese máximo mientras corría
+(<etapa>_mem_growth_mb), para ubicar la etapa que acerca la Lambda a su
+límite de memoria. ru_maxrss no baja entre invocaciones en caliente: en esas
+la subida por etapa suele ser 0 y solo crece si se supera el pico anterior.
+
+Al final `emit()` imprime UNA línea JSON en formato EMF (CloudWatch Embedded
+Metric Format): CloudWatch la convierte en métricas sin llamadas extra.
+"""
+import json
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+try:
+    import resource
+except ImportError:  # Windows: sin getrusage, las métricas de memoria quedan en 0
+    resource = None
+
+
+def max_rss_mb(who: str = "self") -> float:
+    """
+    Pico de memoria residente en MB (Linux lo da en KB, macOS en bytes).
+    who="children": el mayor pico entre los procesos hijos ya terminados
+    (los workers de la extracción en paralelo).
+    """
+    if resource is None:
+        return 0.0
+    rss = resource.getrusage(resource.RUSAGE_CHILDREN if who == "children" else resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+class RequestMetrics:
+    def __init__(self, namespace: str = "ReadingPdfParagraphs", service: str = "reading-pdf-paragraphs"):
+        self.namespace = namespace
+        self.service = service
+        self.durations: Dict[str, float] = {}  # segundos acumulados por etapa
+        self.counts: Dict[str, int] = {}
+        self.mem_growth: Dict[str, float] = {}  # MB que subió el pico de RSS dentro de cada etapa
+        self._t0 = time.perf_counter()
+        self._rss0 = max_rss_mb()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        rss0 = max_rss_mb()
+        try:
+            yield
+        finally:
+            self.durations[name] = self.durations.get(name, 0.0) + (time.perf_counter() - t0)
+            self.mem_growth[name] = self.mem_growth.get(name, 0.0) + (max_rss_mb() - rss0)
+
+    def incr(self, name: str, n: int = 1) -> None:
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Resumen legible: duraciones en ms (incluye total), contadores y memoria en MB."""
+        durations = {k: round(v * 1000, 3) for k, v in self.durations.items()}
+        durations["total"] = round((time.perf_counter() - self._t0) * 1000, 3)
+        peak = max_rss_mb()
+        memory = {
+            "peak": round(peak, 1),
+            "growth": round(peak - self._rss0, 1),
+            "stages_growth": {k: round(v, 1) for k, v in self.mem_growth.items()},
+        }
+        workers = max_rss_mb("children")
+        if workers:
+            memory["workers_peak"] = round(workers, 1)
+        return {"durations_ms": durations, "counts": dict(self.counts), "memory_mb": memory}
+
+    def to_emf(self) -> Dict[str, Any]:
+        summary = self.as_dict()
+        record: Dict[str, Any] = {"Service": self.service}
+        metrics = []
+        for name, ms in summary["durations_ms"].items():
+            record[f"{name}_ms"] = ms
+            metrics.append({"Name": f"{name}_ms", "Unit": "Milliseconds"})
+        for name, n in summary["counts"].items():
+            record[name] = n
+            metrics.append({"Name": name, "Unit": "Count"})
+        memory = summary["memory_mb"]
+        record["peak_memory_mb"] = memory["peak"]
+        metrics.append({"Name": "peak_memory_mb", "Unit": "Megabytes"})
+        if "workers_peak" in memory:
+            record["workers_peak_memory_mb"] = memory["workers_peak"]
+            metrics.append({"Name": "workers_peak_memory_mb", "Unit": "Megabytes"})
+        for name, mb in memory["stages_growth"].items():
+            record[f"{name}_mem_growth_mb"] = mb
+            metrics.append({"Name": f"{name}_mem_growth_mb", "Unit": "Megabytes"})
+        record["_aws"] = {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": self.namespace,
+                "Dimensions": [["Service"]],
+                "Metrics": metrics,
+            }],
+        }
+        return record
+
+    def emit(self) -> None:
+        # print y no el logger: EMF exige que la línea completa sea el JSON
+        print(json.dumps(self.to_emf(), ensure_ascii=False))
+
+
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar("pdf_request_metrics", default=None)
+
+
+@contextmanager
+def collecting(metrics: RequestMetrics) -> Iterator[RequestMetrics]:
+    """Activa `metrics` para stage()/incr() dentro del bloque."""
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    with metrics.stage(name):
+        yield
+
+
+def incr(name: str, n: int = 1) -> None:
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.incr(name, n)
@@ -0,0 +1,171 @@
+"""
+Armado de escenas a partir de los párrafos clasificados.
+
+Recibe las páginas que entrega iter_classified_pages ({page, paragraphs})
+y devuelve escenas en el formato que consume scene_breakdown:
+
+    {"content": [{page, text, label, proba, type}, ...]}
+
+Cada escena arranca en un "Scene Heading" y se entrega en cuanto empieza
+la siguiente (o al terminar el documento), así que sirve en streaming.
+"""
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+SCENE_HEADING = "Scene Heading"
+NUMBER = "Number"
+
+# Escenas eliminadas del guion ("23 OMITIDA", "OMITTED")
+_RE_OMITTED = re.compile(r"\b(OMITTED|OMITID[AO]S?)\b", re.IGNORECASE)
+_RE_OMITTED_ONLY = re.compile(r"^\s*(\d+[A-Za-z]?\s*)?(OMITTED|OMITID[AO]S?)(\s*\d+[A-Za-z]?)?\s*$", re.IGNORECASE)
+
+# Marcas de corte de página que no son contenido: (MORE), (MÁS), CONTINUED:, (CONTINÚA)...
+_RE_PAGE_MARKER = re.compile(r"^\(?\s*(MORE|M[AÁ]S|CONTINUED|CONTIN[UÚ]A|SIGUE)\s*\)?\s*:?$", re.IGNORECASE)
+
+# Un párrafo cortado por el salto de página se une si no terminaba en puntuación
+_MERGE_LABELS = frozenset({"Action", "Dialogue"})
+_SENTENCE_END = (".", "!", "?", "…", ":", ";", '"', "”", "»", ")")
+
+# Distancia vertical máxima (pt) entre el número de escena y su encabezado
+NUMBER_Y_TOLERANCE = 6.0
+
+
+def scene_paragraph(rec: Dict[str, Any]) -> Dict[str, Any]:
+    """Párrafo clasificado → elemento de "content" de scene_breakdown."""
+    return {
+        "page": rec.get("page"),
+        "text": (rec.get("text") or "").strip(),
+        "label": rec.get("label"),
+        "proba": rec.get("proba"),
+        "type": rec.get("label"),
+    }
+
+
+def _same_row(a: Optional[Dict[str, Any]], b: Dict[str, Any]) -> bool:
+    """a y b están en la misma página y a la misma altura (número al margen)."""
+    if a is None or a.get("page") != b.get("page"):
+        return False
+    return abs((a.get("start_y") or 0.0) - (b.get("start_y") or 0.0)) <= NUMBER_Y_TOLERANCE
+
+
+class SceneAssembler:
+    """
+    Agrupa párrafos clasificados en escenas, de forma incremental:
+      - corta en cada "Scene Heading"; las escenas siguen a través de páginas
+      - un "Number" a la altura del encabezado (margen izquierdo o derecho) se
+        une al encabezado: "1" + "INT. CASA - DÍA" → "1 INT. CASA - DÍA"
+      - las escenas OMITTED/OMITIDA se descartan (include_omitted=True las conserva)
+      - lo anterior al primer encabezado (portada, créditos) se descarta salvo
+        include_preamble=True
+      - se quitan marcas de corte de página y se reúne un párrafo de acción o
+        diálogo partido por el salto de página
+
+    feed(page) devuelve las escenas que quedaron cerradas; close() la última.
+    """
+
+    def __init__(self, include_omitted: bool = False, include_preamble: bool = False):
+        self.include_omitted = include_omitted
+        self.include_preamble = include_preamble
+        self._content: List[Dict[str, Any]] = []
+        self._in_scene = False
+        self._omitted = False
+        self._heading: Optional[Dict[str, Any]] = None
+        self._pending_number: Optional[Dict[str, Any]] = None
+        self._last_label: Optional[str] = None
+
+    def feed(self, page: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Procesa una página {page, paragraphs}; devuelve las escenas cerradas."""
+        done: List[Dict[str, Any]] = []
+        for rec in page.get("paragraphs") or []:
+            self._feed_paragraph(rec, done)
+        return done
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Fin del documento: devuelve la escena en curso (si corresponde)."""
+        done: List[Dict[str, Any]] = []
+        self._flush_number()
+        self._close_scene(done)
+        return done
+
+    def _feed_paragraph(self, rec: Dict[str, Any], done: List[Dict[str, Any]]) -> None:
+        text = (rec.get("text") or "").strip()
+        label = rec.get("label")
+        if not text or _RE_PAGE_MARKER.match(text):
+            return
+
+        if label == NUMBER:
+            # Número repetido al margen derecho del encabezado
+            if _same_row(self._heading, rec):
+                return
+            self._flush_number()
+            self._pending_number = rec
+            return
+
+        number = self._pending_number
+        if label == SCENE_HEADING or _RE_OMITTED_ONLY.match(text):
+            if number is not None and not _same_row(number, rec):
+                self._flush_number()
+                number = None
+            self._pending_number = None
+            self._close_scene(done)
+            heading = dict(rec, text=text)
+            if number is not None and not text.startswith(number["text"].strip()):
+                heading["text"] = f"{number['text'].strip()} {text}"
+            self._in_scene = True
+            self._omitted = bool(_RE_OMITTED.search(text))
+            self._heading = rec
+            self._content = [scene_paragraph(dict(heading, label=SCENE_HEADING))]
+            self._last_label = SCENE_HEADING
+            return
+
+        self._flush_number()
+        self._append(rec, text)
+
+    def _append(self, rec: Dict[str, Any], text: str) -> None:
+        label = rec.get("label")
+        last = self._content[-1] if self._content else None
+        if (
+            last is not None
+            and label in _MERGE_LABELS
+            and label == self._last_label
+            and rec.get("page") != last["page"]
+            and not last["text"].endswith(_SENTENCE_END)
+            and text[:1].islower()
+        ):
+            # Continuación en la página siguiente del mismo párrafo
+            last["text"] = f"{last['text']} {text}"
+            return
+        self._content.append(scene_paragraph(rec))
+        self._last_label = label
+
+    def _flush_number(self) -> None:
+        """Un número que no precedía a un encabezado es contenido normal."""
+        if self._pending_number is not None:
+            rec, self._pending_number = self._pending_number, None
+            self._append(rec, (rec.get("text") or "").strip())
+
+    def _close_scene(self, done: List[Dict[str, Any]]) -> None:
+        content, self._content = self._content, []
+        if self._in_scene:
+            keep = self.include_omitted or not self._omitted
+        else:
+            keep = self.include_preamble
+        if content and keep:
+            done.append({"content": content})
+        self._last_label = None
+
+
+def iter_scenes(
+    pages: Iterable[Dict[str, Any]],
+    include_omitted: bool = False,
+    include_preamble: bool = False,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Generador de escenas {"content": [...]} a partir de páginas clasificadas
+    ({page, paragraphs}, p.ej. iter_classified_pages). Cada escena sale en
+    cuanto aparece el encabezado de la siguiente.
+    """
+    assembler = SceneAssembler(include_omitted=include_omitted, include_preamble=include_preamble)
+    for page in pages:
+        yield from assembler.feed(page)
+    yield from assembler.close()
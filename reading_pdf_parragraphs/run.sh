@@ -33,6 +33,8 @@ show_help() {
 # Función para construir la imagen
 build_image() {
     echo "🔨 Construyendo imagen Docker..."
+    # Módulos compartidos (symlinks a ../shared) dentro del contexto de build
+    mkdir -p .docker_shared && cp -L lambda_log.py .docker_shared/
     docker build -t $IMAGE_NAME .
     echo "✅ Imagen construida exitosamente"
 }
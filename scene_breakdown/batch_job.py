@@ -0,0 +1,301 @@
+# Modo offline (Batch API de OpenAI) para breakdowns de temporadas completas:
+# ~50% más barato que las llamadas en línea y sin límites de RPM, a cambio de
+# esperar (ventana de hasta 24h). Pensado para correr de noche, no en la Lambda.
+#
+# Uso:
+#   python batch_job.py run events/event_full.json --job-dir jobs/temporada1
+#   python batch_job.py status --job-dir jobs/temporada1
+#
+# El job es reanudable: jobs/<nombre>/manifest.json guarda en qué paso quedó
+# (archivo subido, batch creado, resultados bajados). Volver a correr `run`
+# con el mismo --job-dir continúa desde ahí sin volver a pagar lo ya hecho.
+# Las escenas que fallan se reenvían en un batch nuevo (--max-rounds).
+# Con SCENE_CACHE activa, las escenas ya procesadas (en línea o en otro job)
+# no se incluyen en el batch, y lo que devuelve el batch queda en la cache.
+# Con BREAKDOWN_STRUCTURED (default) cada request lleva el schema estricto y la
+# salida se valida; lo que no se puede arreglar localmente cuenta como fallo y
+# la escena vuelve en la ronda siguiente.
+#
+# Contra el mock local:
+#   python mock_server.py --port 8765 --batch-delay 3 &
+#   OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=mock python batch_job.py run events/event.json --job-dir jobs/prueba --poll 1
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+from breakdown_schema import STRUCTURED_DEFAULT, BreakdownCheck
+from main import LANG_DEFAULT, MODEL_DEFAULT, SCENE_CACHE, _extract_json, _request_options, _scene_input, _scene_question, load_prompt
+from openai_client import get_client
+from scene_cache import split_cached
+from scene_format import SCENE_FORMAT_DEFAULT
+
+BATCH_ENDPOINT = "/v1/responses"
+COMPLETION_WINDOW = "24h"
+# Estados finales de un batch (en "expired" puede haber resultados parciales)
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+MANIFEST = "manifest.json"
+REQUESTS = "requests.jsonl"
+RESULTS = "results.jsonl"
+OUTPUT = "result.json"
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _scene_id(scene, index: int) -> str:
+    """Id de la escena: "id" propio o el número del encabezado ("12 INT. ..." → "12")."""
+    if scene.get("id") is not None:
+        return str(scene["id"])
+    content = scene.get("content") or []
+    first = (content[0].get("text") or "").split() if content else []
+    return first[0] if first and first[0][:1].isdigit() else str(index + 1)
+
+
+def _body_text(body: dict) -> str:
+    """Texto de salida de un Response serializado (body de una línea del batch)."""
+    for item in body.get("output") or []:
+        if item.get("type") != "message":
+            continue
+        for part in item.get("content") or []:
+            if part.get("type") == "output_text":
+                return (part.get("text") or "").strip()
+    raise ValueError("Respuesta sin texto de salida")
+
+
+class BatchJob:
+    """Job de Batch API con estado en disco (manifest + resultados por custom_id)."""
+
+    def __init__(self, job_dir: str, cache=SCENE_CACHE):
+        self.job_dir = job_dir
+        self.cache = cache
+        self.manifest_path = os.path.join(job_dir, MANIFEST)
+        self.manifest = None
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+
+    # --- estado ---
+
+    def save(self) -> None:
+        self.manifest["updated_at"] = _now()
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.manifest_path)
+
+    def results(self) -> dict:
+        """custom_id -> {"ok": breakdown} | {"error": ...}; la última línea gana."""
+        out = {}
+        path = os.path.join(self.job_dir, RESULTS)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        rec = json.loads(line)
+                        out[rec["custom_id"]] = rec
+        return out
+
+    def pending(self) -> list:
+        done = {cid for cid, rec in self.results().items() if "ok" in rec}
+        return [s["custom_id"] for s in self.manifest["scenes"] if s["custom_id"] not in done]
+
+    # --- pasos ---
+
+    def prepare(self, scenes: list, model: str, language: str) -> None:
+        """Escribe requests.jsonl (una request /v1/responses por escena) y el manifest."""
+        os.makedirs(self.job_dir, exist_ok=True)
+        prompt = load_prompt(language=language)
+        cached, keys, pending = split_cached(self.cache, scenes, prompt, model, language, SCENE_FORMAT_DEFAULT, STRUCTURED_DEFAULT)
+        text_format = BreakdownCheck(language).format() if STRUCTURED_DEFAULT else None
+        entries = []
+        with open(os.path.join(self.job_dir, RESULTS), "w", encoding="utf-8") as f:
+            for i, scene in enumerate(scenes):
+                entries.append({"custom_id": f"scene-{i:04d}", "index": i, "scene_id": _scene_id(scene, i), "cache_key": keys[i]})
+                if cached[i] is not None:
+                    f.write(json.dumps({"custom_id": entries[i]["custom_id"], "ok": cached[i], "round": 0}, ensure_ascii=False) + "\n")
+        with open(os.path.join(self.job_dir, REQUESTS), "w", encoding="utf-8") as f:
+            for i in pending:
+                scene, custom_id = scenes[i], entries[i]["custom_id"]
+                line = {
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": BATCH_ENDPOINT,
+                    "body": {"model": model, "input": _scene_input(prompt, _scene_question(scene, language)), **_request_options(text_format)},
+                }
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        self.manifest = {
+            "created_at": _now(),
+            "model": model,
+            "lang": language,
+            "structured": text_format is not None,
+            "scenes": entries,
+            "rounds": [],
+        }
+        self.save()
+        print(f"Job preparado: {len(entries)} escenas ({len(entries) - len(pending)} desde cache) en {self.job_dir}")
+
+    def submit(self, client, custom_ids: list) -> dict:
+        """Sube un JSONL con las escenas indicadas y crea el batch (una ronda)."""
+        wanted = set(custom_ids)
+        with open(os.path.join(self.job_dir, REQUESTS), "rb") as f:
+            lines = [line for line in f if json.loads(line)["custom_id"] in wanted]
+        round_no = len(self.manifest["rounds"]) + 1
+        round_info = {"round": round_no, "custom_ids": sorted(wanted), "submitted_at": _now()}
+        self.manifest["rounds"].append(round_info)
+
+        uploaded = client.files.create(file=(f"requests_round{round_no}.jsonl", b"".join(lines)), purpose="batch")
+        round_info["input_file_id"] = uploaded.id
+        self.save()  # si se corta aquí, run() crea el batch con el archivo ya subido
+        return self.create_batch(client, round_info)
+
+    def create_batch(self, client, round_info: dict) -> dict:
+        batch = client.batches.create(
+            input_file_id=round_info["input_file_id"],
+            endpoint=BATCH_ENDPOINT,
+            completion_window=COMPLETION_WINDOW,
+            metadata={"job": os.path.basename(os.path.abspath(self.job_dir)), "round": str(round_info["round"])},
+        )
+        round_info["batch_id"] = batch.id
+        round_info["status"] = batch.status
+        self.save()
+        print(f"Ronda {round_info['round']}: batch {batch.id} con {len(round_info['custom_ids'])} escenas")
+        return round_info
+
+    def poll(self, client, round_info: dict, interval: float) -> None:
+        """Espera a que el batch de la ronda llegue a un estado final."""
+        while True:
+            batch = client.batches.retrieve(round_info["batch_id"])
+            round_info["status"] = batch.status
+            counts = getattr(batch, "request_counts", None)
+            if counts is not None:
+                round_info["request_counts"] = {"total": counts.total, "completed": counts.completed, "failed": counts.failed}
+            round_info["output_file_id"] = batch.output_file_id
+            round_info["error_file_id"] = batch.error_file_id
+            self.save()
+            if batch.status in TERMINAL_STATUSES:
+                print(f"Batch {batch.id}: {batch.status} {round_info.get('request_counts', '')}")
+                return
+            print(f"Batch {batch.id}: {batch.status} {round_info.get('request_counts', '')}; siguiente consulta en {interval}s")
+            time.sleep(interval)
+
+    def collect(self, client, round_info: dict) -> None:
+        """Baja salida y errores de la ronda y los agrega a results.jsonl por custom_id."""
+        records = []
+        check = BreakdownCheck(self.manifest["lang"]) if self.manifest.get("structured") else None
+        for key in ("output_file_id", "error_file_id"):
+            file_id = round_info.get(key)
+            if not file_id:
+                continue
+            for line in client.files.content(file_id).text.splitlines():
+                if line.strip():
+                    records.append(self._parse_line(json.loads(line), check))
+        returned = {rec["custom_id"] for rec in records}
+        for cid in round_info["custom_ids"]:
+            if cid not in returned:
+                records.append({"custom_id": cid, "error": f"sin resultado (batch {round_info['status']})"})
+        cache_keys = {e["custom_id"]: e.get("cache_key") for e in self.manifest["scenes"]}
+        with open(os.path.join(self.job_dir, RESULTS), "a", encoding="utf-8") as f:
+            for rec in records:
+                rec["round"] = round_info["round"]
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                if self.cache is not None and "ok" in rec and cache_keys.get(rec["custom_id"]):
+                    self.cache.put(cache_keys[rec["custom_id"]], rec["ok"])
+        round_info["collected_at"] = _now()
+        self.save()
+        failed = sum(1 for rec in records if "error" in rec)
+        print(f"Ronda {round_info['round']}: {len(records) - failed} ok, {failed} con error")
+
+    @staticmethod
+    def _parse_line(line: dict, check: BreakdownCheck = None) -> dict:
+        cid = line.get("custom_id")
+        response = line.get("response") or {}
+        if line.get("error") or response.get("status_code") != 200:
+            error = line.get("error") or (response.get("body") or {}).get("error") or f"status {response.get('status_code')}"
+            return {"custom_id": cid, "error": error}
+        try:
+            breakdown = _extract_json(_body_text(response.get("body") or {}))
+        except Exception as e:
+            return {"custom_id": cid, "error": f"JSON inválido: {e}"}
+        if check is not None:
+            # En batch no se puede re-pedir una llave suelta: la escena entera va a la ronda siguiente
+            breakdown, refetch = check.repair(breakdown)
+            if refetch:
+                return {"custom_id": cid, "error": f"llaves inválidas: {', '.join(refetch)}"}
+        return {"custom_id": cid, "ok": breakdown}
+
+    def write_output(self) -> dict:
+        """result.json: {"scenes": [...]} en el orden original (como lambda_handler) + errores."""
+        results = self.results()
+        scenes, errors = [], []
+        for entry in self.manifest["scenes"]:
+            rec = results.get(entry["custom_id"]) or {"error": "pendiente"}
+            if "ok" in rec:
+                scenes.append(rec["ok"])
+            else:
+                scenes.append(None)
+                errors.append({"scene_id": entry["scene_id"], "index": entry["index"], "error": rec["error"]})
+        out = {"scenes": scenes, "errors": errors}
+        with open(os.path.join(self.job_dir, OUTPUT), "w", encoding="utf-8") as f:
+            json.dump(out, f, ensure_ascii=False, indent=2)
+        return out
+
+    def run(self, client, interval: float = 60.0, max_rounds: int = 2) -> dict:
+        """Avanza el job hasta terminar; retoma desde el manifest si se interrumpió."""
+        while True:
+            rounds = self.manifest["rounds"]
+            current = rounds[-1] if rounds else None
+            if current is not None and "collected_at" not in current:
+                if "batch_id" not in current:
+                    if "input_file_id" in current:
+                        # Se cortó entre la subida y la creación del batch
+                        self.create_batch(client, current)
+                    else:
+                        # Se cortó antes de subir: se arma la ronda de nuevo
+                        rounds.pop()
+                        self.save()
+                    continue
+                if current.get("status") not in TERMINAL_STATUSES:
+                    self.poll(client, current, interval)
+                self.collect(client, current)
+                continue
+            pending = self.pending()
+            if not pending or len(rounds) >= max_rounds:
+                break
+            self.submit(client, pending)
+        out = self.write_output()
+        print(f"Job terminado: {len(out['scenes']) - len(out['errors'])}/{len(out['scenes'])} escenas; salida en {os.path.join(self.job_dir, OUTPUT)}")
+        return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Breakdown de escenas con la Batch API de OpenAI")
+    parser.add_argument("command", choices=["run", "status"])
+    parser.add_argument("event", nargs="?", help="JSON con {scenes: [...]} (solo al crear el job)")
+    parser.add_argument("--job-dir", required=True)
+    parser.add_argument("--model", default=MODEL_DEFAULT)
+    parser.add_argument("--lang", default=LANG_DEFAULT)
+    parser.add_argument("--poll", type=float, default=60.0, help="segundos entre consultas de estado")
+    parser.add_argument("--max-rounds", type=int, default=2, help="rondas de batch (1 + reintentos de escenas fallidas)")
+    args = parser.parse_args()
+
+    job = BatchJob(args.job_dir)
+    if args.command == "status":
+        if job.manifest is None:
+            sys.exit(f"No hay job en {args.job_dir}")
+        print(json.dumps({"rounds": job.manifest["rounds"], "pending": len(job.pending())}, ensure_ascii=False, indent=2))
+        sys.exit(0)
+
+    if job.manifest is None:
+        if not args.event:
+            sys.exit("Falta el JSON de escenas para crear el job")
+        with open(args.event, "r", encoding="utf-8") as f:
+            event = json.load(f)
+        body = json.loads(event["body"]) if "body" in event else event
+        job.prepare(body["scenes"], args.model, args.lang)
+    job.run(get_client(), interval=args.poll, max_rounds=args.max_rounds)
@@ -0,0 +1,79 @@
+"""
+Tokens de entrada por formato de escena (SCENE_FORMAT) sobre un evento real.
+
+Uso (desde scene_breakdown/):
+    python bench/bench_scene_format.py                       # events/event_full.json, prompt es
+    python bench/bench_scene_format.py events/event.json --lang pt --json
+
+Cuenta con tiktoken (o200k_base) si está instalado; si no, ~4 caracteres por
+token (lo indica la salida). Compara, para cada formato, la pregunta de cada
+escena sola, las requests completas (prompt + pregunta) y los paquetes del
+modo pack con el presupuesto por defecto.
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import packing  # noqa: E402
+from packing import count_tokens, pack_prompt, pack_question, pack_scenes  # noqa: E402
+from scene_format import FORMATS, format_paragraphs, scene_header, scene_paragraphs  # noqa: E402
+
+
+def load_prompt(language: str) -> str:
+    with open(os.path.join("prompts", f"breakdown_prompt_{language}.txt"), "r", encoding="utf-8") as f:
+        return f.read().rstrip()
+
+
+def measure(scenes, prompt: str, language: str, scene_format: str) -> dict:
+    questions = [f"{scene_header(scene_format, language)}\n{format_paragraphs(scene_paragraphs(s), scene_format)}\n\nDevuelve el JSON solicitado." for s in scenes]
+    question_tokens = sum(count_tokens(q) for q in questions)
+    prompt_tokens = count_tokens(prompt)
+    packed_prompt = pack_prompt(prompt, language)
+    # tsv no aplica a paquetes (van en JSON minificado)
+    pack_format = "min" if scene_format == "tsv" else scene_format
+    packs = pack_scenes(scenes, packed_prompt, scene_format=pack_format)
+    packed = sum(
+        count_tokens(packed_prompt) + count_tokens(pack_question([scenes[i] for i in p], pack_format, language))
+        for p in packs
+    )
+    return {
+        "question_tokens": question_tokens,
+        "request_tokens": question_tokens + prompt_tokens * len(scenes),
+        "packs": len(packs),
+        "packed_request_tokens": packed,
+        "chars": sum(len(q) for q in questions),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokens por formato de escena")
+    parser.add_argument("event", nargs="?", default="events/event_full.json")
+    parser.add_argument("--lang", default="es")
+    parser.add_argument("--json", action="store_true", help="salida JSON")
+    args = parser.parse_args()
+
+    with open(args.event, "r", encoding="utf-8") as f:
+        scenes = json.load(f)["scenes"]
+    prompt = load_prompt(args.lang)
+    tokenizer = packing.tokenizer_name()
+    results = {fmt: measure(scenes, prompt, args.lang, fmt) for fmt in FORMATS}
+
+    if args.json:
+        print(json.dumps({"event": args.event, "scenes": len(scenes), "tokenizer": tokenizer, "formats": results}, indent=2))
+        return
+    base = results["json"]
+    print(f"{args.event}: {len(scenes)} escenas, prompt {count_tokens(prompt)} tokens ({tokenizer})")
+    print(f"{'formato':8} {'pregunta':>10} {'vs json':>8} {'request':>10} {'vs json':>8} {'pack':>10} {'vs json':>8}")
+    for fmt, r in results.items():
+        print(
+            f"{fmt:8} {r['question_tokens']:>10} {r['question_tokens'] / base['question_tokens']:>8.0%}"
+            f" {r['request_tokens']:>10} {r['request_tokens'] / base['request_tokens']:>8.0%}"
+            f" {r['packed_request_tokens']:>10} {r['packed_request_tokens'] / base['packed_request_tokens']:>8.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
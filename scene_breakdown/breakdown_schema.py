@@ -0,0 +1,309 @@
+"""
+Schema JSON del breakdown por escena, validación y reparación de campos.
+
+- response_format(): formato `json_schema` estricto para la Responses API
+  (text={"format": ...}); el modelo queda obligado a devolver todas las llaves
+  con el tipo correcto.
+- BreakdownCheck.errors(): valida contra el schema compilado (jsonschema si
+  está instalado; si no, un validador mínimo con lo que usa este schema).
+- BreakdownCheck.repair(): arregla en el lugar lo que se puede arreglar sin el
+  modelo (número como texto, texto suelto donde va una lista, null donde va
+  una lista, llaves de más) y devuelve las llaves que hay que volver a pedir
+  (faltantes o irrecuperables). Solo esas llaves vuelven al modelo.
+
+Las llaves salen del prompt de cada idioma (el prompt en portugués no pide
+loc ni geo_location).
+"""
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# "0" desactiva el formato estricto (p. ej. modelos sin structured outputs)
+STRUCTURED_DEFAULT = os.getenv("BREAKDOWN_STRUCTURED", "1") == "1"
+
+FIELDS = {
+    "es": ["scn", "i/e", "loc", "set", "d/n", "sd", "yr", "cast", "extras", "el", "sub_scenes", "synopsis", "geo_location"],
+    "pt": ["scn", "i/e", "set", "d/n", "sd", "yr", "cast", "extras", "el", "sub_scenes", "synopsis"],
+}
+# Las sub-escenas tienen la estructura de la escena, sin anidar más sub-escenas
+SUB_SCENE_EXCLUDE = ("sub_scenes", "geo_location")
+
+_NULLABLE_TEXT = {"type": ["string", "null"]}
+_TEXT_LIST = {"type": "array", "items": {"type": "string"}}
+_ELEMENTS = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"cat": {"type": "string"}, "items": _TEXT_LIST},
+        "required": ["cat", "items"],
+        "additionalProperties": False,
+    },
+}
+FIELD_SCHEMAS = {
+    "scn": {"type": "string"},
+    "i/e": _NULLABLE_TEXT,
+    "loc": _NULLABLE_TEXT,
+    "set": _NULLABLE_TEXT,
+    "d/n": _NULLABLE_TEXT,
+    "sd": _NULLABLE_TEXT,
+    "yr": _NULLABLE_TEXT,
+    "cast": _TEXT_LIST,
+    "extras": _TEXT_LIST,
+    "el": _ELEMENTS,
+    "synopsis": {"type": "string"},
+    "geo_location": _NULLABLE_TEXT,
+}
+
+
+def _object(properties: Dict[str, Any]) -> Dict[str, Any]:
+    # Structured outputs estricto: todas las llaves requeridas y ninguna extra
+    return {"type": "object", "properties": properties, "required": list(properties), "additionalProperties": False}
+
+
+def breakdown_schema(fields: Sequence[str]) -> Dict[str, Any]:
+    sub_fields = [f for f in fields if f not in SUB_SCENE_EXCLUDE]
+    sub_scene = _object({f: FIELD_SCHEMAS[f] for f in sub_fields})
+    props = {}
+    for f in fields:
+        props[f] = {"type": "array", "items": sub_scene} if f == "sub_scenes" else FIELD_SCHEMAS[f]
+    return _object(props)
+
+
+def pack_schema(fields: Sequence[str]) -> Dict[str, Any]:
+    item = breakdown_schema(fields)
+    item = _object({"index": {"type": "integer"}, **item["properties"]})
+    return _object({"breakdowns": {"type": "array", "items": item}})
+
+
+def response_format(name: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    return {"type": "json_schema", "name": name, "schema": schema, "strict": True}
+
+
+# --- validación ---
+
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "null": type(None),
+}
+
+
+def _minimal_errors(value: Any, schema: Dict[str, Any], path: Tuple) -> List[Tuple[Tuple, str]]:
+    """Validador mínimo: type, properties, required, additionalProperties, items."""
+    types = schema.get("type")
+    types = types if isinstance(types, list) else [types]
+    if not any(isinstance(value, _TYPES[t]) and not (t == "integer" and isinstance(value, bool)) for t in types):
+        return [(path, f"se esperaba {'/'.join(types)}, llegó {type(value).__name__}")]
+    errors = []
+    if isinstance(value, dict):
+        props = schema.get("properties", {})
+        for key in schema.get("required", []):
+            if key not in value:
+                errors.append((path + (key,), "falta la llave"))
+        for key, item in value.items():
+            if key in props:
+                errors.extend(_minimal_errors(item, props[key], path + (key,)))
+            elif schema.get("additionalProperties") is False:
+                errors.append((path + (key,), "llave no permitida"))
+    elif isinstance(value, list) and "items" in schema:
+        for i, item in enumerate(value):
+            errors.extend(_minimal_errors(item, schema["items"], path + (i,)))
+    return errors
+
+
+def _compile(schema: Dict[str, Any]):
+    """Devuelve una función value -> [(path, mensaje)]."""
+    try:
+        from jsonschema import Draft202012Validator  # opcional
+    except ImportError:
+        return lambda value: _minimal_errors(value, schema, ())
+    validator = Draft202012Validator(schema)
+
+    def check(value):
+        out = []
+        for e in validator.iter_errors(value):
+            path = tuple(e.absolute_path)
+            if e.validator == "required":
+                # jsonschema reporta la falta en el objeto padre; se lleva a la llave
+                for key in e.validator_value:
+                    if isinstance(e.instance, dict) and key not in e.instance:
+                        out.append((path + (key,), "falta la llave"))
+            else:
+                out.append((path, e.message))
+        return out
+
+    return check
+
+
+# --- reparación local ---
+
+def _as_text(value: Any) -> Optional[str]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return str(value)
+    return value if isinstance(value, str) else None
+
+
+def _as_text_list(value: Any) -> Optional[List[str]]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value] if value.strip() and value.strip().upper() != "NULL" else []
+    if isinstance(value, list):
+        return [t for t in (_as_text(v) for v in value) if t]
+    return None
+
+
+def _as_elements(value: Any) -> Optional[List[Dict[str, Any]]]:
+    if value is None:
+        return []
+    if isinstance(value, dict):
+        # {"PROPS": [...], ...} -> [{"cat": "PROPS", "items": [...]}, ...]
+        value = [{"cat": k, "items": v} for k, v in value.items()]
+    if not isinstance(value, list):
+        return None
+    out = []
+    for item in value:
+        if isinstance(item, dict) and isinstance(item.get("cat"), str):
+            items = _as_text_list(item.get("items"))
+            if items is not None:
+                out.append({"cat": item["cat"], "items": items})
+    return out
+
+
+def _fix_value(field: str, value: Any, sub_fields: Sequence[str]) -> Tuple[bool, Any]:
+    """(True, valor arreglado) o (False, None) si hay que pedirlo de nuevo."""
+    if field == "sub_scenes":
+        if value is None:
+            return True, []
+        if not isinstance(value, list):
+            return False, None
+        return True, [_fix_sub_scene(sub, sub_fields) for sub in value if isinstance(sub, dict)]
+    kind = FIELD_SCHEMAS[field]
+    if kind is _TEXT_LIST:
+        fixed = _as_text_list(value)
+    elif kind is _ELEMENTS:
+        fixed = _as_elements(value)
+    elif kind is _NULLABLE_TEXT:
+        if value is None:
+            return True, None
+        fixed = _as_text(value)
+    else:
+        fixed = _as_text(value)
+    return (fixed is not None), fixed
+
+
+def _fix_sub_scene(sub: Dict[str, Any], sub_fields: Sequence[str]) -> Dict[str, Any]:
+    # En sub-escenas no se re-pide nada: lo que falte o no tenga arreglo queda vacío
+    out = {}
+    for f in sub_fields:
+        ok, value = _fix_value(f, sub[f], sub_fields) if f in sub else (False, None)
+        out[f] = value if ok else _empty(f)
+    return out
+
+
+def _nullable(field: str) -> bool:
+    return FIELD_SCHEMAS.get(field) is _NULLABLE_TEXT
+
+
+def _empty(field: str) -> Any:
+    if field == "sub_scenes" or FIELD_SCHEMAS[field]["type"] == "array":
+        return []
+    return None if _nullable(field) else ""
+
+
+class BreakdownCheck:
+    """
+    Schema + validador compilado + contadores para un idioma. Una instancia por
+    invocación: los contadores terminan en la metadata de la respuesta.
+    """
+
+    def __init__(self, language: str = "es"):
+        self.fields = FIELDS.get(language, FIELDS["es"])
+        self.sub_fields = [f for f in self.fields if f not in SUB_SCENE_EXCLUDE]
+        self.schema = breakdown_schema(self.fields)
+        self._check = _compile(self.schema)
+        self.stats = {
+            "checked": 0,       # breakdowns validados
+            "valid": 0,         # válidos tal como llegaron
+            "repaired": 0,      # arreglados localmente sin volver al modelo
+            "refetch_calls": 0,  # llamadas que piden solo las llaves que faltan
+            "refetched_fields": 0,
+            "defaulted_fields": 0,  # llaves que ni el re-pedido arregló (quedan vacías)
+            "retries": 0,       # respuestas enteras descartadas (JSON ilegible) y pedidas de nuevo
+        }
+
+    # --- formatos para la API ---
+
+    def format(self) -> Dict[str, Any]:
+        return response_format("scene_breakdown", self.schema)
+
+    def pack_format(self) -> Dict[str, Any]:
+        return response_format("scene_breakdowns", pack_schema(self.fields))
+
+    def fields_format(self, fields: Sequence[str]) -> Dict[str, Any]:
+        schema = breakdown_schema(self.fields)
+        return response_format("scene_breakdown_fields", _object({f: schema["properties"][f] for f in fields}))
+
+    # --- validación / reparación ---
+
+    def errors(self, obj: Any) -> Dict[str, str]:
+        """Errores por llave de primer nivel ("" = el objeto entero)."""
+        out: Dict[str, str] = {}
+        for path, message in self._check(obj):
+            out.setdefault(str(path[0]) if path else "", message)
+        return out
+
+    def repair(self, obj: Any) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Valida y arregla lo posible sin el modelo. Devuelve (breakdown,
+        llaves a re-pedir). Llaves de más se descartan.
+        """
+        self.stats["checked"] += 1
+        if not isinstance(obj, dict):
+            return {}, list(self.fields)
+        errors = self.errors(obj)
+        if not errors:
+            self.stats["valid"] += 1
+            return obj, []
+        fixed: Dict[str, Any] = {}
+        refetch: List[str] = []
+        for f in self.fields:
+            if f not in obj:
+                refetch.append(f)
+            elif f in errors:
+                ok, value = _fix_value(f, obj[f], self.sub_fields)
+                if ok:
+                    fixed[f] = value
+                else:
+                    refetch.append(f)
+            else:
+                fixed[f] = obj[f]
+        if not refetch:
+            self.stats["repaired"] += 1
+        return fixed, refetch
+
+    def merge(self, breakdown: Dict[str, Any], fields: Sequence[str], data: Any) -> Dict[str, Any]:
+        """
+        Completa `breakdown` con las llaves re-pedidas (`data`, respuesta del
+        modelo o None si falló). Lo que siga mal queda vacío. Respeta el orden
+        de llaves del prompt.
+        """
+        self.stats["refetched_fields"] += len(fields)
+        data = data if isinstance(data, dict) else {}
+        values = dict(breakdown)
+        for f in fields:
+            ok, value = _fix_value(f, data[f], self.sub_fields) if f in data else (False, None)
+            if not ok:
+                self.stats["defaulted_fields"] += 1
+                value = _empty(f)
+            values[f] = value
+        return {f: values[f] for f in self.fields if f in values}
+
+    def counters(self) -> Dict[str, Any]:
+        out = dict(self.stats)
+        checked = out["checked"] or 1
+        out["repair_rate"] = round((checked - out["valid"]) / checked, 4) if out["checked"] else 0.0
+        return out
@@ -1,7 +1,7 @@
 # al inicio
 set -euo pipefail
 LAMBDA_NAME="scene_breakdown"
-FILES=("main.py" "prompts" "responses")
+FILES=("main.py" "openai_client.py" "lambda_log.py" "rate_limit.py" "scene_cache.py" "packing.py" "breakdown_schema.py" "scene_job.py" "scene_format.py" "prompts" "responses")
 
 echo "🧹 Limpiando archivos anteriores..."
 rm -rf lambda_build "$LAMBDA_NAME.zip"
@@ -15,9 +15,14 @@ docker run --rm -v "$PWD":/var/task public.ecr.aws/sam/build-python3.11 \
   --python-version 3.11 --only-binary=:all: \
   -r requirements.txt -t lambda_build
 
+echo "🔤 Empaquetando el BPE de tiktoken (o200k_base) para no descargarlo en la Lambda..."
+docker run --rm -v "$PWD":/var/task -w /var/task -e PYTHONPATH=lambda_build \
+  -e TIKTOKEN_CACHE_DIR=lambda_build/tiktoken_cache public.ecr.aws/sam/build-python3.11 \
+  python -c "import tiktoken; tiktoken.get_encoding('o200k_base')"
+
 echo "📦 Copiando archivos fuente y recursos..."
 for file in "${FILES[@]}"; do
-  cp -r "$file" lambda_build/
+  cp -rL "$file" lambda_build/
 done
 
 echo "🗜️ Generando ZIP..."
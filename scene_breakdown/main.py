@@ -1,11 +1,21 @@
 # Ejecuta OpenAI con prompt + question; adjunta instrucciones + schema como texto
 
 from dotenv import load_dotenv
-from openai import OpenAI
-import openai, sys, json, time, os, re
+import openai, sys, json, time, os, re, random, asyncio
+
+from lambda_log import get_logger
+from openai_client import get_async_client, get_client, run_async
+from breakdown_schema import STRUCTURED_DEFAULT, BreakdownCheck
+from packing import PACK_MAX_SCENES_DEFAULT, PACK_TOKENS_DEFAULT, count_tokens, pack_prompt, pack_question, pack_scenes, parse_pack, tokenizer_name, valid_breakdown
+from rate_limit import RateLimiter
+from scene_cache import SceneCache, scene_cache_from_spec, split_cached
+from scene_format import SCENE_FORMAT_DEFAULT, format_paragraphs, scene_header, scene_paragraphs
+from scene_job import SceneJob
+
+log = get_logger("scene_breakdown")
 
 # Debug de versión en runtime
-print("openai version:", openai.__version__, "python:", sys.version)
+log.info("openai version: %s python: %s", openai.__version__, sys.version)
 
 # Cargar variables desde .env
 load_dotenv()
@@ -15,6 +25,23 @@ MODEL_DEFAULT = os.getenv("MODEL_TO_USE", "gpt-4.1")
 # MODEL_DEFAULT = os.getenv("MODEL_TO_USE", "gpt-5")
 LANG_DEFAULT = os.getenv("PROMPT_LANG", "es")
 
+# Modo de ejecución: "sync" (una escena tras otra) o "async" (escenas en paralelo)
+MODE_DEFAULT = os.getenv("BREAKDOWN_MODE", "sync")
+# Límites del modo async: llamadas simultáneas y presupuestos por minuto de la cuenta
+CONCURRENCY_DEFAULT = int(os.getenv("SCENE_CONCURRENCY", "8"))
+RPM_DEFAULT = int(os.getenv("OPENAI_RPM", "500"))
+TPM_DEFAULT = int(os.getenv("OPENAI_TPM", "200000"))
+# Tokens de salida que se reservan por escena (el uso real corrige el presupuesto)
+OUTPUT_TOKENS_ESTIMATE = int(os.getenv("OUTPUT_TOKENS_ESTIMATE", "1200"))
+# Varias escenas por llamada (ver packing.py): "1" activa el modo pack por defecto
+PACK_DEFAULT = os.getenv("BREAKDOWN_PACK", "0") == "1"
+# Reintentos ante 429 (aparte de los reintentos por error)
+MAX_RATE_LIMIT_RETRIES = 8
+
+# Cache de breakdowns por escena: "disk:<dir>" (default, /tmp sobrevive en caliente),
+# "memory", "redis://host:port/db" u "off"
+SCENE_CACHE = scene_cache_from_spec(os.getenv("SCENE_CACHE", "disk:/tmp/scene-cache"))
+
 def lambda_handler(event, context):
     # Compatibilidad API Gateway / llamada directa
     body = json.loads(event.get("body", "{}")) if "body" in event else event
@@ -33,78 +60,468 @@ def lambda_handler(event, context):
     # Prompt base + (opcional) instrucciones de salida con schema
     prompt_template = load_prompt(language=language)
 
-    print(f"Modelo a usar: {model_to_use}")
+    mode = body.get("mode", MODE_DEFAULT)
+    cache = SCENE_CACHE if body.get("cache", True) else None
+    # Salida con schema estricto + validación/reparación por llave (ver breakdown_schema.py)
+    structured = bool(body.get("structured", STRUCTURED_DEFAULT))
+    check = BreakdownCheck(language) if structured else None
+    # "ndjson": una línea por escena en cuanto termina (ver iter_breakdowns_ndjson)
+    out_format = body.get("format", "json")
+    # job_id: resultados parciales en disco; repetir la llamada continúa donde quedó
+    job = SceneJob(body["job_id"]) if body.get("job_id") else None
+
+    log.info("Modelo a usar: %s (modo %s)", model_to_use, mode, scenes=len(scenes))
     start_time = time.time()
-    break_scenes = []
-    for scene in scenes:
-        print("scene here")
-        scene_obj = get_completion(scene, prompt_template, model=model_to_use)
-        break_scenes.append(scene_obj)
-
-    
-    end_time = time.time()
-    elapsed_time = end_time - start_time
+
+    # Escenas sin cambios salen de la cache; solo las pendientes van al modelo
+    break_scenes, keys, pending = split_cached(cache, scenes, prompt_template, model_to_use, language, SCENE_FORMAT_DEFAULT, structured)
+    pending_set = set(pending)
+    cached = [i for i in range(len(scenes)) if i not in pending_set]
+    resumed = []
+    if job is not None:
+        keys = [k or SceneCache.scene_key(s, prompt_template, model_to_use, language, SCENE_FORMAT_DEFAULT, structured) for k, s in zip(keys, scenes)]
+        done = job.load(keys)
+        resumed = [i for i in pending if i in done]
+        for i in resumed:
+            break_scenes[i] = done[i]
+        pending = [i for i in pending if i not in done]
+        job.write_manifest(scenes=len(scenes), model=model_to_use, lang=language, resumed=len(resumed), pending=len(pending))
+        log.info("Job %s: %d escenas retomadas, %d pendientes", job.job_id, len(resumed), len(pending))
+    todo = [scenes[i] for i in pending]
+    pack_stats = {"tokenizer": tokenizer_name()} if body.get("pack", PACK_DEFAULT) else None
+
+    results = iter_breakdowns(
+        todo,
+        prompt_template,
+        model=model_to_use,
+        language=language,
+        mode=mode,
+        check=check,
+        pack_stats=pack_stats,
+        budget=int(body.get("pack_tokens", PACK_TOKENS_DEFAULT)),
+        max_scenes=int(body.get("pack_max_scenes", PACK_MAX_SCENES_DEFAULT)),
+        concurrency=int(body.get("concurrency", CONCURRENCY_DEFAULT)),
+        rpm=int(body.get("rpm", RPM_DEFAULT)),
+        tpm=int(body.get("tpm", TPM_DEFAULT)),
+    )
+
+    def finished():
+        # (i, breakdown) de cada escena nueva; se guarda en el momento: si una
+        # escena posterior falla o la invocación se corta, estas no se pierden
+        for j, scene_obj in results:
+            i = pending[j]
+            if not isinstance(scene_obj, Exception):
+                if cache is not None:
+                    cache.put(keys[i], scene_obj)
+                if job is not None:
+                    job.append(i, keys[i], scene_obj)
+            yield i, scene_obj
+
+    def metadata(failed: int = 0):
+        elapsed_time = time.time() - start_time
+        log.info("Tiempo total para procesar %d escenas: %.2f segundos", len(scenes), elapsed_time)
+        meta = {"scenes": len(scenes), "model_calls": len(todo), "elapsed_s": round(elapsed_time, 3)}
+        if pack_stats is not None:
+            meta["model_calls"] = pack_stats.get("packs", 0) + pack_stats.get("fallbacks", 0)
+            meta["pack"] = pack_stats
+        if check is not None:
+            # Llamadas extra: pedidos de llaves faltantes y respuestas ilegibles pedidas de nuevo
+            meta["model_calls"] += check.stats["refetch_calls"] + check.stats["retries"]
+            meta["validation"] = check.counters()
+        if cache is not None:
+            meta["cache"] = {"hits": len(cached), "misses": len(scenes) - len(cached)}
+        if job is not None:
+            meta["job"] = {"job_id": job.job_id, "resumed": len(resumed), "failed": failed}
+        return meta
+
+    if out_format == "ndjson":
+        return _ndjson_response(200, iter_breakdowns_ndjson(break_scenes, cached, resumed, finished(), metadata))
+
+    for i, scene_obj in finished():
+        if isinstance(scene_obj, Exception):
+            raise scene_obj
+        break_scenes[i] = scene_obj
+
     # save break_scenes as json file
     # with open(f"responses/break_scenes_{model_to_use}.json", "w", encoding="utf-8") as f:
     #     json.dump(break_scenes, f, ensure_ascii=False, indent=2)
-    print(f"Tiempo total para procesar {len(scenes)} escenas: {elapsed_time} segundos")
-
     return {
         "statusCode": 200,
         "headers": {"Content-Type": "application/json; charset=utf-8"},
-        "body": json.dumps({"scenes": break_scenes}, ensure_ascii=False)
+        "body": json.dumps({"scenes": break_scenes, "metadata": metadata()}, ensure_ascii=False)
+    }
+
+def _ndjson_response(status: int, lines):
+    return {
+        "statusCode": status,
+        "headers": {"Content-Type": "application/x-ndjson; charset=utf-8"},
+        "body": "".join(lines)
     }
+
+def iter_breakdowns_ndjson(break_scenes, cached, resumed, finished, metadata):
+    """
+    Salida en streaming: una línea NDJSON por escena
+    ({"index": i, "scene": {...}}, con "cached"/"resumed" si no pasó por el
+    modelo, o {"index": i, "error": "..."} si falló) en cuanto está lista, y
+    una línea final {"done": true, "metadata": {...}}. Las escenas con error
+    no cortan el resto. Sirve tanto para Lambda response streaming como para
+    consumirlo localmente como generador.
+    """
+    for flag, indices in (("cached", cached), ("resumed", resumed)):
+        for i in indices:
+            yield json.dumps({"index": i, "scene": break_scenes[i], flag: True}, ensure_ascii=False) + "\n"
+    failed = 0
+    for i, scene_obj in finished:
+        if isinstance(scene_obj, Exception):
+            failed += 1
+            yield json.dumps({"index": i, "error": str(scene_obj)}, ensure_ascii=False) + "\n"
+        else:
+            yield json.dumps({"index": i, "scene": scene_obj}, ensure_ascii=False) + "\n"
+    yield json.dumps({"done": True, "failed": failed, "metadata": metadata(failed)}, ensure_ascii=False) + "\n"
+
 def _extract_json(text: str):
     # fallback por si algún modelo llega a poner fences (no debería con JSON mode)
     m = re.search(r"```(?:json)?\s*([\s\S]*?)\s*```", text, flags=re.I)
     if m:
         text = m.group(1)
-    return _extract_json(text)
+    return json.loads(text)
+
+# Pedido final de la pregunta por idioma (el encabezado sale de scene_header)
+SCENE_ASKS = {
+    "es": ("Devuelve el JSON solicitado.", "Devuelve solo estas llaves del JSON solicitado: "),
+    "pt": ("Devolva o JSON solicitado.", "Devolva apenas estas chaves do JSON solicitado: "),
+}
+
+def _scene_question(scene, language: str = LANG_DEFAULT, ask: str = None) -> str:
+    # Prepara la escena (solo text/type) en el formato compacto configurado (ver scene_format.py)
+    paras = format_paragraphs(scene_paragraphs(scene), SCENE_FORMAT_DEFAULT)
+    ask = ask or SCENE_ASKS.get(language, SCENE_ASKS["es"])[0]
+    return f"{scene_header(SCENE_FORMAT_DEFAULT, language)}\n{paras}\n\n{ask}"
+
+def _fields_question(scene, fields, language: str = LANG_DEFAULT) -> str:
+    # Re-pedido de solo las llaves que llegaron mal (el resto del breakdown ya está)
+    ask = SCENE_ASKS.get(language, SCENE_ASKS["es"])[1] + ", ".join(fields) + "."
+    return _scene_question(scene, language, ask)
 
-def get_completion(scene, prompt: str, model: str = MODEL_DEFAULT, max_retries: int = 3):
+def _scene_input(prompt: str, question: str):
+    return [
+        {"role": "system", "content": prompt},
+        {"role": "user", "content": question}
+    ]
+
+def _request_options(text_format) -> dict:
+    # Structured outputs: text={"format": {"type": "json_schema", ..., "strict": True}}
+    return {"text": {"format": text_format}} if text_format else {}
+
+def _response_text(resp) -> str:
+    if len(resp.output) > 1 and hasattr(resp.output[1], "content"):
+        return resp.output[1].content[0].text.strip()
+    return resp.output[0].content[0].text.strip()
+
+def get_completion(scene, prompt: str, model: str = MODEL_DEFAULT, max_retries: int = 3, check: BreakdownCheck = None, language: str = LANG_DEFAULT):
     """
     Llama a OpenAI con reintentos y fuerza salida JSON usando Chat Completions.
+    Con `check` pide el schema estricto, valida el resultado y vuelve a pedir
+    solo las llaves que no se pudieron arreglar localmente.
     """
-    
-
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    text_format = check.format() if check is not None else None
+    data = _call_model(prompt, _scene_question(scene, language), model, max_retries, text_format, check)
+    return _finish_breakdown(scene, data, prompt, model, check, language)
 
-    def _extract_json(text: str):
-        m = re.search(r"```(?:json)?\s*([\s\S]*?)\s*```", text, flags=re.I)
-        if m:
-            text = m.group(1)
-        return json.loads(text)
+def _finish_breakdown(scene, data, prompt: str, model: str, check: BreakdownCheck = None, language: str = LANG_DEFAULT):
+    if check is None:
+        return data
+    breakdown, refetch = check.repair(data)
+    if not refetch:
+        return breakdown
+    check.stats["refetch_calls"] += 1
+    try:
+        fixed = _call_model(prompt, _fields_question(scene, refetch, language), model, PACK_MAX_RETRIES, check.fields_format(refetch), check)
+    except Exception as e:
+        log.warning("No se pudieron re-pedir %s: %s", refetch, e)
+        fixed = None
+    return check.merge(breakdown, refetch, fixed)
 
-    # Prepara la escena (solo text/type)
-    scene_paras = [{"type": p.get("type"), "text": p.get("text")} for p in scene.get("content", [])]
-    paras_json = json.dumps(scene_paras, ensure_ascii=False, indent=2)
-    question = f"Escena:\n{paras_json}\n\nDevuelve el JSON solicitado."
+def _call_model(prompt: str, question: str, model: str, max_retries: int = 3, text_format=None, check: BreakdownCheck = None):
+    client = get_client()
 
     for attempt in range(max_retries):
         try:
             resp = client.responses.create(
                 model=model,
-                input=[
-                    {"role": "system", "content": prompt},
-                    {"role": "user", "content": question}
-                ],
+                input=_scene_input(prompt, question),
+                **_request_options(text_format),
             )
-            print("=== Respuesta completa ===")
-            print(resp)
-            if len(resp.output) > 1 and hasattr(resp.output[1], "content"):
-                txt = resp.output[1].content[0].text.strip()
-            else:
-                txt = resp.output[0].content[0].text.strip()
-
-            print("=== Texto devuelto ===")
-            print(txt)
-            return _extract_json(txt)  # dict
+            txt = _response_text(resp)
+            log.debug("Texto devuelto: %s", txt, usage=getattr(getattr(resp, "usage", None), "total_tokens", None), sample=0.1)
         except Exception as e:
             wait_time = 2 ** attempt
-            print(f"Error en intento {attempt + 1}/{max_retries}: {e}. Reintentando en {wait_time} segundos...")
+            log.warning("Error en intento %d/%d: %s. Reintentando en %s segundos...", attempt + 1, max_retries, e, wait_time)
             time.sleep(wait_time)
+            continue
+        try:
+            return _extract_json(txt)  # dict
+        except ValueError as e:
+            # JSON ilegible: no es un problema de la API, se pide de nuevo sin esperar
+            if check is not None:
+                check.stats["retries"] += 1
+            log.warning("JSON inválido en intento %d/%d: %s", attempt + 1, max_retries, e)
     raise Exception(f"Fallo después de {max_retries} intentos.")
 
+def _estimate_tokens(*texts: str, scenes: int = 1) -> int:
+    # Tokens de entrada + la salida esperada por escena
+    return sum(count_tokens(t) for t in texts) + OUTPUT_TOKENS_ESTIMATE * scenes
+
+def _retry_after(e: Exception) -> float:
+    """Segundos pedidos por la API en un 429 (retry-after-ms / retry-after), o 0."""
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return 0.0
+
+async def get_completion_async(client, scene, prompt: str, model: str, limiter: RateLimiter, semaphore: asyncio.Semaphore, max_retries: int = 3, check: BreakdownCheck = None, language: str = LANG_DEFAULT):
+    """
+    Versión async de get_completion: respeta el límite de concurrencia y el
+    presupuesto RPM/TPM; ante un 429 espera el Retry-After (o backoff
+    exponencial con jitter) y frena a todas las tareas vía el limiter.
+    La reparación de llaves de una escena no frena a las demás.
+    """
+    text_format = check.format() if check is not None else None
+    data = await _call_model_async(client, prompt, _scene_question(scene, language), model, limiter, semaphore, max_retries, text_format=text_format, check=check)
+    return await _finish_breakdown_async(client, scene, data, prompt, model, limiter, semaphore, check, language)
+
+async def _finish_breakdown_async(client, scene, data, prompt: str, model: str, limiter: RateLimiter, semaphore: asyncio.Semaphore, check: BreakdownCheck = None, language: str = LANG_DEFAULT):
+    if check is None:
+        return data
+    breakdown, refetch = check.repair(data)
+    if not refetch:
+        return breakdown
+    check.stats["refetch_calls"] += 1
+    try:
+        fixed = await _call_model_async(client, prompt, _fields_question(scene, refetch, language), model, limiter, semaphore, PACK_MAX_RETRIES, text_format=check.fields_format(refetch), check=check)
+    except Exception as e:
+        log.warning("No se pudieron re-pedir %s: %s", refetch, e)
+        fixed = None
+    return check.merge(breakdown, refetch, fixed)
+
+async def _call_model_async(client, prompt: str, question: str, model: str, limiter: RateLimiter, semaphore: asyncio.Semaphore, max_retries: int = 3, scenes: int = 1, text_format=None, check: BreakdownCheck = None):
+    estimate = _estimate_tokens(prompt, question, scenes=scenes)
+    errors = 0
+    rate_limited = 0
+    async with semaphore:
+        while True:
+            await limiter.acquire(estimate)
+            try:
+                resp = await client.responses.create(
+                    model=model,
+                    input=_scene_input(prompt, question),
+                    **_request_options(text_format),
+                )
+                usage = getattr(resp, "usage", None)
+                limiter.settle(estimate, getattr(usage, "total_tokens", 0) or 0)
+                limiter.on_success()
+                txt = _response_text(resp)
+            except openai.RateLimitError as e:
+                rate_limited += 1
+                if rate_limited > MAX_RATE_LIMIT_RETRIES:
+                    raise Exception(f"Rate limit persistente después de {MAX_RATE_LIMIT_RETRIES} reintentos.") from e
+                wait_time = _retry_after(e) or min(60.0, 2 ** rate_limited) * (0.5 + random.random() / 2)
+                limiter.on_rate_limited(wait_time)
+                log.warning("429 (rate limit), reintento %d/%d en %.2f segundos...", rate_limited, MAX_RATE_LIMIT_RETRIES, wait_time)
+                continue
+            except Exception as e:
+                errors += 1
+                if errors >= max_retries:
+                    raise Exception(f"Fallo después de {max_retries} intentos.") from e
+                wait_time = 2 ** (errors - 1)
+                log.warning("Error en intento %d/%d: %s. Reintentando en %s segundos...", errors, max_retries, e, wait_time)
+                await asyncio.sleep(wait_time)
+                continue
+            try:
+                return _extract_json(txt)  # dict
+            except ValueError as e:
+                # JSON ilegible: se pide de nuevo sin backoff (la API respondió bien)
+                errors += 1
+                if check is not None:
+                    check.stats["retries"] += 1
+                if errors >= max_retries:
+                    raise Exception(f"Fallo después de {max_retries} intentos.") from e
+                log.warning("JSON inválido en intento %d/%d: %s", errors, max_retries, e)
+
+async def _reported(j: int, coro, on_result=None):
+    # Entrega el resultado (o la excepción) de la escena j apenas termina
+    try:
+        scene_obj = await coro
+    except Exception as e:
+        scene_obj = e
+    if on_result is not None:
+        on_result(j, scene_obj)
+    return scene_obj
+
+def _raise_first(results) -> None:
+    for r in results:
+        if isinstance(r, BaseException):
+            raise r
+
+async def get_completions_async(scenes, prompt: str, model: str = MODEL_DEFAULT, concurrency: int = CONCURRENCY_DEFAULT, rpm: int = RPM_DEFAULT, tpm: int = TPM_DEFAULT, check: BreakdownCheck = None, on_result=None, language: str = LANG_DEFAULT):
+    """
+    Procesa todas las escenas en paralelo (hasta `concurrency` a la vez) y
+    devuelve los resultados en el orden original de las escenas.
+    OPENAI_BASE_URL permite apuntar a otro servidor (p. ej. mock_server.py).
+    Con on_result(j, breakdown | excepción) cada escena se informa al terminar
+    y los errores no cortan el resto.
+    """
+    limiter = RateLimiter(rpm, tpm)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    # Los reintentos los maneja get_completion_async (respetando el limiter)
+    client = get_async_client().with_options(max_retries=0)
+    tasks = [_reported(j, get_completion_async(client, scene, prompt, model, limiter, semaphore, check=check, language=language), on_result) for j, scene in enumerate(scenes)]
+    results = await asyncio.gather(*tasks)
+    if limiter.rate_limited:
+        log.info("Respuestas 429 recibidas: %d", limiter.rate_limited)
+    if on_result is None:
+        _raise_first(results)
+    return results
+
+
+# Reintentos de una llamada con varias escenas: si el JSON sigue mal, mejor
+# resolver las escenas de a una que repetir el paquete entero
+PACK_MAX_RETRIES = 2
+
+def _pack_item_ok(item) -> bool:
+    # Con check cualquier objeto sirve: lo que falte se repara o se re-pide por llave
+    return isinstance(item, dict)
+
+def iter_breakdowns(scenes, prompt: str, model: str = MODEL_DEFAULT, language: str = LANG_DEFAULT, mode: str = MODE_DEFAULT, check: BreakdownCheck = None, pack_stats: dict = None, budget: int = PACK_TOKENS_DEFAULT, max_scenes: int = PACK_MAX_SCENES_DEFAULT, concurrency: int = CONCURRENCY_DEFAULT, rpm: int = RPM_DEFAULT, tpm: int = TPM_DEFAULT):
+    """
+    Genera (j, breakdown) por escena en cuanto cada una termina (en sync, en el
+    orden original; en async, en el orden en que llegan). Si una escena falla
+    se entrega la excepción en lugar del breakdown y el resto sigue.
+    Con pack_stats (dict) usa el modo pack (varias escenas por llamada, ver
+    packing.py) y llena sus contadores {"packs", "packed_scenes", "fallbacks"}.
+    """
+    if not scenes:
+        return
+    if pack_stats is not None:
+        packed_prompt = pack_prompt(prompt, language)
+        packs = pack_scenes(scenes, packed_prompt, budget, max_scenes, SCENE_FORMAT_DEFAULT)
+        pack_stats.update(packs=len(packs), packed_scenes=sum(len(p) for p in packs if len(p) > 1), fallbacks=0)
+        log.info("%d escenas en %d llamadas (presupuesto %d tokens, hasta %d escenas)", len(scenes), len(packs), budget, max_scenes)
+        if mode == "async":
+            yield from _iter_async(lambda on_result: _get_packs_async(scenes, packs, prompt, packed_prompt, model, concurrency, rpm, tpm, pack_stats, check, on_result, language))
+        else:
+            yield from _iter_packs(scenes, packs, prompt, packed_prompt, model, pack_stats, check, language)
+    elif mode == "async":
+        yield from _iter_async(lambda on_result: get_completions_async(scenes, prompt, model, concurrency, rpm, tpm, check, on_result, language))
+    else:
+        for j, scene in enumerate(scenes):
+            try:
+                scene_obj = get_completion(scene, prompt, model=model, check=check, language=language)
+            except Exception as e:
+                scene_obj = e
+            yield j, scene_obj
+
+def _iter_async(start):
+    """
+    Corre start(on_result) en el loop persistente (run_async) y va entregando
+    (j, breakdown) a medida que las tareas terminan, sin esperar a todas.
+    """
+    async def begin():
+        queue = asyncio.Queue()
+        task = asyncio.ensure_future(start(lambda j, scene_obj: queue.put_nowait((j, scene_obj))))
+        return queue, task
+
+    async def next_item(queue, task):
+        while queue.empty():
+            if task.done():
+                task.result()  # propaga un error fuera de las escenas
+                return None
+            getter = asyncio.ensure_future(queue.get())
+            await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                return getter.result()
+            getter.cancel()
+        return queue.get_nowait()
+
+    queue, task = run_async(begin())
+    try:
+        while True:
+            item = run_async(next_item(queue, task))
+            if item is None:
+                return
+            yield item
+    finally:
+        if not task.done():
+            # Quien consume dejó de leer (p. ej. error en una escena en modo JSON)
+            task.cancel()
+            run_async(asyncio.wait({task}))
+
+def _iter_packs(scenes, packs, prompt: str, packed_prompt: str, model: str, stats: dict, check: BreakdownCheck = None, language: str = LANG_DEFAULT):
+    pack_format = check.pack_format() if check is not None else None
+    valid = _pack_item_ok if check is not None else valid_breakdown
+    for pack in packs:
+        group = [scenes[i] for i in pack]
+        if len(group) == 1:
+            # Un paquete de una escena va con el prompt normal (sin el extra del modo pack)
+            items = [None]
+        else:
+            try:
+                data = _call_model(packed_prompt, pack_question(group, SCENE_FORMAT_DEFAULT, language), model, PACK_MAX_RETRIES, pack_format, check)
+            except Exception as e:
+                log.warning("Paquete de %d escenas falló (%s); se piden de a una", len(group), e)
+                data = None
+            items = parse_pack(data, len(group), valid)
+        for i, scene, item in zip(pack, group, items):
+            try:
+                if item is not None:
+                    scene_obj = _finish_breakdown(scene, item, prompt, model, check, language)
+                else:
+                    if len(group) > 1:
+                        stats["fallbacks"] += 1
+                    scene_obj = get_completion(scene, prompt, model=model, check=check, language=language)
+            except Exception as e:
+                scene_obj = e
+            yield i, scene_obj
+
+async def _get_packs_async(scenes, packs, prompt: str, packed_prompt: str, model: str, concurrency: int, rpm: int, tpm: int, stats: dict, check: BreakdownCheck = None, on_result=None, language: str = LANG_DEFAULT):
+    limiter = RateLimiter(rpm, tpm)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    client = get_async_client().with_options(max_retries=0)
+    pack_format = check.pack_format() if check is not None else None
+    valid = _pack_item_ok if check is not None else valid_breakdown
+
+    async def run_pack(pack):
+        group = [scenes[i] for i in pack]
+        if len(group) == 1:
+            return [await _reported(pack[0], get_completion_async(client, group[0], prompt, model, limiter, semaphore, check=check, language=language), on_result)]
+        try:
+            data = await _call_model_async(client, packed_prompt, pack_question(group, SCENE_FORMAT_DEFAULT, language), model, limiter, semaphore, PACK_MAX_RETRIES, scenes=len(group), text_format=pack_format, check=check)
+        except Exception as e:
+            log.warning("Paquete de %d escenas falló (%s); se piden de a una", len(group), e)
+            data = None
+        items = parse_pack(data, len(group), valid)
+        stats["fallbacks"] += sum(1 for item in items if item is None)
+        return await asyncio.gather(*[
+            _reported(i, _finish_breakdown_async(client, scene, item, prompt, model, limiter, semaphore, check, language) if item is not None
+                      else get_completion_async(client, scene, prompt, model, limiter, semaphore, check=check, language=language), on_result)
+            for i, scene, item in zip(pack, group, items)
+        ])
+
+    outputs = await asyncio.gather(*[run_pack(pack) for pack in packs])
+    if limiter.rate_limited:
+        log.info("Respuestas 429 recibidas: %d", limiter.rate_limited)
+    results = [None] * len(scenes)
+    for pack, out in zip(packs, outputs):
+        for i, scene_obj in zip(pack, out):
+            results[i] = scene_obj
+    if on_result is None:
+        _raise_first(results)
+    return results
 
 
 def load_prompt(language: str = "es") -> str:
@@ -0,0 +1,373 @@
+# Servidor HTTP local que imita POST /v1/responses de OpenAI para probar el modo async
+# sin gastar tokens: simula latencia y responde 429 al pasar un límite de requests.
+#
+# También imita la Batch API (POST /v1/files, GET /v1/files/{id}/content,
+# POST /v1/batches, GET /v1/batches/{id}) para probar batch_job.py de punta a punta.
+#
+# Uso:
+#   python mock_server.py --port 8765 --latency 0.8 --rpm 120 &
+#   OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=mock BREAKDOWN_MODE=async python main.py
+
+import argparse
+import email
+import email.policy
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockState:
+    """Configuración y contadores compartidos por los hilos del servidor."""
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.2, rpm: int = 0, rate_limit_prob: float = 0.0, retry_after: float = 1.0, window: float = 60.0, batch_delay: float = 2.0, batch_fail_rate: float = 0.0, pack_drop_rate: float = 0.0, corrupt_rate: float = 0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.rpm = rpm
+        self.rate_limit_prob = rate_limit_prob
+        self.retry_after = retry_after
+        self.window_seconds = window
+        self.batch_delay = batch_delay
+        self.batch_fail_rate = batch_fail_rate
+        self.pack_drop_rate = pack_drop_rate
+        self.corrupt_rate = corrupt_rate
+        self.files = {}
+        self.batches = {}
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window = deque()
+        self.requests = 0
+        self.connections = 0
+        self.rate_limited = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.input_tokens = 0
+
+    def admit(self) -> float:
+        """
+        0 = se atiende; > 0 = responder 429 con ese Retry-After. Límite: `rpm`
+        requests por ventana deslizante (60 s por defecto) o 429 aleatorio.
+        """
+        now = time.monotonic()
+        with self.lock:
+            self.requests += 1
+            while self.window and now - self.window[0] >= self.window_seconds:
+                self.window.popleft()
+            if self.rpm and len(self.window) >= self.rpm:
+                self.rate_limited += 1
+                return max(0.001, self.window[0] + self.window_seconds - now)
+            if self.random.random() < self.rate_limit_prob:
+                self.rate_limited += 1
+                return self.retry_after
+            self.window.append(now)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            return 0.0
+
+    def done(self) -> None:
+        with self.lock:
+            self.in_flight -= 1
+
+
+def _fake_scene(paras: list) -> dict:
+    """Breakdown mínimo armado con el encabezado de la escena."""
+    heading = (paras[0].get("text") or "") if paras else ""
+    num = re.match(r"\s*(\d+[A-Za-z]?)\b", heading)
+    cast = sorted({p["text"].split("(")[0].strip() for p in paras if p.get("type") == "Character"})
+    return {
+        "scn": num.group(1) if num else "",
+        "i/e": "EXT" if "EXT" in heading else "INT" if "INT" in heading else "",
+        "loc": heading,
+        "set": "",
+        "d/n": "",
+        "sd": "",
+        "yr": "",
+        "cast": cast,
+        "extras": [],
+        "el": [],
+        "sub_scenes": [],
+        "synopsis": f"mock: {len(paras)} párrafos",
+        "geo_location": None,
+    }
+
+
+def _fake_breakdown(body: dict, state=None) -> dict:
+    """Respuesta a una escena ("Escena:") o a un paquete de escenas ("Escenas:")."""
+    question = ""
+    for msg in body.get("input") or []:
+        if msg.get("role") == "user":
+            question = msg.get("content") or ""
+    m = re.search(r"Escenas:\n([\s\S]*?)\n\nDevuelve", question)
+    if m:
+        breakdowns = []
+        for item in json.loads(m.group(1)):
+            # --pack-drop-rate: el modelo "olvida" escenas del paquete (prueba el fallback)
+            if state is not None and state.random.random() < state.pack_drop_rate:
+                continue
+            breakdowns.append({"index": item["index"], **_fake_scene(item.get("paragraphs") or [])})
+        return {"breakdowns": breakdowns}
+    m = re.search(r"Escena( \(TSV[^\n]*\))?:\n([\s\S]*?)\n\nDevuelve", question)
+    if not m:
+        paras = []
+    elif m.group(1):
+        # SCENE_FORMAT=tsv: "tipo<TAB>texto" por línea
+        paras = [dict(zip(("type", "text"), line.split("\t", 1))) for line in m.group(2).splitlines()]
+    else:
+        paras = json.loads(m.group(2))
+    breakdown = _fake_scene(paras)
+    fmt = (body.get("text") or {}).get("format") or {}
+    if fmt.get("name") == "scene_breakdown_fields":
+        # Re-pedido de llaves sueltas: solo las del schema recibido
+        return {k: breakdown.get(k) for k in fmt["schema"]["properties"]}
+    return breakdown
+
+
+def _response_text(body: dict, state) -> str:
+    """
+    Texto de salida; con --corrupt-rate a veces llega roto para probar la
+    validación: JSON cortado, una llave faltante o un tipo equivocado.
+    """
+    obj = _fake_breakdown(body, state)
+    text = json.dumps(obj, ensure_ascii=False)
+    fields_only = ((body.get("text") or {}).get("format") or {}).get("name") == "scene_breakdown_fields"
+    if fields_only or not state.corrupt_rate or state.random.random() >= state.corrupt_rate:
+        return text
+    kind = state.random.choice(("truncate", "drop", "type"))
+    if kind == "truncate":
+        return text[: len(text) // 2]
+    if "breakdowns" in obj and not obj["breakdowns"]:
+        return text
+    target = obj["breakdowns"][0] if "breakdowns" in obj else obj
+    if kind == "drop":
+        target.pop(state.random.choice(("synopsis", "cast", "scn")), None)
+    else:
+        target["cast"] = ", ".join(target.get("cast") or [])
+        target["el"] = None
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def _response_payload(body: dict, text: str) -> dict:
+    out_tokens = len(text) // 4
+    in_tokens = len(json.dumps(body.get("input") or [], ensure_ascii=False)) // 4
+    return {
+        "id": f"resp_{uuid.uuid4().hex}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "status": "completed",
+        "model": body.get("model", "mock"),
+        "output": [{
+            "type": "message",
+            "id": f"msg_{uuid.uuid4().hex}",
+            "status": "completed",
+            "role": "assistant",
+            "content": [{"type": "output_text", "text": text, "annotations": []}],
+        }],
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": {
+            "input_tokens": in_tokens,
+            "output_tokens": out_tokens,
+            "total_tokens": in_tokens + out_tokens,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens_details": {"reasoning_tokens": 0},
+        },
+    }
+
+
+def _file_object(file_id: str, f: dict) -> dict:
+    return {
+        "id": file_id,
+        "object": "file",
+        "bytes": len(f["data"]),
+        "created_at": f["created_at"],
+        "filename": f["filename"],
+        "purpose": f["purpose"],
+        "status": "processed",
+    }
+
+
+def _run_batch(state: MockState, batch: dict) -> None:
+    """Procesa todas las líneas del batch y deja archivos de salida y de errores."""
+    out_lines, err_lines = [], []
+    for raw in state.files[batch["input_file_id"]]["data"].splitlines():
+        if not raw.strip():
+            continue
+        req = json.loads(raw)
+        line = {"id": f"batch_req_{uuid.uuid4().hex}", "custom_id": req["custom_id"], "error": None}
+        if state.random.random() < state.batch_fail_rate:
+            line["response"] = {"status_code": 500, "request_id": uuid.uuid4().hex, "body": {"error": {"message": "mock: fallo simulado", "type": "server_error"}}}
+            err_lines.append(line)
+        else:
+            text = json.dumps(_fake_breakdown(req["body"]), ensure_ascii=False)
+            line["response"] = {"status_code": 200, "request_id": uuid.uuid4().hex, "body": _response_payload(req["body"], text)}
+            out_lines.append(line)
+    for key, lines in (("output_file_id", out_lines), ("error_file_id", err_lines)):
+        if lines:
+            file_id = f"file-{uuid.uuid4().hex}"
+            data = "".join(json.dumps(x, ensure_ascii=False) + "\n" for x in lines).encode("utf-8")
+            state.files[file_id] = {"data": data, "filename": f"{batch['id']}_{key}.jsonl", "purpose": "batch_output", "created_at": int(time.time())}
+            batch[key] = file_id
+    batch["request_counts"] = {"total": len(out_lines) + len(err_lines), "completed": len(out_lines), "failed": len(err_lines)}
+    batch["status"] = "completed"
+    batch["completed_at"] = int(time.time())
+
+
+def make_handler(state: MockState):
+    class Handler(BaseHTTPRequestHandler):
+        # HTTP/1.1 = keep-alive: una instancia por conexión TCP, no por request
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            with state.lock:
+                state.connections += 1
+
+        def log_message(self, *args):  # silencio: el cliente ya imprime lo suyo
+            pass
+
+        def _send(self, status: int, obj: dict, headers=None):
+            data = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _not_found(self):
+            return self._send(404, {"error": {"message": f"mock: ruta no soportada {self.path}"}})
+
+        def do_GET(self):
+            parts = self.path.split("?")[0].strip("/").split("/")
+            if parts[-3:-1] == ["files", parts[-2]] and parts[-1] == "content" and parts[-2] in state.files:
+                data = state.files[parts[-2]]["data"]
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                return
+            if len(parts) >= 2 and parts[-2] == "batches" and parts[-1] in state.batches:
+                with state.lock:
+                    batch = state.batches[parts[-1]]
+                    elapsed = time.time() - batch["created_at"]
+                    if batch["status"] == "validating":
+                        batch["status"] = "in_progress"
+                    elif batch["status"] == "in_progress" and elapsed >= state.batch_delay:
+                        _run_batch(state, batch)
+                return self._send(200, batch)
+            return self._not_found()
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length)
+            path = self.path.split("?")[0].rstrip("/")
+            if path.endswith("/files"):
+                return self._upload(raw)
+            body = json.loads(raw or b"{}")
+            if path.endswith("/batches"):
+                return self._create_batch(body)
+            if not path.endswith("/responses"):
+                return self._not_found()
+            retry_after = state.admit()
+            if retry_after:
+                return self._send(
+                    429,
+                    {"error": {"message": "Rate limit reached (mock)", "type": "requests", "code": "rate_limit_exceeded"}},
+                    {"retry-after-ms": str(int(retry_after * 1000) + 1)},
+                )
+            try:
+                time.sleep(max(0.0, state.latency + state.random.uniform(-state.jitter, state.jitter)))
+                text = _response_text(body, state)
+                payload = _response_payload(body, text)
+                with state.lock:
+                    state.input_tokens += payload["usage"]["input_tokens"]
+                self._send(200, payload)
+            finally:
+                state.done()
+
+        def _upload(self, raw: bytes):
+            # multipart/form-data: campos "purpose" y "file"
+            msg = email.message_from_bytes(
+                b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + raw,
+                policy=email.policy.HTTP,
+            )
+            fields = {}
+            for part in msg.iter_parts():
+                fields[part.get_param("name", header="content-disposition")] = (part.get_filename(), part.get_payload(decode=True))
+            file_id = f"file-{uuid.uuid4().hex}"
+            f = {
+                "data": fields["file"][1],
+                "filename": fields["file"][0] or "upload.jsonl",
+                "purpose": fields.get("purpose", (None, b"batch"))[1].decode(),
+                "created_at": int(time.time()),
+            }
+            with state.lock:
+                state.files[file_id] = f
+            return self._send(200, _file_object(file_id, f))
+
+        def _create_batch(self, body: dict):
+            if body.get("input_file_id") not in state.files:
+                return self._send(400, {"error": {"message": "mock: input_file_id desconocido", "type": "invalid_request_error"}})
+            batch_id = f"batch_{uuid.uuid4().hex}"
+            batch = {
+                "id": batch_id,
+                "object": "batch",
+                "endpoint": body.get("endpoint"),
+                "errors": None,
+                "input_file_id": body["input_file_id"],
+                "completion_window": body.get("completion_window", "24h"),
+                "status": "validating",
+                "output_file_id": None,
+                "error_file_id": None,
+                "created_at": int(time.time()),
+                "request_counts": {"total": 0, "completed": 0, "failed": 0},
+                "metadata": body.get("metadata"),
+            }
+            with state.lock:
+                state.batches[batch_id] = batch
+            return self._send(200, batch)
+
+    return Handler
+
+
+def start_mock_server(port: int = 0, **options):
+    """Levanta el servidor en un hilo. Devuelve (server, state, base_url)."""
+    state = MockState(**options)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock local de OpenAI /v1/responses")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="segundos por respuesta")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--rpm", type=int, default=0, help="429 al superar N requests/minuto (0 = sin límite)")
+    parser.add_argument("--window", type=float, default=60.0, help="segundos de la ventana de --rpm")
+    parser.add_argument("--rate-limit-prob", type=float, default=0.0, help="probabilidad de 429 aleatorio")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="segundos en retry-after-ms de los 429")
+    parser.add_argument("--batch-delay", type=float, default=2.0, help="segundos hasta que un batch queda completo")
+    parser.add_argument("--batch-fail-rate", type=float, default=0.0, help="fracción de líneas del batch que fallan")
+    parser.add_argument("--pack-drop-rate", type=float, default=0.0, help="fracción de escenas que faltan en respuestas de paquetes")
+    parser.add_argument("--corrupt-rate", type=float, default=0.0, help="fracción de respuestas con JSON roto o llaves mal")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    server, state, url = start_mock_server(
+        args.port, latency=args.latency, jitter=args.jitter, rpm=args.rpm,
+        rate_limit_prob=args.rate_limit_prob, retry_after=args.retry_after, window=args.window,
+        batch_delay=args.batch_delay, batch_fail_rate=args.batch_fail_rate, pack_drop_rate=args.pack_drop_rate, corrupt_rate=args.corrupt_rate, seed=args.seed,
+    )
+    print(f"Mock OpenAI escuchando en {url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,155 @@
+"""
+Empaquetado de varias escenas por llamada al modelo.
+
+Cada llamada manda el prompt completo (~5 KB) aunque la escena sea corta, así
+que la mayoría de los tokens de entrada son el prompt repetido. En modo pack
+se agrupan escenas consecutivas hasta un presupuesto de tokens y se pide un
+array de breakdowns identificados por el índice de cada escena dentro del
+paquete. Lo que falte o venga mal formado se resuelve después con llamadas de
+una sola escena (get_completion), así que el resultado final es el mismo.
+
+Los tokens se cuentan con tiktoken (o200k_base, el de gpt-4o/4.1). tiktoken
+baja el archivo BPE de internet la primera vez: build_zip.sh lo deja en
+tiktoken_cache/ dentro del ZIP para que la Lambda no lo descargue. Si aun así
+no se puede cargar, se estima ~3 caracteres por token (conservador: en
+español con tildes y JSON el modelo cuenta más tokens que chars/4) y se
+avisa en el log.
+"""
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+from lambda_log import get_logger
+from scene_format import SCENE_FORMAT_DEFAULT, dump_json, scene_paragraphs
+
+log = get_logger("scene_breakdown.packing")
+
+ENCODING = "o200k_base"
+# BPE empaquetado por build_zip.sh (tiktoken lo busca en TIKTOKEN_CACHE_DIR)
+_BUNDLED_BPE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tiktoken_cache")
+if os.path.isdir(_BUNDLED_BPE):
+    os.environ.setdefault("TIKTOKEN_CACHE_DIR", _BUNDLED_BPE)
+CHARS_PER_TOKEN_FALLBACK = 3
+
+# Tokens de entrada (prompt + escenas) y escenas como máximo por paquete
+PACK_TOKENS_DEFAULT = int(os.getenv("PACK_TOKENS", "12000"))
+PACK_MAX_SCENES_DEFAULT = int(os.getenv("PACK_MAX_SCENES", "8"))
+
+# Instrucciones que se agregan al prompt base cuando se mandan varias escenas
+PACK_INSTRUCTIONS = {
+    "es": (
+        "\n\nModo varias escenas\n\n"
+        "- Vas a recibir un ARRAY JSON de escenas con llaves {\"index\": ..., \"paragraphs\": [...]}.\n"
+        "- Haz el breakdown de CADA escena por separado, con las mismas reglas y llaves de arriba.\n"
+        "- Devuelve SOLO un objeto JSON {\"breakdowns\": [...]} con un breakdown por escena y la llave "
+        "\"index\" de la escena correspondiente en cada uno."
+    ),
+    "pt": (
+        "\n\nModo várias cenas\n\n"
+        "- Vai receber um ARRAY JSON de cenas com chaves {\"index\": ..., \"paragraphs\": [...]}.\n"
+        "- Faça o breakdown de CADA cena separadamente, com as mesmas regras e chaves acima.\n"
+        "- Devolva APENAS um objeto JSON {\"breakdowns\": [...]} com um breakdown por cena e a chave "
+        "\"index\" da cena correspondente em cada um."
+    ),
+}
+
+# Pregunta de un paquete por idioma (encabezado + pedido final)
+PACK_QUESTIONS = {
+    "es": ("Escenas:", "Devuelve el JSON solicitado con un breakdown por escena."),
+    "pt": ("Cenas:", "Devolva o JSON solicitado com um breakdown por cena."),
+}
+
+_encoder = None
+_encoder_loaded = False
+
+
+def _get_encoder():
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        _encoder_loaded = True
+        try:
+            import tiktoken
+
+            _encoder = tiktoken.get_encoding(ENCODING)
+        except Exception as e:
+            _encoder = None
+            log.warning("tiktoken no disponible (%r); tokens estimados con ~%d caracteres por token", e, CHARS_PER_TOKEN_FALLBACK)
+    return _encoder
+
+
+def tokenizer_name() -> str:
+    return ENCODING if _get_encoder() is not None else f"chars/{CHARS_PER_TOKEN_FALLBACK}"
+
+
+def count_tokens(text: str) -> int:
+    enc = _get_encoder()
+    if enc is not None:
+        return len(enc.encode(text or "", disallowed_special=()))
+    return -(-len(text or "") // CHARS_PER_TOKEN_FALLBACK)
+
+
+def pack_prompt(prompt: str, language: str) -> str:
+    return prompt + PACK_INSTRUCTIONS.get(language, PACK_INSTRUCTIONS["es"])
+
+
+def pack_question(scenes: Sequence[Dict[str, Any]], scene_format: str = SCENE_FORMAT_DEFAULT, language: str = "es") -> str:
+    # "tsv" no aplica a paquetes: van en JSON minificado
+    items = [{"index": i, "paragraphs": scene_paragraphs(s)} for i, s in enumerate(scenes)]
+    items_json = dump_json(items, scene_format)
+    header, ask = PACK_QUESTIONS.get(language, PACK_QUESTIONS["es"])
+    return f"{header}\n{items_json}\n\n{ask}"
+
+
+def pack_scenes(scenes: Sequence[Dict[str, Any]], prompt: str, budget: int = PACK_TOKENS_DEFAULT, max_scenes: int = PACK_MAX_SCENES_DEFAULT, scene_format: str = SCENE_FORMAT_DEFAULT) -> List[List[int]]:
+    """
+    Agrupa índices de escenas consecutivas en paquetes cuyo prompt + escenas
+    no supere `budget` tokens ni `max_scenes` escenas. Una escena que sola ya
+    supera el presupuesto va en un paquete propio.
+    """
+    base = count_tokens(prompt)
+    packs: List[List[int]] = []
+    current: List[int] = []
+    used = base
+    for i, scene in enumerate(scenes):
+        tokens = count_tokens(dump_json(scene_paragraphs(scene), scene_format)) + 8
+        if current and (used + tokens > budget or len(current) >= max_scenes):
+            packs.append(current)
+            current, used = [], base
+        current.append(i)
+        used += tokens
+    if current:
+        packs.append(current)
+    return packs
+
+
+def valid_breakdown(obj: Any) -> bool:
+    """Un breakdown usable: objeto JSON con al menos el número de escena y el elenco."""
+    return isinstance(obj, dict) and "scn" in obj and isinstance(obj.get("cast", []), list)
+
+
+def parse_pack(data: Any, size: int, valid=valid_breakdown) -> List[Optional[Dict[str, Any]]]:
+    """
+    Reparte la respuesta de un paquete por índice. Devuelve una lista de
+    `size` elementos: el breakdown de cada escena o None si falta, está
+    repetido o `valid` lo rechaza (esas escenas se reintentan de a una).
+    """
+    items = data.get("breakdowns") if isinstance(data, dict) else data
+    results: List[Optional[Dict[str, Any]]] = [None] * size
+    seen = set()
+    if not isinstance(items, list):
+        return results
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            index = int(item.get("index"))
+        except (TypeError, ValueError):
+            continue
+        if not 0 <= index < size:
+            continue
+        breakdown = {k: v for k, v in item.items() if k != "index"}
+        if index in seen:
+            results[index] = None  # dos respuestas para la misma escena: no se sabe cuál es la buena
+            continue
+        seen.add(index)
+        results[index] = breakdown if valid(breakdown) else None
+    return results
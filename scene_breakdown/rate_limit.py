@@ -0,0 +1,72 @@
+# Presupuesto de requests/tokens por minuto compartido por las llamadas async a OpenAI
+
+import asyncio
+import time
+
+
+class RateLimiter:
+    """
+    Dos token buckets (requests por minuto y tokens por minuto) que se
+    recargan de forma continua. Cada llamada reserva 1 request + su estimación
+    de tokens antes de salir; si no hay cupo, espera lo justo.
+
+    Backoff adaptativo: ante un 429 todas las tareas se detienen hasta que pase
+    el Retry-After (pausa global) y el ritmo baja a la mitad; cada respuesta
+    exitosa lo recupera de a poco hasta el presupuesto configurado.
+    """
+
+    MIN_FACTOR = 0.1
+    RECOVERY_STEP = 0.05
+
+    def __init__(self, rpm: int, tpm: int, clock=time.monotonic):
+        self.rpm = max(1, int(rpm))
+        self.tpm = max(1, int(tpm))
+        self.factor = 1.0
+        self.rate_limited = 0
+        self._clock = clock
+        self._requests = float(self.rpm)
+        self._tokens = float(self.tpm)
+        self._last = clock()
+        self._cooldown_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self._last)
+        self._last = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm * self.factor / 60.0)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm * self.factor / 60.0)
+
+    async def acquire(self, tokens: int) -> None:
+        """Espera hasta tener cupo para una request de ~`tokens` tokens y lo consume."""
+        # Una request más grande que el presupuesto entero sale con el bucket lleno
+        tokens = min(max(0, int(tokens)), self.tpm)
+        # El lock mantiene el orden de llegada: nadie se adelanta a quien ya espera
+        async with self._lock:
+            while True:
+                now = self._clock()
+                self._refill(now)
+                wait = self._cooldown_until - now
+                if wait <= 0:
+                    missing_requests = 1 - self._requests
+                    missing_tokens = tokens - self._tokens
+                    if missing_requests <= 0 and missing_tokens <= 0:
+                        self._requests -= 1
+                        self._tokens -= tokens
+                        return
+                    per_second = self.factor / 60.0
+                    wait = max(missing_requests / (self.rpm * per_second), missing_tokens / (self.tpm * per_second))
+                await asyncio.sleep(wait)
+
+    def settle(self, estimated: int, actual: int) -> None:
+        """Corrige el bucket de tokens con el uso real informado por la API."""
+        if actual:
+            self._tokens = max(-self.tpm, self._tokens - (int(actual) - int(estimated)))
+
+    def on_success(self) -> None:
+        self.factor = min(1.0, self.factor + self.RECOVERY_STEP)
+
+    def on_rate_limited(self, retry_after: float) -> None:
+        """429: pausa global de `retry_after` segundos y mitad de ritmo."""
+        self.rate_limited += 1
+        self.factor = max(self.MIN_FACTOR, self.factor / 2)
+        self._cooldown_until = max(self._cooldown_until, self._clock() + max(0.0, retry_after))
@@ -0,0 +1,251 @@
+"""
+Cache de breakdowns por escena.
+
+La clave es el SHA-256 de todo lo que determina la respuesta del modelo:
+  - los párrafos de la escena normalizados (type + text, espacios colapsados)
+  - el contenido del archivo de prompt
+  - el modelo, el idioma y el formato de la escena en la pregunta (SCENE_FORMAT)
+  - el modo structured: solo esos breakdowns pasaron por BreakdownCheck
+Si un guion se re-procesa tras cambios chicos, las escenas sin cambios salen
+de la cache (sin llamada ni costo) y solo las editadas van al modelo.
+
+Los valores guardados son el JSON ya parseado del breakdown, con la fecha de
+guardado para el TTL.
+
+Backends intercambiables (get/put/delete de valores JSON):
+  - MemoryBackend  LRU en el proceso (sobrevive entre invocaciones en caliente)
+  - DiskBackend    un archivo JSON por clave (p. ej. /tmp en Lambda o disco local)
+  - KVBackend      cualquier cliente key-value estilo redis (get / set con ex=ttl)
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+# Subir si cambia el formato de la pregunta al modelo (invalida todo lo anterior)
+CACHE_VERSION = "4"
+
+DEFAULT_TTL = int(os.getenv("SCENE_CACHE_TTL", str(30 * 24 * 3600)))
+DEFAULT_MAX_ENTRIES = int(os.getenv("SCENE_CACHE_MAX_ENTRIES", "20000"))
+
+_WS_RE = re.compile(r"\s+")
+
+
+class MemoryBackend:
+    """
+    Guarda el JSON serializado, igual que disco/redis: cada hit devuelve un
+    breakdown nuevo, así reparar o anotar el resultado no toca la cache.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            raw = self._data[key]
+        return json.loads(raw)
+
+    def put(self, key: str, value: Any) -> None:
+        raw = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._data[key] = raw
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class DiskBackend:
+    """
+    Un archivo por clave. Tamaño acotado: cada `evict_every` escrituras, si
+    hay más de max_entries archivos se borran los menos usados (mtime; cada
+    lectura lo actualiza).
+    """
+
+    def __init__(self, directory: str, max_entries: int = DEFAULT_MAX_ENTRIES, evict_every: int = 32):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        # Subdirectorio por prefijo de la clave: no quedan decenas de miles de archivos juntos
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Escritura atómica: otra invocación nunca lee un archivo a medias
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        self._writes += 1
+        if self._writes % self.evict_every == 0:
+            self.evict()
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self) -> int:
+        """Borra los archivos menos usados por encima de max_entries; devuelve cuántos."""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        entries.append((os.path.getmtime(path), path))
+                    except OSError:
+                        pass
+        extra = len(entries) - self.max_entries
+        if extra <= 0:
+            return 0
+        entries.sort()
+        for _, path in entries[:extra]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return extra
+
+
+class KVBackend:
+    """
+    Cliente key-value con la interfaz de redis-py (get(key) / set(key, value, ex=ttl) /
+    delete(key)). La expiración la hace el propio servidor con el TTL.
+    """
+
+    def __init__(self, client: Any, prefix: str = "scene-breakdown", ttl: int = DEFAULT_TTL):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}" if self.prefix else key
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.client.get(self._key(key))
+        return json.loads(raw) if raw is not None else None
+
+    def put(self, key: str, value: Any) -> None:
+        self.client.set(self._key(key), json.dumps(value, ensure_ascii=False), ex=self.ttl or None)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self._key(key))
+
+
+def normalize_text(text: str) -> str:
+    """NFC + espacios colapsados: cambios de formato invisibles no invalidan la cache."""
+    return _WS_RE.sub(" ", unicodedata.normalize("NFC", text or "")).strip()
+
+
+class SceneCache:
+    def __init__(self, backend: Any, ttl: int = DEFAULT_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    @staticmethod
+    def scene_key(scene: Dict[str, Any], prompt: str, model: str, language: str, scene_format: str = "json", structured: bool = False) -> str:
+        paras = [[p.get("type"), normalize_text(p.get("text"))] for p in scene.get("content", [])]
+        h = hashlib.sha256()
+        mode = "structured" if structured else "free"
+        h.update(f"v{CACHE_VERSION}\x1f{model}\x1f{language}\x1f{scene_format}\x1f{mode}\x1f".encode("utf-8"))
+        h.update(hashlib.sha256(prompt.encode("utf-8")).digest())
+        h.update(json.dumps(paras, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.backend.get(key)
+        if entry is not None and self.ttl and time.time() - entry.get("stored_at", 0) > self.ttl:
+            self.backend.delete(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["breakdown"]
+
+    def put(self, key: str, breakdown: Any) -> None:
+        self.backend.put(key, {"stored_at": time.time(), "breakdown": breakdown})
+        self.stores += 1
+
+    def counters(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "stores": self.stores}
+
+
+def split_cached(cache: Optional[SceneCache], scenes: List[Dict[str, Any]], prompt: str, model: str, language: str, scene_format: str = "json", structured: bool = False):
+    """
+    Separa escenas en cache y pendientes. Devuelve (results, keys, pending):
+    results[i] con el breakdown cacheado o None, keys[i] la clave de cada
+    escena y pending los índices que hay que mandar al modelo.
+    """
+    results: List[Any] = [None] * len(scenes)
+    keys: List[Optional[str]] = [None] * len(scenes)
+    pending: List[int] = []
+    for i, scene in enumerate(scenes):
+        if cache is None:
+            pending.append(i)
+            continue
+        keys[i] = SceneCache.scene_key(scene, prompt, model, language, scene_format, structured)
+        cached = cache.get(keys[i])
+        if cached is None:
+            pending.append(i)
+        else:
+            results[i] = cached
+    return results, keys, pending
+
+
+def scene_cache_from_spec(spec: str) -> Optional[SceneCache]:
+    """
+    Construye la cache a partir de un string de configuración:
+      "memory" | "memory:<max_entries>" | "disk:<dir>" | "redis://host:port/db" | "off"
+    TTL con SCENE_CACHE_TTL (segundos) y tamaño con SCENE_CACHE_MAX_ENTRIES.
+    """
+    spec = (spec or "").strip()
+    if not spec or spec == "off":
+        return None
+    if spec.startswith("memory"):
+        _, _, size = spec.partition(":")
+        return SceneCache(MemoryBackend(int(size) if size else DEFAULT_MAX_ENTRIES))
+    if spec.startswith("disk:"):
+        return SceneCache(DiskBackend(spec[len("disk:"):]))
+    if spec.startswith(("redis://", "rediss://")):
+        import redis  # solo se importa si se usa
+
+        return SceneCache(KVBackend(redis.Redis.from_url(spec)))
+    raise ValueError(f"SCENE_CACHE no reconocido: {spec!r}")
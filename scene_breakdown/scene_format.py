@@ -0,0 +1,62 @@
+"""
+Serialización de los párrafos de una escena para la pregunta al modelo.
+
+Formatos (SCENE_FORMAT):
+  - "json": array JSON con indent=2 (el formato original; los espacios de la
+    indentación también son tokens)
+  - "min":  el mismo array JSON minificado (default; mismo contenido, menos tokens)
+  - "tsv":  un párrafo por línea, "tipo<TAB>texto" (lo más compacto; el
+    encabezado de la pregunta le explica el formato al modelo)
+
+Los paquetes de varias escenas (packing.py) usan JSON minificado con "tsv",
+porque necesitan la estructura {"index", "paragraphs"}.
+bench/bench_scene_format.py compara los tokens de cada formato.
+"""
+import json
+import os
+import re
+from typing import Any, Dict, List
+
+FORMATS = ("json", "min", "tsv")
+SCENE_FORMAT_DEFAULT = os.getenv("SCENE_FORMAT", "min")
+if SCENE_FORMAT_DEFAULT not in FORMATS:
+    raise ValueError(f"SCENE_FORMAT no reconocido: {SCENE_FORMAT_DEFAULT!r} (opciones: {', '.join(FORMATS)})")
+
+_WS_RE = re.compile(r"\s+")
+
+
+def scene_paragraphs(scene: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # Solo text/type: page, label, proba... no le sirven al modelo
+    return [{"type": p.get("type"), "text": p.get("text")} for p in scene.get("content", [])]
+
+
+def dump_json(obj: Any, scene_format: str = SCENE_FORMAT_DEFAULT) -> str:
+    if scene_format == "json":
+        return json.dumps(obj, ensure_ascii=False, indent=2)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def format_paragraphs(paras: List[Dict[str, Any]], scene_format: str = SCENE_FORMAT_DEFAULT) -> str:
+    if scene_format == "tsv":
+        # Tabs y saltos dentro del texto se vuelven espacios: una línea = un párrafo
+        return "\n".join(f"{p.get('type') or ''}\t{_WS_RE.sub(' ', p.get('text') or '').strip()}" for p in paras)
+    return dump_json(paras, scene_format)
+
+
+# Encabezado de la pregunta por idioma, como los prompts (breakdown_prompt_<idioma>.txt)
+SCENE_HEADERS = {
+    "es": {
+        "plain": "Escena:",
+        "tsv": "Escena (TSV: un párrafo por línea, tipo y texto separados por tabulación):",
+    },
+    "pt": {
+        "plain": "Cena:",
+        "tsv": "Cena (TSV: um parágrafo por linha, tipo e texto separados por tabulação):",
+    },
+}
+
+
+def scene_header(scene_format: str = SCENE_FORMAT_DEFAULT, language: str = "es") -> str:
+    headers = SCENE_HEADERS.get(language, SCENE_HEADERS["es"])
+    return headers["tsv"] if scene_format == "tsv" else headers["plain"]
+
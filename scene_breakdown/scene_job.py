@@ -0,0 +1,62 @@
+"""
+Job reanudable de scene_breakdown: cada escena terminada se agrega en el
+momento a <SCENE_JOBS_DIR>/<job_id>/results.jsonl. Si la invocación se corta
+(timeout de Lambda / API Gateway), volver a llamar con el mismo job_id
+retoma desde ahí: las escenas ya hechas salen del archivo y solo las que
+faltan van al modelo.
+
+Cada línea guarda la clave de la escena (SceneCache.scene_key: párrafos +
+prompt + modelo + idioma + modo structured); si el guion cambió, las escenas editadas no
+coinciden y se vuelven a procesar.
+"""
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+JOBS_DIR_DEFAULT = os.getenv("SCENE_JOBS_DIR", "/tmp/scene-jobs")
+
+RESULTS = "results.jsonl"
+MANIFEST = "manifest.json"
+
+_JOB_ID_RE = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+class SceneJob:
+    def __init__(self, job_id: str, root: str = JOBS_DIR_DEFAULT):
+        # El job_id viene del request: se limpia para que no pueda salir del directorio
+        self.job_id = _JOB_ID_RE.sub("_", str(job_id)).strip("._") or "job"
+        self.job_dir = os.path.join(root, self.job_id)
+        self.results_path = os.path.join(self.job_dir, RESULTS)
+        self._lock = threading.Lock()
+        os.makedirs(self.job_dir, exist_ok=True)
+
+    def load(self, keys: List[Optional[str]]) -> Dict[int, Any]:
+        """Breakdowns ya terminados {índice: breakdown} cuya clave sigue coincidiendo."""
+        done: Dict[int, Any] = {}
+        if not os.path.exists(self.results_path):
+            return done
+        with open(self.results_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # última línea a medio escribir si la invocación se cortó
+                i = rec.get("index")
+                if isinstance(i, int) and 0 <= i < len(keys) and rec.get("key") == keys[i]:
+                    done[i] = rec["scene"]
+        return done
+
+    def append(self, index: int, key: str, breakdown: Any) -> None:
+        line = json.dumps({"index": index, "key": key, "scene": breakdown}, ensure_ascii=False) + "\n"
+        with self._lock, open(self.results_path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    def write_manifest(self, **info: Any) -> None:
+        info["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        tmp = os.path.join(self.job_dir, MANIFEST + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, os.path.join(self.job_dir, MANIFEST))
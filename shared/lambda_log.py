@@ -0,0 +1,124 @@
+# Logging compartido por las Lambdas: niveles, muestreo, truncado y salida JSON.
+# Reemplaza los print() sueltos: en producción solo sale INFO o más (nada de
+# respuestas completas del modelo) y lo grande se corta antes de llegar a CloudWatch.
+#
+# Cada Lambda tiene un symlink lambda_log.py -> ../shared/lambda_log.py;
+# los scripts de build lo copian con `cp -L` (el ZIP lleva el archivo real).
+#
+# Uso:
+#   from lambda_log import get_logger
+#   log = get_logger("scene_breakdown")
+#   log.info("Modelo a usar: %s", model, mode=mode)      # campos extra como kwargs
+#   log.debug("Texto devuelto: %s", text, sample=0.05)    # solo ~5% de las veces
+#
+# Configuración por entorno:
+#   LOG_LEVEL        DEBUG | INFO (default) | WARNING | ERROR
+#   LOG_FORMAT       text (default) | json (una línea JSON por mensaje, para Logs Insights)
+#   LOG_SAMPLE_RATE  fracción de mensajes DEBUG que se emiten (default 1)
+#   LOG_MAX_CHARS    largo máximo de cada valor/mensaje (default 2000; 0 = sin límite)
+
+import json
+import logging
+import os
+import random
+import sys
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1"))
+LOG_MAX_CHARS = int(os.getenv("LOG_MAX_CHARS", "2000"))
+
+ROOT_NAME = "ai_bot"
+# kwargs propios de logging.Logger: todo lo demás se toma como campo extra
+_LOGGING_KWARGS = {"exc_info", "stack_info", "stacklevel", "extra"}
+
+
+def truncate(value, limit: int = None) -> str:
+    """Texto de `value` cortado a `limit` caracteres con la cantidad omitida al final."""
+    limit = LOG_MAX_CHARS if limit is None else limit
+    text = value if isinstance(value, str) else str(value)
+    if limit and len(text) > limit:
+        return f"{text[:limit]}… (+{len(text) - limit} chars)"
+    return text
+
+
+def _field(value):
+    # Números/bools/None tal cual en JSON; el resto como texto truncado
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False, default=str)
+    return truncate(value)
+
+
+class _Formatter(logging.Formatter):
+    def __init__(self, fmt: str):
+        super().__init__()
+        self.json = fmt == "json"
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = truncate(record.getMessage())
+        fields = {k: _field(v) for k, v in (getattr(record, "fields", None) or {}).items()}
+        if record.exc_info:
+            fields["exc"] = truncate(self.formatException(record.exc_info))
+        if self.json:
+            return json.dumps({
+                "ts": round(record.created, 3),
+                "level": record.levelname,
+                "logger": record.name,
+                "msg": message,
+                **fields,
+            }, ensure_ascii=False)
+        extra = " ".join(f"{k}={v}" for k, v in fields.items())
+        return f"[{record.levelname}] {record.name}: {message}" + (f" | {extra}" if extra else "")
+
+
+class _Sampler(logging.Filter):
+    """Deja pasar los DEBUG con probabilidad LOG_SAMPLE_RATE (o la `sample` del mensaje)."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = getattr(record, "sample", None)
+        if rate is None:
+            rate = self.rate if record.levelno <= logging.DEBUG else 1.0
+        return rate >= 1.0 or random.random() < rate
+
+
+class Log(logging.LoggerAdapter):
+    """Logger con campos extra como kwargs: log.info("msg", escena=3, sample=0.1)."""
+
+    def process(self, msg, kwargs):
+        fields = {k: kwargs.pop(k) for k in list(kwargs) if k not in _LOGGING_KWARGS}
+        extra = dict(kwargs.get("extra") or {})
+        if "sample" in fields:
+            extra["sample"] = fields.pop("sample")
+        extra["fields"] = fields
+        kwargs["extra"] = extra
+        return msg, kwargs
+
+    def enabled(self, level: int = logging.DEBUG) -> bool:
+        """Para no armar mensajes caros (json.dumps de respuestas) que no se van a emitir."""
+        return self.logger.isEnabledFor(level)
+
+
+def _configure() -> logging.Logger:
+    root = logging.getLogger(ROOT_NAME)
+    if not getattr(root, "_lambda_log", False):
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(_Formatter(LOG_FORMAT))
+        handler.addFilter(_Sampler(LOG_SAMPLE_RATE))
+        root.addHandler(handler)
+        root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+        # El runtime de Lambda agrega su propio handler al root: sin propagate no se duplica
+        root.propagate = False
+        root._lambda_log = True
+    return root
+
+
+def get_logger(name: str) -> Log:
+    _configure()
+    return Log(logging.getLogger(f"{ROOT_NAME}.{name}"), {})
+
@@ -0,0 +1,92 @@
+# Cliente OpenAI compartido por las Lambdas: uno por proceso (contenedor), creado
+# la primera vez que se usa y reutilizado en todas las llamadas e invocaciones,
+# así las conexiones TLS quedan abiertas (keep-alive) en vez de rehacerse por llamada.
+#
+# Cada Lambda tiene un symlink openai_client.py -> ../shared/openai_client.py;
+# los scripts de build lo copian con `cp -L` (el ZIP lleva el archivo real).
+
+import asyncio
+import os
+import threading
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+# Pool HTTP: conexiones simultáneas, conexiones ociosas que se mantienen y cuánto viven
+MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "64"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE", "32"))
+KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "120"))
+
+# Timeouts (segundos): conectar rápido; leer con margen para respuestas largas del modelo
+CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("OPENAI_READ_TIMEOUT", "180"))
+MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+_lock = threading.Lock()
+_client = None
+_async_client = None
+_loop = None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+
+
+def get_client() -> OpenAI:
+    """Cliente síncrono compartido (OPENAI_API_KEY / OPENAI_BASE_URL del entorno)."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = OpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    timeout=_timeout(),
+                    max_retries=MAX_RETRIES,
+                    http_client=DefaultHttpxClient(limits=_limits(), timeout=_timeout()),
+                )
+    return _client
+
+
+def get_async_client() -> AsyncOpenAI:
+    """
+    Cliente async compartido. Sus conexiones pertenecen al event loop de
+    run_async(): úsalo solo dentro de corrutinas lanzadas con run_async.
+    Para otras opciones (p. ej. max_retries=0) usar .with_options(...),
+    que comparte el mismo pool de conexiones.
+    """
+    global _async_client
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                _async_client = AsyncOpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    timeout=_timeout(),
+                    max_retries=MAX_RETRIES,
+                    http_client=DefaultAsyncHttpxClient(limits=_limits(), timeout=_timeout()),
+                )
+    return _async_client
+
+
+def run_async(coro):
+    """
+    Ejecuta una corrutina en un event loop persistente del proceso. A diferencia
+    de asyncio.run (un loop nuevo por invocación), el pool del cliente async
+    sobrevive entre invocaciones del mismo contenedor.
+    """
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+    return _loop.run_until_complete(coro)
+
+
+def http_client() -> httpx.Client:
+    """El httpx.Client del cliente compartido (para librerías que aceptan uno, p. ej. litellm)."""
+    return get_client()._client